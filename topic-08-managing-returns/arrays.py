@@ -0,0 +1,412 @@
+import array
+import operator
+
+from strings import string_types
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# generic arrays are lists; typed arrays are array.array, or memoryview slices of one
+array_types = (list, array.array, memoryview)
+
+# elementwise operators, with comparisons giving the language's 1 and 0
+operators = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "<": lambda a, b: int(a < b),
+    ">": lambda a, b: int(a > b),
+    "<=": lambda a, b: int(a <= b),
+    ">=": lambda a, b: int(a >= b),
+    "==": lambda a, b: int(a == b),
+    "!=": lambda a, b: int(a != b),
+}
+
+if numpy:
+    numpy_operators = {
+        "+": numpy.add,
+        "-": numpy.subtract,
+        "*": numpy.multiply,
+        "/": numpy.true_divide,
+        "<": numpy.less,
+        ">": numpy.greater,
+        "<=": numpy.less_equal,
+        ">=": numpy.greater_equal,
+        "==": numpy.equal,
+        "!=": numpy.not_equal,
+    }
+
+
+def check_index(values, index):
+    if type(values) not in array_types and type(values) not in string_types:
+        raise Exception(f"Cannot index a non-array value: {values}")
+    if type(index) is not int or not 0 <= index < len(values):
+        raise Exception(f"Array index out of range: {index}")
+
+
+def store(values, index, value):
+    check_index(values, index)
+    if type(values) in string_types:
+        raise Exception(f"Cannot assign into a string: {values!r}")
+    try:
+        values[index] = value
+    except (TypeError, OverflowError):
+        raise Exception(f"Cannot store {value} in a typed array")
+
+
+def append(values, value):
+    values.append(value)
+
+
+def float_array(n):
+    """
+    Returns a typed array of n 8-byte floats, initially zero.
+    """
+    return array.array("d", [0.0]) * n
+
+
+def int_array(n):
+    """
+    Returns a typed array of n 8-byte integers, initially zero.
+    """
+    return array.array("q", [0]) * n
+
+
+def slice(values, start, end):
+    """
+    Returns elements start..end-1; for typed arrays this is a view, not a copy.
+    """
+    if not 0 <= start <= end <= len(values):
+        raise Exception(f"Array slice out of range: {start}..{end}")
+    if type(values) is list:
+        return values[start:end]
+    return memoryview(values)[start:end]
+
+
+def fill(values, value):
+    """
+    Sets every element of an array to value.
+    """
+    if type(values) is list:
+        values[:] = [value] * len(values)
+    else:
+        view = memoryview(values)
+        view[:] = array.array(view.format, [value]) * len(view)
+
+
+def copy(destination, source):
+    """
+    Copies the elements of source into an array of the same length.
+    """
+    if len(destination) != len(source):
+        raise Exception(f"Cannot copy {len(source)} elements into {len(destination)}")
+    if type(destination) is list:
+        destination[:] = source
+    else:
+        view = memoryview(destination)
+        if type(source) is list:
+            source = array.array(view.format, source)
+        view[:] = memoryview(source)
+
+
+def elementwise(tag, left, right):
+    """
+    Applies a binary operator elementwise, where either operand may be a scalar.
+    The result is typed if any array operand is typed, and a list otherwise.
+    """
+    left_is_array = type(left) in array_types
+    right_is_array = type(right) in array_types
+    if left_is_array and right_is_array and len(left) != len(right):
+        raise Exception(f"Array length mismatch: {len(left)} {tag} {len(right)}")
+    typed = (left_is_array and type(left) is not list) or (
+        right_is_array and type(right) is not list
+    )
+    if numpy:
+        result = numpy_elementwise(tag, left, right, typed)
+        if result is not None:
+            return result
+    for operand in [left, right]:
+        # typed arrays only hold numbers
+        if type(operand) is list and any(type(a) in array_types for a in operand):
+            raise Exception(f"Cannot apply {tag} elementwise to nested arrays")
+    if tag == "/" and (0 in right if right_is_array else right == 0):
+        raise Exception("Division by zero")
+    function = operators[tag]
+    if left_is_array and right_is_array:
+        values = [function(a, b) for a, b in zip(left, right)]
+    elif left_is_array:
+        values = [function(a, right) for a in left]
+    else:
+        values = [function(left, b) for b in right]
+    if not typed:
+        return values
+    if all(type(value) is int for value in values):
+        try:
+            return array.array("q", values)
+        except OverflowError:
+            raise Exception(f"Typed array {tag} overflows 8-byte integers")
+    return array.array("d", values)
+
+
+# the largest integer NumPy's int64 holds, past which Python's ints keep growing
+int64_max = 2**63 - 1
+
+
+def magnitude(values):
+    """
+    Returns the largest absolute value in a NumPy integer array, as a Python int.
+    """
+    if values.size == 0:
+        return 0
+    return max(-int(values.min()), int(values.max()))
+
+
+def numpy_elementwise(tag, left, right, typed):
+    """
+    The NumPy version of elementwise(), or None if it might not give the same
+    result: an operand isn't a flat array of numbers, or an integer result
+    might not fit in int64.
+    """
+    try:
+        left = numpy.asarray(left)
+        right = numpy.asarray(right)
+    except ValueError:
+        # nested lists of different lengths
+        return None
+    # nested lists would broadcast, where the language doesn't
+    if left.ndim > 1 or right.ndim > 1:
+        return None
+    if left.dtype.kind not in "if" or right.dtype.kind not in "if":
+        return None
+    if tag in ["+", "-", "*"] and left.dtype.kind == right.dtype.kind == "i":
+        if tag == "*":
+            largest = magnitude(left) * magnitude(right)
+        else:
+            largest = magnitude(left) + magnitude(right)
+        if largest > int64_max:
+            return None
+    if tag == "/" and not right.all():
+        raise Exception("Division by zero")
+    result = numpy_operators[tag](left, right)
+    if result.dtype.kind == "b":
+        result = result.astype(numpy.int64)
+    if not typed:
+        return result.tolist()
+    if result.dtype.kind == "f":
+        return array.array("d", result.astype(numpy.float64).tobytes())
+    return array.array("q", result.astype(numpy.int64).tobytes())
+
+
+def is_float_array(values):
+    """
+    Checks for a typed array of floats, which NumPy sums without overflowing.
+    """
+    if type(values) is array.array:
+        return values.typecode == "d"
+    return type(values) is memoryview and values.format == "d"
+
+
+def total(values):
+    # integers are summed in Python, where they can't wrap around
+    if numpy and is_float_array(values):
+        return numpy.sum(values).item()
+    return sum(values)
+
+
+def minimum(values):
+    if len(values) == 0:
+        raise Exception("Cannot take the minimum of an empty array")
+    if numpy and type(values) is not list:
+        return numpy.min(values).item()
+    return min(values)
+
+
+def maximum(values):
+    if len(values) == 0:
+        raise Exception("Cannot take the maximum of an empty array")
+    if numpy and type(values) is not list:
+        return numpy.max(values).item()
+    return max(values)
+
+
+def dot(left, right):
+    if len(left) != len(right):
+        raise Exception(f"Array length mismatch: {len(left)} dot {len(right)}")
+    if numpy and (is_float_array(left) or is_float_array(right)):
+        if type(left) is not list and type(right) is not list:
+            return numpy.dot(left, right).item()
+    return sum(a * b for a, b in zip(left, right))
+
+
+def test_typed_arrays():
+    print("test typed arrays")
+    a = float_array(4)
+    assert a.itemsize == 8
+    assert list(a) == [0.0, 0.0, 0.0, 0.0]
+    b = int_array(3)
+    assert b.itemsize == 8
+    assert list(b) == [0, 0, 0]
+    store(b, 1, 7)
+    assert b[1] == 7
+    try:
+        store(b, 1, 0.5)
+        assert False, "Expected a typed array store error"
+    except Exception as e:
+        assert str(e) == "Cannot store 0.5 in a typed array"
+
+
+def test_slice():
+    print("test slice")
+    a = float_array(5)
+    s = slice(a, 1, 3)
+    assert len(s) == 2
+    # typed slices share memory with the array they came from
+    store(s, 0, 2.5)
+    assert a[1] == 2.5
+    t = slice(s, 1, 2)
+    store(t, 0, 3.5)
+    assert a[2] == 3.5
+    b = [1, 2, 3]
+    assert slice(b, 0, 2) == [1, 2]
+    for start, end in [(-1, 2), (2, 1), (0, 6)]:
+        try:
+            slice(a, start, end)
+            assert False, f"Expected a slice error for {start}..{end}"
+        except Exception as e:
+            assert str(e) == f"Array slice out of range: {start}..{end}"
+
+
+def test_fill_and_copy():
+    print("test fill and copy")
+    a = float_array(4)
+    fill(a, 1.5)
+    assert list(a) == [1.5] * 4
+    fill(slice(a, 2, 4), 2.0)
+    assert list(a) == [1.5, 1.5, 2.0, 2.0]
+    b = [0, 0]
+    fill(b, 9)
+    assert b == [9, 9]
+    copy(slice(a, 0, 2), [3.0, 4.0])
+    assert list(a) == [3.0, 4.0, 2.0, 2.0]
+    c = float_array(4)
+    copy(c, a)
+    assert c == a
+    copy(b, slice(a, 2, 4))
+    assert b == [2.0, 2.0]
+    try:
+        copy(c, b)
+        assert False, "Expected a copy length error"
+    except Exception as e:
+        assert str(e) == "Cannot copy 2 elements into 4"
+
+
+def test_elementwise():
+    print("test elementwise")
+    assert elementwise("+", [1, 2, 3], [10, 20, 30]) == [11, 22, 33]
+    assert elementwise("*", [1, 2, 3], 2.0) == [2.0, 4.0, 6.0]
+    assert elementwise("-", 10, [1, 2]) == [9, 8]
+    assert elementwise("/", [1, 3], [2, 4]) == [0.5, 0.75]
+    assert elementwise("<", [1, 5, 3], [2, 2, 3]) == [1, 0, 0]
+    assert elementwise("==", [1, 5, 3], 3) == [0, 0, 1]
+    a = float_array(3)
+    copy(a, [1.0, 2.0, 3.0])
+    b = elementwise("+", a, [1.0, 1.0, 1.0])
+    assert type(b) is array.array and b.typecode == "d"
+    assert list(b) == [2.0, 3.0, 4.0]
+    c = elementwise(">=", slice(a, 0, 2), 2.0)
+    assert type(c) is array.array and c.typecode == "q"
+    assert list(c) == [0, 1]
+    for tag, left, right, message in [
+        ("+", [1, 2], [1], "Array length mismatch: 2 + 1"),
+        ("/", [1, 2], [1, 0], "Division by zero"),
+        ("/", [1, 2], 0, "Division by zero"),
+    ]:
+        try:
+            elementwise(tag, left, right)
+            assert False, f"Expected an error from {left} {tag} {right}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+    # integers grow past 64 bits in lists, but not in typed arrays
+    assert elementwise("*", [2**62], 4) == [2**64]
+    big = int_array(2)
+    big[0] = 2**63 - 1
+    for tag, left, right, message in [
+        ("+", [[1, 2], [3, 4]], 1, "Cannot apply + elementwise to nested arrays"),
+        ("+", [[1], [2]], [[3], [4]], "Cannot apply + elementwise to nested arrays"),
+        ("+", big, 1, "Typed array + overflows 8-byte integers"),
+    ]:
+        try:
+            elementwise(tag, left, right)
+            assert False, f"Expected an error from {left} {tag} {right}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+
+
+def test_numpy_elementwise():
+    print("test numpy elementwise")
+    if numpy == None:
+        print("  skipped, NumPy is not installed")
+        return
+    typed = int_array(2)
+    copy(typed, [3, -4])
+    for tag, left, right, expected in [
+        ("+", [1, 2, 3], [10, 20, 30], [11, 22, 33]),
+        ("*", [1, 2, 3], 2.0, [2.0, 4.0, 6.0]),
+        ("/", [1, 3], [2, 4], [0.5, 0.75]),
+        ("<", [1, 5, 3], [2, 2, 3], [1, 0, 0]),
+        ("*", [2**31, 1], 2**31, [2**62, 2**31]),
+    ]:
+        assert numpy_elementwise(tag, left, right, False) == expected
+    result = numpy_elementwise("-", typed, [1, 1], True)
+    assert type(result) is array.array and list(result) == [2, -5]
+    result = numpy_elementwise("*", typed, 2**60, True)
+    assert list(result) == [3 * 2**60, -(2**62)]
+    # integers that might leave int64 are left to Python, as are values that
+    # aren't numbers and nested lists, which NumPy would broadcast
+    for tag, left, right in [
+        ("*", [2**62], 4),
+        ("+", [2**62, 1], [2**62, 1]),
+        ("-", [-(2**63)], 1),
+        ("*", typed, 2**62),
+        ("+", [2**64], 1),
+        ("+", ["a"], "b"),
+        ("+", [[1, 2], [3, 4]], 1),
+        ("+", [[1], [1, 2]], 1),
+    ]:
+        assert numpy_elementwise(tag, left, right, False) == None
+
+
+def test_reductions():
+    print("test reductions")
+    a = float_array(3)
+    copy(a, [1.0, -2.0, 3.5])
+    for values in [a, [1.0, -2.0, 3.5]]:
+        assert total(values) == 2.5
+        assert minimum(values) == -2.0
+        assert maximum(values) == 3.5
+        assert dot(values, values) == 1.0 + 4.0 + 12.25
+    assert total([]) == 0
+    # typed integers add up past 64 bits, without wrapping around
+    big = int_array(4)
+    fill(big, 2**62)
+    assert total(big) == 2**64 and dot(big, big) == 4 * 2**124
+    assert total(slice(big, 0, 2)) == 2**63
+    try:
+        minimum([])
+        assert False, "Expected an empty array error"
+    except Exception as e:
+        assert str(e) == "Cannot take the minimum of an empty array"
+
+
+if __name__ == "__main__":
+    print("test arrays...")
+    test_typed_arrays()
+    test_slice()
+    test_fill_and_copy()
+    test_elementwise()
+    test_numpy_elementwise()
+    test_reductions()
+    print("done.")
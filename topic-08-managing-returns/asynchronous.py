@@ -0,0 +1,367 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+import time
+
+import limits
+import output
+import reader
+from evaluator import bind_values, check_returning, evaluate, from_python, to_python
+from parser import children
+from arrays import check_index, store
+from objects import make_object, set_property
+
+# evaluate_async() runs a program as a coroutine, so that one event loop can
+# run many programs while they wait on input or on extern functions that
+# return awaitables, such as "asyncio.sleep". Only the nodes that contain a
+# function call or an input are evaluated here; everything else, such as a
+# loop of arithmetic, is handed to the plain evaluate() as a whole, without
+# a coroutine per node.
+
+# the coroutine function that reads a line of input for the running task,
+# or None to read from reader in a thread
+line_reader = contextvars.ContextVar("line_reader", default=None)
+
+# the limits of the program running in each task, and what it has used of
+# them: tasks take turns at the evaluator, so each one puts its own limits
+# in place when it resumes, and keeps them here while it waits
+program_limits = contextvars.ContextVar("program_limits", default=None)
+
+# reads from reader in threads, one at a time
+reader_lock = threading.Lock()
+
+# the children each expression node evaluates, in order
+operands = {
+    "negate": ["value"],
+    "not": ["value"],
+    "<property>": ["expression"],
+    "<index>": ["expression", "index"],
+}
+
+
+def suspends(ast):
+    """
+    Checks whether evaluating a node might wait, because it calls a function
+    or reads input. The answer is cached on the node.
+    """
+    if ast == None:
+        return False
+    if "$suspends" not in ast:
+        tag = ast["tag"]
+        if tag in ["input", "<function_call>"]:
+            result = True
+        elif tag == "function":
+            # defining a function doesn't run its body
+            result = False
+        else:
+            result = any(suspends(child) for child in children(ast, evaluated=True))
+        ast["$suspends"] = result
+    return ast["$suspends"]
+
+
+async def wait(awaitable):
+    """
+    Waits on awaitable while other tasks run, keeping this task's limits.
+    """
+    program_limits.set(limits.save())
+    try:
+        return await awaitable
+    finally:
+        limits.restore(program_limits.get())
+
+
+def read_line_locked():
+    with reader_lock:
+        return reader.read_line()
+
+
+async def evaluate_list(ast, environment):
+    values = []
+    while ast:
+        value, _ = await evaluate_async(ast, environment)
+        values.append(value)
+        ast = ast.get("next", None)
+    return values
+
+
+async def evaluate_async(ast, environment):
+    """
+    Evaluates ast like evaluate(), as a coroutine that can wait at input and
+    at extern calls that return awaitables.
+    """
+    if not suspends(ast):
+        return evaluate(ast, environment)
+    tag = ast["tag"]
+
+    if tag == "input":
+        read_line = line_reader.get()
+        if read_line == None:
+            return await wait(asyncio.to_thread(read_line_locked)), False
+        return await wait(read_line()), False
+
+    if tag == "<function_call>":
+        function, _ = await evaluate_async(ast["expression"], environment)
+        if function["tag"] == "extern":
+            arguments = [
+                to_python(value, environment)
+                for value in await evaluate_list(ast["arguments"], environment)
+            ]
+            result = function["function"](*arguments)
+            if inspect.isawaitable(result):
+                result = await wait(result)
+            return from_python(result), False
+        assert function["tag"] == "function"
+        function_environment = {}
+        parameters = function["parameters"]
+        arguments = await evaluate_list(ast["arguments"], environment)
+        while parameters:
+            assert arguments
+            function_environment[parameters["value"]] = arguments.pop(0)
+            parameters = parameters.get("next", None)
+        assert arguments == []
+        function_environment["$parent"] = environment
+        limits.enter()
+        try:
+            result, returning = await evaluate_async(
+                function["body"], function_environment
+            )
+        finally:
+            limits.leave()
+        check_returning(returning)
+        return result, False
+
+    if tag == "<array>":
+        return await evaluate_list(ast["elements"], environment), False
+
+    if tag == "<object>":
+        values = await evaluate_list(ast["values"], environment)
+        return make_object(ast, values), False
+
+    if tag == "block":
+        value, returning = await evaluate_async(ast.get("statement"), environment)
+        if ast.get("next") and not returning:
+            value, returning = await evaluate_async(ast["next"], environment)
+        if returning:
+            return value, returning
+        return None, False
+
+    if tag == "if":
+        condition, _ = await evaluate_async(ast["condition"], environment)
+        branch = ast["then"] if condition else ast.get("else", None)
+        value, returning = await evaluate_async(branch, environment)
+        if returning:
+            return value, returning
+        return None, False
+
+    if tag in ["while", "for"]:
+        await evaluate_async(ast.get("init"), environment)
+        while True:
+            if ast.get("condition"):
+                condition, _ = await evaluate_async(ast["condition"], environment)
+                if not condition:
+                    break
+            limits.countdown -= 1
+            if limits.countdown <= 0:
+                limits.check()
+            value, returning = await evaluate_async(ast["do"], environment)
+            if returning == "break":
+                break
+            if returning == True:
+                return value, returning
+            await evaluate_async(ast.get("step"), environment)
+        return None, False
+
+    if tag == "return":
+        value, _ = await evaluate_async(ast.get("value", None), environment)
+        return value, True
+
+    if tag == "print":
+        output.print_values(await evaluate_list(ast.get("arguments"), environment))
+        return None, False
+
+    if tag == "=":
+        target = ast["target"]
+        if target["tag"] == "<index>":
+            array, _ = await evaluate_async(target["expression"], environment)
+            index, _ = await evaluate_async(target["index"], environment)
+            check_index(array, index)
+            value, _ = await evaluate_async(ast["value"], environment)
+            store(array, index, value)
+            return None, False
+        if target["tag"] == "<property>":
+            object_value, _ = await evaluate_async(target["expression"], environment)
+            value, _ = await evaluate_async(ast["value"], environment)
+            set_property(object_value, target, value)
+            return None, False
+        value, _ = await evaluate_async(ast["value"], environment)
+        environment[target["value"]] = value
+        return None, False
+
+    # an operator, or exit: evaluate the operands in order, then have
+    # evaluate() apply it to their values
+    values = {}
+    for key in operands.get(tag, ["left", "right"] if tag != "exit" else ["value"]):
+        values[key], _ = await evaluate_async(ast[key], environment)
+    nodes, bindings = bind_values(values, environment)
+    return evaluate(dict(ast, **nodes), bindings)
+
+
+async def evaluate_program(ast, environment, steps=None, depth=None, seconds=None):
+    """
+    Evaluates ast like evaluate_async(), within limits of its own, as one of
+    many programs running in their own tasks.
+    """
+    limits.start(steps, depth, seconds)
+    try:
+        value, returning = await evaluate_async(ast, environment)
+        check_returning(returning)
+        return value, returning
+    finally:
+        limits.stop()
+
+
+import io
+
+from tokenizer import tokenize
+from parser import parse
+
+programs = [
+    "{x = 1 + 2 * 3; y = -x; z = !y}",
+    "{function f(n) {if (n < 2) return n else return f(n - 1) + f(n - 2)}; x = f(10)}",
+    "{function g(a) {return a * 2}; x = g(g(1)) + g(3) * g(4) - [g(5), 6][0]}",
+    "{a = [1, 2, 3]; function h() {return 1}; a[h()] = h() + 10; x = a[h()]}",
+    "{p = {x: 1, y: 2}; function h() {return 3}; p.x = h(); z = {w: h()}; x = p.x + z.w}",
+    "{function h() {return 1}; i = 0; while (i < 5) {i = i + h(); if (i == 3) break}}",
+    "{function h() {return 1}; s = 0; for (i = 0; i < 5; i = i + h()) {s = s + i}}",
+    '{extern sqrt = "math.sqrt"; x = sqrt(16) + length("abc")}',
+]
+
+
+def test_suspends():
+    print("test suspends")
+    # a loop without calls or input runs in evaluate(), as a whole
+    ast = parse(tokenize("{i = 0; while (i < 10) {i = i + 1}}"))
+    assert not suspends(ast)
+    ast = parse(tokenize("{i = 0; while (i < 10) {i = i + 1}; y = input()}"))
+    assert suspends(ast) and not suspends(ast["statement"])
+    assert suspends(ast["next"])
+    # defining a function doesn't call anything
+    ast = parse(tokenize("function f() {return f()}"))
+    assert not suspends(ast)
+    # later items of a list don't make earlier ones wait
+    ast = parse(tokenize("x = [1, f()]"))
+    assert suspends(ast) and not suspends(ast["value"]["elements"])
+
+
+def test_evaluate_async():
+    print("test evaluate async")
+    for code in programs:
+        ast = parse(tokenize(code))
+        expected = {}
+        evaluate(ast, expected)
+        environment = {}
+        asyncio.run(evaluate_async(parse(tokenize(code)), environment))
+        # compare the plain values; functions and objects are not equal copies
+        values, expected_values = [
+            {
+                name: value
+                for name, value in variables.items()
+                if type(value) in [int, float, str, list]
+            }
+            for variables in [environment, expected]
+        ]
+        assert values == expected_values, f"{code}: {values} != {expected_values}"
+        assert values
+
+
+def test_concurrent_programs():
+    print("test concurrent programs")
+    code = """{
+        extern sleep = "asyncio.sleep";
+        lines = 0;
+        line = input();
+        while (line != null) {sleep(0.01); lines = lines + 1; line = input()}
+    }"""
+    ast = parse(tokenize(code))
+    count = 200
+
+    async def run(lines):
+        async def read_line():
+            await asyncio.sleep(0.001)
+            return lines.pop(0) if lines else None
+
+        line_reader.set(read_line)
+        environment = {}
+        await evaluate_async(ast, environment)
+        return environment["lines"]
+
+    async def main():
+        return await asyncio.gather(*[run(["a"] * (i % 5)) for i in range(count)])
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    assert results == [i % 5 for i in range(count)]
+    # the programs waited together, not one after another for 4 seconds
+    assert time.perf_counter() - start < 2
+
+
+def test_program_limits():
+    print("test program limits")
+    code = """{
+        extern sleep = "asyncio.sleep";
+        function down(n) {sleep(0.001); if (n == 0) return 0 else return down(n - 1)};
+        x = down(n)
+    }"""
+    ast = parse(tokenize(code))
+
+    async def run(n, **program_limits):
+        environment = {"n": n}
+        try:
+            await evaluate_program(ast, environment, **program_limits)
+        except limits.LimitExceeded as e:
+            return e.resource
+        return environment["x"]
+
+    async def main():
+        # the programs' depths don't add up while they wait together
+        programs = [run(9, depth=10) for _ in range(5)]
+        # and only the program that goes past its limit stops
+        programs += [run(100, steps=50), run(100), run(10, depth=10)]
+        return await asyncio.gather(*programs)
+
+    assert asyncio.run(main()) == [0] * 5 + ["steps", 0, "depth"]
+    assert limits.max_steps == None and limits.depth == 0
+
+
+def test_shared_reader():
+    print("test shared reader")
+    ast = parse(tokenize("x = input()"))
+    lines = [f"line {i}" for i in range(20)]
+    old_source = reader.redirect(
+        io.BytesIO("".join(f"{line}\n" for line in lines).encode())
+    )
+
+    async def run():
+        environment = {}
+        await evaluate_async(ast, environment)
+        return environment["x"]
+
+    async def main():
+        return await asyncio.gather(*[run() for _ in lines])
+
+    try:
+        # each line is read by one program, whole
+        assert sorted(asyncio.run(main())) == sorted(lines)
+    finally:
+        reader.restore(old_source)
+
+
+if __name__ == "__main__":
+    print("test asynchronous...")
+    test_suspends()
+    test_evaluate_async()
+    test_concurrent_programs()
+    test_program_limits()
+    test_shared_reader()
+    print("done.")
@@ -0,0 +1,246 @@
+import io
+import marshal
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from tokenizer import tokenize
+from parser import parse, children
+import evaluator
+import limits
+import output
+import reader
+import snapshot
+
+# A batch runs many small independent programs, each a (source, environment)
+# job, in a pool of worker processes that stay up between batches. Workers
+# have the interpreter imported already and keep the ASTs they have parsed,
+# so a program that is run again isn't parsed again by that worker. Sources
+# given to start() are parsed once, here, and handed to every worker.
+
+# ASTs by source, in this process
+asts = {}
+# the most ASTs a worker keeps before starting over
+cache_size = 1000
+
+state = {"pool": None, "workers": None}
+
+# statements that reach outside the interpreter, which sandboxed jobs can't use
+host_tags = ["extern", "import"]
+
+
+def parse_program(source):
+    # wrap the source to allow multiple statements, as the REPL does
+    return parse(tokenize("{" + source + "}"))
+
+
+def parse_source(source):
+    if source not in asts:
+        if len(asts) >= cache_size:
+            asts.clear()
+        asts[source] = parse_program(source)
+    return asts[source]
+
+
+def warm(compact_asts):
+    """
+    Starts a worker with the ASTs parsed before the pool started.
+    """
+    for source, compact in compact_asts.items():
+        asts[source] = marshal.loads(compact)
+
+
+def check_sandboxed(ast):
+    """
+    Raises an error if ast uses a statement that sandboxed jobs can't use.
+    """
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        if node["tag"] in host_tags:
+            raise Exception(f"'{node['tag']}' is not allowed in a sandboxed job")
+        nodes.extend(children(node))
+
+
+def run_job(job, steps=None, depth=None, seconds=None, sandboxed=False):
+    """
+    Runs one (source, environment) job, returning a result with the final
+    environment pickled as a snapshot, the output printed, and any error.
+    """
+    source, environment = job
+    environment = dict(environment)
+    result = {"environment": None, "output": "", "error": None, "exit_code": None}
+    stream = io.StringIO()
+    old_sink = output.redirect(stream)
+    # a job has no input, rather than the worker's
+    old_source = reader.redirect(io.BytesIO())
+    # nor the modules imported by other jobs, whose values it could change
+    old_modules = dict(evaluator.modules)
+    evaluator.modules.clear()
+    try:
+        ast = parse_source(source)
+        if sandboxed:
+            check_sandboxed(ast)
+        limits.evaluate(ast, environment, steps, depth, seconds)
+    except SystemExit as e:
+        result["exit_code"] = e.code
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        evaluator.modules.clear()
+        evaluator.modules.update(old_modules)
+        reader.restore(old_source)
+        output.restore(old_sink)
+    result["output"] = stream.getvalue()
+    data = io.BytesIO()
+    try:
+        snapshot.Pickler(data, pickle.HIGHEST_PROTOCOL).dump(environment)
+        result["environment"] = data.getvalue()
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        result["error"] = result["error"] or f"Cannot return environment: {e}"
+    return result
+
+
+def run_chunk(jobs, steps, depth, seconds, sandboxed):
+    return [run_job(job, steps, depth, seconds, sandboxed) for job in jobs]
+
+
+def start(workers=None, sources=()):
+    """
+    Starts the pool of worker processes, with the ASTs of sources parsed.
+    """
+    stop()
+    # fresh ASTs, without anything cached on them by evaluation here
+    compact_asts = {source: marshal.dumps(parse_program(source)) for source in sources}
+    state["workers"] = workers or os.cpu_count() or 1
+    state["pool"] = ProcessPoolExecutor(
+        state["workers"], initializer=warm, initargs=(compact_asts,)
+    )
+
+
+def stop():
+    if state["pool"]:
+        state["pool"].shutdown()
+        state["pool"] = None
+
+
+def finish(result):
+    if result["environment"] != None:
+        result["environment"] = snapshot.Unpickler(
+            io.BytesIO(result["environment"])
+        ).load()
+    return result
+
+
+def run(jobs, steps=None, depth=None, seconds=None, sandboxed=False):
+    """
+    Runs (source, environment) jobs in the worker pool, starting it if needed,
+    and returns their results in order. Each result has the job's final
+    "environment", its "output", its "error" message or None, and the code
+    it passed to exit() or None. The limits apply to each job. Sandboxed
+    jobs can't use extern or import, which could reach past the limits.
+    """
+    if state["pool"] == None:
+        start()
+    jobs = list(jobs)
+    # a few chunks per worker, to spread uneven jobs without a message per job
+    size = max(1, len(jobs) // (state["workers"] * 4))
+    chunks = [jobs[i : i + size] for i in range(0, len(jobs), size)]
+    futures = [
+        state["pool"].submit(run_chunk, chunk, steps, depth, seconds, sandboxed)
+        for chunk in chunks
+    ]
+    return [finish(result) for future in futures for result in future.result()]
+
+
+def run_sequential(jobs, steps=None, depth=None, seconds=None, sandboxed=False):
+    """
+    Runs jobs one after another in this process, returning what run() would.
+    """
+    return [finish(run_job(job, steps, depth, seconds, sandboxed)) for job in jobs]
+
+
+import tempfile
+
+
+def test_run():
+    print("test run")
+    jobs = [
+        ("x = a * 2; print(x)", {"a": 1}),
+        ("x = a * 2; print(x)", {"a": 2}),
+        ("print(1); y = 1 / 0", {}),
+        ("print(2); exit(3); print(4)", {}),
+        ('extern sqrt = "math.sqrt"; r = sqrt(a); s = input()', {"a": 9}),
+        ("while (1) {x = 1}", {}),
+    ]
+    start(2, sources=[jobs[0][0]])
+    try:
+        results = run(jobs, steps=100)
+        # the pool stays up for the next batch
+        assert run(jobs[:1]) == results[:1]
+    finally:
+        stop()
+    assert results == run_sequential(jobs, steps=100)
+    assert results[0] == {
+        "environment": {"a": 1, "x": 2},
+        "output": "2 \n",
+        "error": None,
+        "exit_code": None,
+    }
+    assert results[1]["environment"]["x"] == 4
+    assert results[2]["output"] == "1 \n" and results[2]["error"] == "Division by zero"
+    assert results[3]["output"] == "2 \n" and results[3]["exit_code"] == 3
+    environment = results[4]["environment"]
+    assert environment["r"] == 3.0 and environment["s"] == None
+    assert environment["sqrt"]["function"] is evaluator.resolve_extern("math.sqrt")
+    assert results[5]["error"] == "Exceeded the steps limit: used 101 of 100"
+
+
+def test_ast_cache():
+    print("test ast cache")
+    asts.clear()
+    run_sequential([("x = 1", {}), ("x = 1", {})])
+    assert list(asts) == ["x = 1"]
+    ast = asts["x = 1"]
+    run_sequential([("x = 1", {})])
+    assert asts["x = 1"] is ast
+    # ASTs handed to a worker at the start are used as they are
+    warm({"y = 2": marshal.dumps({"tag": "<number>", "value": 5})})
+    assert run_sequential([("y = 2", {})])[0]["error"] == None
+    assert parse_source("y = 2") == {"tag": "<number>", "value": 5}
+    asts.clear()
+
+
+def test_isolation():
+    print("test isolation")
+    with tempfile.TemporaryDirectory() as directory:
+        module = os.path.join(directory, "m.t")
+        with open(module, "w") as f:
+            f.write("arr = [1, 2]")
+        jobs = [
+            (f'import "{module}"; arr[0] = 99', {}),
+            (f'import "{module}"; x = arr[0]', {}),
+        ]
+        # a job doesn't see what an earlier job in its worker did to a module
+        start(1)
+        try:
+            results = run(jobs)
+        finally:
+            stop()
+        assert results[0]["error"] == None and results[1]["environment"]["x"] == 1
+        assert run_sequential(jobs)[1]["environment"]["x"] == 1
+        results = run_sequential(jobs, sandboxed=True)
+        assert results[1]["error"] == "'import' is not allowed in a sandboxed job"
+    [result] = run_sequential([('extern sh = "os.system"', {})], sandboxed=True)
+    assert result["error"] == "'extern' is not allowed in a sandboxed job"
+    # built in functions are still there
+    [result] = run_sequential([("x = length([1, 2])", {})], sandboxed=True)
+    assert result["environment"]["x"] == 2
+
+
+if __name__ == "__main__":
+    print("test batch...")
+    test_run()
+    test_ast_cache()
+    test_isolation()
+    print("done.")
@@ -0,0 +1,482 @@
+import asyncio
+import io
+import mmap
+import os
+import tempfile
+import time
+import tracemalloc
+
+from tokenizer import tokenize
+from parser import parse
+from evaluator import evaluate
+import asynchronous
+import batch
+import loader
+import output
+import snapshot
+import instrument
+import limits
+import parallel
+import sampler
+import reader
+
+# the Newton's method square root from the evaluator tests
+square_root = """{
+    function abs(x) {
+        if (x > 0) { return x; } else {return -x;}
+    };
+    function squareRoot(number) {
+        guess = number / 2;
+        while (abs(guess * guess - number) > tolerance) {
+            guess = (guess + number / guess) / 2;
+        };
+        return guess;
+    };
+    tolerance = 0.00000001;
+    extern sqrt = "math.sqrt"
+}"""
+
+
+def measure(f, repeat=5):
+    """
+    Returns the best wall-clock time in seconds over repeat calls of f().
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, count, unit, seconds):
+    print(f"  {name}: {count / seconds:,.0f} {unit}/sec ({seconds * 1000:.2f} ms)")
+
+
+def benchmark_identifier_heavy_tokenize():
+    print("benchmark identifier-heavy tokenize")
+    names = ["iffy", "printer", "format", "returned", "whileLoop", "elsewhere"]
+    names += ["alpha", "beta_2", "nullable", "trueValue", "input_count", "x"]
+    line = " = ".join(names) + ";\n"
+    code = line * 2000
+    count = len(tokenize(code))
+    report("identifiers", count, "tokens", measure(lambda: tokenize(code)))
+
+
+def benchmark_file_source_load():
+    print("benchmark file source load")
+    code = "x = x + 1;\ny = x * 2 - y / 3;\nprint(x, y);\n" * 20000
+    with tempfile.NamedTemporaryFile("w", suffix=".t", delete=False) as f:
+        f.write(code)
+
+    def read_and_wrap():
+        with open(f.name, "r") as source:
+            tokenize("{" + source.read() + "}")
+
+    def map_in_place():
+        with open(f.name, "rb") as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                tokenize(mapped)
+
+    try:
+        report("read+wrap", len(code), "bytes", measure(read_and_wrap, repeat=3))
+        report("mmap", len(code), "bytes", measure(map_in_place, repeat=3))
+    finally:
+        os.remove(f.name)
+
+
+def benchmark_import_project():
+    print("benchmark import project")
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = []
+        for i in range(8):
+            filenames.append(os.path.join(directory, f"module{i}.t"))
+            with open(filenames[-1], "w") as f:
+                f.write(f"function f{i}(x) {{ return x * x + 1 }};\n")
+                f.write("y = f(x, 2) * (x - 1) / 3;\n" * 400)
+        main = parse(tokenize("{" + ";".join(f'import "{f}"' for f in filenames) + "}"))
+
+        def sequential():
+            loader.asts.clear()
+            for filename in filenames:
+                loader.parse_file(filename)
+
+        def parallel():
+            loader.asts.clear()
+            loader.preload(main)
+
+        report("sequential", len(filenames), "modules", measure(sequential, repeat=3))
+        report("parallel", len(filenames), "modules", measure(parallel, repeat=3))
+
+
+def benchmark_extern_square_root():
+    print("benchmark extern square root")
+    environment = {}
+    evaluate(parse(tokenize(square_root)), environment)
+    interpreted = parse(tokenize("squareRoot(12345)"))
+    extern = parse(tokenize("sqrt(12345)"))
+    count = 200
+    timing = measure(lambda: [evaluate(interpreted, environment) for _ in range(count)])
+    report("squareRoot", count, "calls", timing)
+    timing = measure(lambda: [evaluate(extern, environment) for _ in range(count)])
+    report("extern sqrt", count, "calls", timing)
+
+
+def benchmark_indexed_loop():
+    print("benchmark indexed loop")
+    environment = {}
+    evaluate(
+        parse(tokenize("{a = []; i = 0; while (i < 1000) {append(a, i); i = i + 1}}")),
+        environment,
+    )
+    loop = parse(tokenize("{i = 0; while (i < 1000) {a[i] = a[i] + 1; i = i + 1}}"))
+    report(
+        "a[i] = a[i] + 1",
+        1000,
+        "iterations",
+        measure(lambda: evaluate(loop, environment)),
+    )
+
+
+def benchmark_typed_array_memory():
+    print("benchmark typed array memory")
+    n = 100000
+    for name, code in [
+        (
+            "list",
+            f"{{a = []; i = 0; while (i < {n}) {{append(a, i + 0.5); i = i + 1}}}}",
+        ),
+        (
+            "float_array",
+            f"{{a = float_array({n}); i = 0; while (i < {n}) {{a[i] = i + 0.5; i = i + 1}}}}",
+        ),
+    ]:
+        ast = parse(tokenize(code))
+        tracemalloc.start()
+        environment = {}
+        evaluate(ast, environment)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name}: {size / n:.1f} bytes/element")
+
+
+def benchmark_vectorized_operators():
+    print("benchmark vectorized operators")
+    n = 10000
+    environment = {}
+    setup = f"{{a = float_array({n}); b = float_array({n}); c = float_array({n}); fill(a, 1.5); fill(b, 2.5)}}"
+    evaluate(parse(tokenize(setup)), environment)
+    scalar = parse(
+        tokenize("{i = 0; while (i < length(a)) {c[i] = a[i] * b[i] + 1; i = i + 1}}")
+    )
+    vector = parse(tokenize("c = a * b + 1"))
+    report(
+        "scalar loop",
+        n,
+        "elements",
+        measure(lambda: evaluate(scalar, environment), repeat=3),
+    )
+    report("vectorized", n, "elements", measure(lambda: evaluate(vector, environment)))
+
+
+def benchmark_records():
+    print("benchmark records")
+    environment = {}
+    build = parse(
+        tokenize(
+            "{points = []; i = 0; while (i < 1000) {append(points, {x: i, y: i * 2}); i = i + 1}}"
+        )
+    )
+    walk = parse(
+        tokenize(
+            "{total = 0; i = 0; while (i < 1000) {p = points[i]; p.x = p.x + 1; total = total + p.x + p.y; i = i + 1}}"
+        )
+    )
+    report("build", 1000, "records", measure(lambda: evaluate(build, environment)))
+    report("access", 1000, "records", measure(lambda: evaluate(walk, environment)))
+
+
+def benchmark_string_building():
+    print("benchmark string building")
+    n = 100000
+    code = f'{{s = ""; i = 0; while (i < {n}) {{s = s + "0123456789"; i = i + 1}}; t = length(s)}}'
+    ast = parse(tokenize(code))
+    report("s = s + x", n, "appends", measure(lambda: evaluate(ast, {}), repeat=3))
+
+
+def benchmark_loop_overhead():
+    print("benchmark loop overhead")
+    n = 20000
+    for name, code in [
+        ("while", f"{{i = 0; while (i < {n}) {{i = i + 1}}}}"),
+        ("for", f"for (i = 0; i < {n}; i = i + 1) {{}}"),
+        ("for, stepping by 1.0", f"for (i = 0; i < {n}; i = i + 1.0) {{}}"),
+    ]:
+        ast = parse(tokenize(code))
+        seconds = measure(lambda: evaluate(ast, {}), repeat=3)
+        print(f"  {name}: {seconds / n * 1e9:,.0f} ns/iteration")
+
+
+def benchmark_print_output():
+    print("benchmark print output")
+    n = 20000
+    ast = parse(tokenize(f"for (i = 0; i < {n}; i = i + 1) print(i, i * 2)"))
+    threshold = output.threshold
+    with tempfile.TemporaryFile("w") as f:
+
+        def run():
+            old_sink = output.redirect(f)
+            try:
+                evaluate(ast, {})
+            finally:
+                output.restore(old_sink)
+
+        try:
+            # a zero threshold writes every line as it is printed
+            output.threshold = 0
+            report("write per line", n, "lines", measure(run, repeat=3))
+        finally:
+            output.threshold = threshold
+        report("buffered", n, "lines", measure(run, repeat=3))
+
+
+def benchmark_input_records():
+    print("benchmark input records")
+    n = 20000
+    ast = parse(
+        tokenize(
+            "{total = 0; n = input_number(); while (n != null) {total = total + n; n = input_number()}}"
+        )
+    )
+    block_size = reader.block_size
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "records")
+        with open(filename, "wb") as f:
+            f.write(b"".join(b"%d\n" % i for i in range(n)))
+
+        def run():
+            # unbuffered, so each read is a system call, as on a pipe
+            with open(filename, "rb", buffering=0) as f:
+                old_source = reader.redirect(f)
+                try:
+                    evaluate(ast, {})
+                finally:
+                    reader.restore(old_source)
+
+        try:
+            # blocks about a line long make a read per record
+            reader.block_size = 6
+            report("read per line", n, "records", measure(run, repeat=3))
+        finally:
+            reader.block_size = block_size
+        report("block reads", n, "records", measure(run, repeat=3))
+
+
+def benchmark_first_statement():
+    print("benchmark first statement")
+    for n in [500, 5000]:
+        lines = ["x = x + 1;\n"] * n
+
+        def whole():
+            parse(tokenize("{" + "".join(lines) + "}"))
+
+        def streamed():
+            parse(tokenize("{" + next(loader.statements(iter(lines))) + "}"))
+
+        print(
+            f"  {n} statements: whole input {measure(whole, repeat=3) * 1000:.2f} ms,",
+            f"streamed {measure(streamed) * 1000:.3f} ms",
+        )
+
+
+def benchmark_snapshot_restore():
+    print("benchmark snapshot restore")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "setup.t")
+        with open(source, "w") as f:
+            for i in range(200):
+                f.write(f"function f{i}(x) {{ return x * {i} + 1 }};\n")
+            f.write("table = []; for (i = 0; i < 5000; i = i + 1) ")
+            f.write('append(table, {key: i, value: f7(i), label: "item"});\n')
+        filename = os.path.join(directory, "setup.snapshot")
+
+        def run_sources():
+            loader.asts.clear()
+            environment = {}
+            evaluate(loader.parse_file(source), environment)
+            return environment
+
+        snapshot.save(run_sources(), filename)
+        report("run sources", 1, "sessions", measure(run_sources, repeat=3))
+        report(
+            "load snapshot",
+            1,
+            "sessions",
+            measure(lambda: snapshot.load(filename), repeat=3),
+        )
+        print(f"  snapshot size: {os.path.getsize(filename):,} bytes")
+
+
+def benchmark_instrumentation():
+    print("benchmark instrumentation")
+    environment = {}
+    evaluate(parse(tokenize(instrument.fibonacci)), environment)
+    ast = parse(tokenize("fib(14)"))
+    report("off", 1, "runs", measure(lambda: evaluate(ast, environment), repeat=3))
+    report(
+        "on",
+        1,
+        "runs",
+        measure(lambda: instrument.evaluate(ast, environment), repeat=3),
+    )
+    instrument.reset()
+
+
+def benchmark_sampling_overhead():
+    print("benchmark sampling overhead")
+    environment = {}
+    evaluate(parse(tokenize(square_root)), environment)
+    interpreted = parse(tokenize("squareRoot(12345)"))
+    count = 2000
+
+    def run():
+        for _ in range(count):
+            evaluate(interpreted, environment)
+
+    plain = measure(run, repeat=3)
+
+    def sampled():
+        sampler.start()
+        try:
+            run()
+        finally:
+            sampler.stop()
+
+    sampler.reset()
+    timing = measure(sampled, repeat=3)
+    samples = sum(sampler.positions.values())
+    # the time the samples took, against the time the runs took
+    overhead = sampler.sampling_seconds[0] / (timing * 3)
+    sampler.reset()
+    report("squareRoot", count, "calls", plain)
+    report("squareRoot, sampled", count, "calls", timing)
+    print(f"  {samples} samples took {overhead:.1%} of the run time")
+
+
+def benchmark_limits():
+    print("benchmark limits")
+    n = 20000
+    environment = {}
+    evaluate(parse(tokenize(instrument.fibonacci)), environment)
+    for name, ast in [
+        ("while", parse(tokenize(f"{{i = 0; while (i < {n}) {{i = i + 1}}}}"))),
+        ("fib(14)", parse(tokenize("fib(14)"))),
+    ]:
+        plain = measure(lambda: evaluate(ast, environment), repeat=5)
+        limited = measure(
+            lambda: limits.evaluate(ast, environment, 10**9, 1000, 3600), repeat=5
+        )
+        print(f"  {name}: {plain * 1000:.2f} ms, {limited * 1000:.2f} ms limited")
+
+
+def benchmark_batch():
+    print("benchmark batch")
+    sources = [
+        "x = a * 2 + 1; print(x)",
+        "{s = 0; i = 0; while (i < a) {s = s + i; i = i + 1}; print(s)}",
+        "function f(n) {if (n < 2) return n else return f(n - 1) + f(n - 2)}; y = f(8)",
+    ]
+    jobs = [(sources[i % 3], {"a": i % 50}) for i in range(2000)]
+    report(
+        "sequential",
+        len(jobs),
+        "jobs",
+        measure(lambda: batch.run_sequential(jobs), repeat=3),
+    )
+    for workers in [1, 2, 4]:
+        batch.start(workers, sources)
+        try:
+            # the first batch starts the workers
+            batch.run(jobs[:workers])
+            seconds = measure(lambda: batch.run(jobs), repeat=3)
+        finally:
+            batch.stop()
+        report(f"{workers} workers", len(jobs), "jobs", seconds)
+
+
+def benchmark_async():
+    print("benchmark async")
+    n = 20000
+    environment = {}
+    evaluate(parse(tokenize(instrument.fibonacci)), environment)
+    for name, ast in [
+        ("while", parse(tokenize(f"{{i = 0; while (i < {n}) {{i = i + 1}}}}"))),
+        ("fib(14)", parse(tokenize("fib(14)"))),
+    ]:
+        plain = measure(lambda: evaluate(ast, environment), repeat=5)
+        waiting = measure(
+            lambda: asyncio.run(asynchronous.evaluate_async(ast, environment)),
+            repeat=5,
+        )
+        print(f"  {name}: {plain * 1000:.2f} ms, {waiting * 1000:.2f} ms async")
+    # programs that each wait 10 times for 10 ms
+    ast = parse(
+        tokenize(
+            '{extern sleep = "asyncio.sleep"; for (i = 0; i < 10; i = i + 1) {sleep(0.01)}}'
+        )
+    )
+    count = 500
+
+    async def run():
+        await asyncio.gather(
+            *[asynchronous.evaluate_async(ast, {}) for _ in range(count)]
+        )
+
+    seconds = measure(lambda: asyncio.run(run()), repeat=1)
+    report(f"{count} waiting programs", count, "programs", seconds)
+
+
+def benchmark_parallel_arguments():
+    print("benchmark parallel arguments")
+    environment = {}
+    evaluate(parse(tokenize(parallel.functions)), environment)
+    for code in [
+        "add(slow(1), slow(2), slow(3), slow(4))",
+        "add(fib(12), fib(12), fib(12), fib(12))",
+        "add(shout(1), slow(2), slow(3), slow(4))",
+    ]:
+        ast = parse(tokenize(code))
+        old_sink = output.redirect(io.StringIO())
+        try:
+            plain = measure(lambda: evaluate(ast, environment), repeat=3)
+            threaded = measure(lambda: parallel.evaluate(ast, environment), repeat=3)
+        finally:
+            output.restore(old_sink)
+        print(f"  {code}: {plain * 1000:.1f} ms, {threaded * 1000:.1f} ms parallel")
+
+
+if __name__ == "__main__":
+    print("benchmarks...")
+    benchmark_identifier_heavy_tokenize()
+    benchmark_file_source_load()
+    benchmark_import_project()
+    benchmark_extern_square_root()
+    benchmark_indexed_loop()
+    benchmark_typed_array_memory()
+    benchmark_vectorized_operators()
+    benchmark_records()
+    benchmark_string_building()
+    benchmark_loop_overhead()
+    benchmark_print_output()
+    benchmark_input_records()
+    benchmark_first_statement()
+    benchmark_snapshot_restore()
+    benchmark_instrumentation()
+    benchmark_sampling_overhead()
+    benchmark_limits()
+    benchmark_batch()
+    benchmark_async()
+    benchmark_parallel_arguments()
+    print("done.")
@@ -0,0 +1,4 @@
+# Scaled workloads for timing the interpreter, with a runner that compares
+# them against a saved baseline: python -m benchmarks --help
+# The same programs timed against every topic-* version of the interpreter:
+# python -m benchmarks.versions --help
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import platform
+import tracemalloc
+import types
+
+from benchmark import measure
+from benchmarks.workloads import workloads
+
+baseline_file = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+
+
+def language_of(tokenize, parse, evaluate):
+    return types.SimpleNamespace(tokenize=tokenize, parse=parse, evaluate=evaluate)
+
+
+def run_workload(name, language, scale=1, repeat=3):
+    """
+    Times a workload, best of repeat runs, then runs it once more under
+    tracemalloc for its peak memory.
+    """
+    workload, unit = workloads[name]
+    count, run = workload(language, scale)
+    seconds = measure(run, repeat)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "unit": unit,
+        "operations": count,
+        "seconds": seconds,
+        "ops_per_second": count / seconds,
+        "peak_bytes": peak,
+    }
+
+
+def load_baseline(filename, scale):
+    """
+    Returns the saved results for a scale, or {} if there are none.
+    """
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        baseline = json.load(f)
+    if baseline["scale"] != scale:
+        return {}
+    return baseline["results"]
+
+
+def save_baseline(filename, scale, results):
+    with open(filename, "w") as f:
+        json.dump(
+            {"scale": scale, "python": platform.python_version(), "results": results},
+            f,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def format_result(name, result, base=None):
+    line = (
+        f"{name:22} {result['ops_per_second']:>12,.0f} {result['unit']}/sec"
+        f"  peak {result['peak_bytes'] / 1024:>9,.1f} KB"
+    )
+    if base:
+        line += f"  {result['ops_per_second'] / base['ops_per_second']:5.2f}x baseline"
+        line += f", {result['peak_bytes'] / max(base['peak_bytes'], 1):5.2f}x memory"
+    return line
+
+
+def main(arguments=None):
+    from tokenizer import tokenize
+    from parser import parse
+    from evaluator import evaluate
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Times the interpreter workloads."
+    )
+    parser.add_argument("names", nargs="*", help="workloads to run, or all of them")
+    parser.add_argument("--scale", type=int, default=1, help="workload size factor")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each")
+    parser.add_argument("--baseline", default=baseline_file, help="baseline JSON")
+    parser.add_argument(
+        "--save", action="store_true", help="save the results as the baseline"
+    )
+    options = parser.parse_args(arguments)
+    for name in options.names:
+        if name not in workloads:
+            parser.error(f"unknown workload {name}; choose from {', '.join(workloads)}")
+    language = language_of(tokenize, parse, evaluate)
+    baseline = load_baseline(options.baseline, options.scale)
+    results = {}
+    for name in options.names or workloads:
+        results[name] = run_workload(name, language, options.scale, options.repeat)
+        print(format_result(name, results[name], baseline.get(name)))
+    if options.save:
+        save_baseline(options.baseline, options.scale, results)
+        print(f"saved {options.baseline}")
+    return results
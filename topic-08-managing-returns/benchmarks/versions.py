@@ -0,0 +1,232 @@
+# Times the same programs against every topic-* interpreter in the repo, to
+# show what each step of its evolution cost: python -m benchmarks.versions
+#
+# Each topic directory has its own tokenizer, parser and evaluator modules
+# with the same names, so each runs in a child process of its own, started
+# on this file with the topic directory first on sys.path. The child only
+# uses the standard library, and prints its results as JSON.
+
+import argparse
+import glob
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+
+repository = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+def expression(scale):
+    # numbers only, which every version can read
+    terms = 100 * scale
+    code = " + ".join(f"({i} * 2 - 1) / 3" for i in range(terms))
+    expected = sum((i * 2 - 1) / 3 for i in range(terms))
+    return code, {}, None, lambda result, environment: result == expected
+
+
+def assignment(scale):
+    terms = 100 * scale
+    code = "x = " + " + ".join(f"(a * {i} - b) / 3" for i in range(terms))
+    expected = sum((2 * i - 1) / 3 for i in range(terms))
+    return (
+        code,
+        {"a": 2, "b": 1},
+        None,
+        lambda _, environment: environment["x"] == expected,
+    )
+
+
+def while_loop(scale):
+    count = 2000 * scale
+    code = f"{{i = 0; s = 0; while (i < {count}) {{s = s + i * 2 - 1; i = i + 1}}}}"
+    expected = count * (count - 2)
+    return code, {}, count, lambda _, environment: environment["s"] == expected
+
+
+# the programs in the common subset, which each return (code, bindings,
+# operations, check), with the unit evaluation is counted in: AST nodes, or
+# the operations given. A version that can't run a program is left out of
+# its table.
+programs = {
+    "expression": (expression, "nodes"),
+    "assignment": (assignment, "nodes"),
+    "while_loop": (while_loop, "iterations"),
+}
+
+
+def best_time(f, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def count_nodes(ast):
+    if type(ast) is dict:
+        return 1 + sum(count_nodes(value) for value in ast.values())
+    if type(ast) is list:
+        return sum(count_nodes(value) for value in ast)
+    return 0
+
+
+def time_program(name, scale, repeat):
+    """
+    Times tokenizing, parsing and evaluating a program with the interpreter
+    on sys.path, returning rates, or None if the interpreter can't run it.
+    """
+    from tokenizer import tokenize
+    from parser import parse
+    from evaluator import evaluate
+
+    program, unit = programs[name]
+    code, bindings, operations, check = program(scale)
+    # the first version's evaluate() has no environment
+    takes_environment = len(inspect.signature(evaluate).parameters) > 1
+
+    def run(ast):
+        environment = dict(bindings)
+        if takes_environment:
+            result = evaluate(ast, environment)
+        else:
+            result = evaluate(ast)
+        # later versions return (value, environment) or (value, returning)
+        if type(result) is tuple:
+            result = result[0]
+        return result, environment
+
+    try:
+        tokens = len(tokenize(code))
+        ast = parse(tokenize(code))
+        if operations == None:
+            operations = count_nodes(ast)
+        if not check(*run(ast)):
+            return None
+    except Exception:
+        return None
+    # parsing adds an end marker to its tokens, so each parse gets a fresh list
+    token_lists = [tokenize(code) for _ in range(repeat)]
+    return {
+        "unit": unit,
+        "tokenize": tokens / best_time(lambda: tokenize(code), repeat),
+        "parse": tokens / best_time(lambda: parse(token_lists.pop()), repeat),
+        "evaluate": operations / best_time(lambda: run(ast), repeat),
+    }
+
+
+def run_version(directory, names, scale, repeat):
+    """
+    Runs the programs against the interpreter in a topic directory, in a child
+    process, returning {name: rates or None}.
+    """
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), directory]
+        + names
+        + [f"--scale={scale}", f"--repeat={repeat}"],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise Exception(
+            f"Benchmarking {os.path.basename(directory)} failed:\n{completed.stderr}"
+        )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def child(arguments):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--scale", type=int)
+    parser.add_argument("--repeat", type=int)
+    options = parser.parse_args(arguments)
+    sys.path.insert(0, options.directory)
+    # keep anything the interpreter prints out of the results
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        results = {
+            name: time_program(name, options.scale, options.repeat)
+            for name in options.names
+        }
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(results))
+
+
+def format_table(name, versions):
+    """
+    Returns a table of one program's rates in each version that ran it,
+    each with its ratio to the version before.
+    """
+    unit = next(rates["unit"] for rates in versions.values() if rates)
+    width = max(len(name), *[len(version) for version in versions])
+    lines = [
+        f"{name:{width}} {'tokenize':>20} {'parse':>20} {'evaluate':>20}",
+        f"{'':{width}} {'tokens/sec':>20} {'tokens/sec':>20} {unit + '/sec':>20}",
+    ]
+    previous = None
+    for version, rates in versions.items():
+        if rates == None:
+            lines.append(f"{version:{width}} {'-':>20} {'-':>20} {'-':>20}")
+            continue
+        line = f"{version:{width}}"
+        for step in ["tokenize", "parse", "evaluate"]:
+            cell = f"{rates[step]:,.0f}"
+            if previous:
+                cell += f" {rates[step] / previous[step]:5.2f}x"
+            else:
+                cell += " " * 7
+            line += f" {cell:>20}"
+        lines.append(line)
+        previous = rates
+    return "\n".join(lines)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.versions",
+        description="Times the common programs against each topic interpreter.",
+    )
+    parser.add_argument("names", nargs="*", help="programs to run, or all of them")
+    parser.add_argument("--scale", type=int, default=1, help="program size factor")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of each")
+    parser.add_argument(
+        "--topics", default="topic-*", help="glob of topic directories to compare"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    options = parser.parse_args(arguments)
+    for name in options.names:
+        if name not in programs:
+            parser.error(f"unknown program {name}; choose from {', '.join(programs)}")
+    names = options.names or list(programs)
+    directories = sorted(glob.glob(os.path.join(repository, options.topics)))
+    results = {name: {} for name in names}
+    for directory in directories:
+        rates = run_version(directory, names, options.scale, options.repeat)
+        for name in names:
+            results[name][os.path.basename(directory)] = rates[name]
+    for name in names:
+        if any(results[name].values()):
+            print(format_table(name, results[name]))
+            print()
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        child(sys.argv[1:])
+    else:
+        main()
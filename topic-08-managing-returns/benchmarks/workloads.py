@@ -0,0 +1,97 @@
+# Each workload takes a language, an object with tokenize, parse and evaluate
+# functions, and a scale. It returns (operations, run), where run() does the
+# work once and operations counts what it did, for reporting a rate.
+
+
+def lex_huge_expression(language, scale):
+    code = " + ".join(f"x{i} * {i}.5 - (y_{i} / 2)" for i in range(5000 * scale))
+    count = len(language.tokenize(code))
+    return count, lambda: language.tokenize(code)
+
+
+def parse_deep_nesting(language, scale):
+    # nesting is kept shallow enough for the recursive descent to fit the stack
+    depth = 40
+    expression = "(" * depth + "x" + " + 1)" * depth
+    code = "{" + ";".join(f"y = {expression}" for _ in range(20 * scale)) + "}"
+    blocks = "{" * 200 + "x = 1" + "}" * 200
+    count = 20 * scale * depth + 200
+
+    def run():
+        language.parse(language.tokenize(code))
+        language.parse(language.tokenize(blocks))
+
+    return count, run
+
+
+def parse_long_block(language, scale):
+    count = 1000 * scale
+    code = "{" + ";".join(f"x{i % 10} = x{i % 7} * {i} + 1" for i in range(count)) + "}"
+    return count, lambda: language.parse(language.tokenize(code))
+
+
+def while_arithmetic(language, scale):
+    count = 20000 * scale
+    ast = language.parse(
+        language.tokenize(
+            f"{{i = 0; s = 0; while (i < {count}) {{s = s + i * 2 - 1; i = i + 1}}}}"
+        )
+    )
+    return count, lambda: language.evaluate(ast, {})
+
+
+def recursive_calls(language, scale):
+    n = 16 + scale
+    environment = {}
+    language.evaluate(
+        language.parse(
+            language.tokenize(
+                "function fib(n) {if (n < 2) {return n} else {return fib(n - 1) + fib(n - 2)}}"
+            )
+        ),
+        environment,
+    )
+    # the number of calls fib(n) makes
+    calls = [1, 1]
+    while len(calls) <= n:
+        calls.append(calls[-1] + calls[-2] + 1)
+    ast = language.parse(language.tokenize(f"x = fib({n})"))
+    return calls[n], lambda: language.evaluate(ast, environment)
+
+
+square_root = """{
+    function abs(x) {
+        if (x > 0) { return x; } else {return -x;}
+    };
+    function squareRoot(number) {
+        guess = number / 2;
+        while (abs(guess * guess - number) > tolerance) {
+            guess = (guess + number / guess) / 2;
+        };
+        return guess;
+    };
+    tolerance = 0.00000001
+}"""
+
+
+def square_root_loop(language, scale):
+    count = 500 * scale
+    environment = {}
+    language.evaluate(language.parse(language.tokenize(square_root)), environment)
+    ast = language.parse(
+        language.tokenize(
+            f"{{n = 1; while (n < {count + 1}) {{r = squareRoot(n * 97); n = n + 1}}}}"
+        )
+    )
+    return count, lambda: language.evaluate(ast, environment)
+
+
+# in the order they run, with the unit each counts
+workloads = {
+    "lex_huge_expression": (lex_huge_expression, "tokens"),
+    "parse_deep_nesting": (parse_deep_nesting, "levels"),
+    "parse_long_block": (parse_long_block, "statements"),
+    "while_arithmetic": (while_arithmetic, "iterations"),
+    "recursive_calls": (recursive_calls, "calls"),
+    "square_root_loop": (square_root_loop, "roots"),
+}
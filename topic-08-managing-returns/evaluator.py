@@ -1,3 +1,51 @@
+import importlib
+import os
+
+from loader import import_path, parse_file, preload
+import arrays
+import limits
+import output
+import reader
+from arrays import array_types, check_index, elementwise
+from objects import make_object, get_property, set_property
+from parser import children
+from strings import Rope, concatenate, string_types
+
+# the operands the operators handle themselves, checked before any others
+number_types = (int, float)
+
+# evaluated module environments, by absolute path, as (mtime, environment)
+modules = {}
+
+# functions available in every environment, as extern values
+builtin_functions = {
+    "length": {"tag": "extern", "target": "builtins.len", "function": len},
+    "flush": {"tag": "extern", "target": "output.flush", "function": output.flush},
+    "input_number": {
+        "tag": "extern",
+        "target": "reader.read_number",
+        "function": reader.read_number,
+    },
+}
+for name, function in [
+    ("append", arrays.append),
+    ("float_array", arrays.float_array),
+    ("int_array", arrays.int_array),
+    ("slice", arrays.slice),
+    ("fill", arrays.fill),
+    ("copy", arrays.copy),
+    ("sum", arrays.total),
+    ("min", arrays.minimum),
+    ("max", arrays.maximum),
+    ("dot", arrays.dot),
+]:
+    builtin_functions[name] = {
+        "tag": "extern",
+        "target": f"arrays.{function.__name__}",
+        "function": function,
+    }
+
+
 def evaluate(ast, environment):
 
     # None
@@ -21,6 +69,8 @@ def evaluate(ast, environment):
             if ast["value"] in current_environment:
                 return current_environment[ast["value"]], False
             current_environment = current_environment.get("$parent", None)
+        if ast["value"] in builtin_functions:
+            return builtin_functions[ast["value"]], False
         assert current_environment, f"undefined identifier {ast['value']} in expression"
 
     if ast["tag"] == "function":
@@ -30,6 +80,15 @@ def evaluate(ast, environment):
         assert "expression" in ast
         assert "arguments" in ast
         function, _ = evaluate(ast["expression"], environment)
+        if function["tag"] == "extern":
+            # call the Python function directly with the evaluated arguments
+            arguments = []
+            argument = ast["arguments"]
+            while argument:
+                value, _ = evaluate(argument, environment)
+                arguments.append(to_python(value, environment))
+                argument = argument.get("next", None)
+            return from_python(function["function"](*arguments)), False
         assert function["tag"] == "function"
         assert "parameters" in function
         assert "body" in function
@@ -46,11 +105,18 @@ def evaluate(ast, environment):
         assert parameters == None
         assert arguments == None
         function_environment["$parent"] = environment
-        result, returning = evaluate(function["body"], function_environment)
-        return result, returning
+        limits.enter()
+        try:
+            result, returning = evaluate(function["body"], function_environment)
+        finally:
+            limits.leave()
+        if returning in ["break", "continue"]:
+            raise Exception(f"'{returning}' outside a loop")
+        # the return stops at the call
+        return result, False
 
     if ast["tag"] == "return":
-        value, _ = evaluate(ast.get("value",None), environment)
+        value, _ = evaluate(ast.get("value", None), environment)
         return value, True
 
     # unary operations
@@ -70,18 +136,38 @@ def evaluate(ast, environment):
     if ast["tag"] == "+":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return left_value + right_value, False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("+", left_value, right_value), False
+        if type(left_value) in string_types or type(right_value) in string_types:
+            return concatenate(left_value, right_value), False
         return left_value + right_value, False
     if ast["tag"] == "-":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return left_value - right_value, False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("-", left_value, right_value), False
         return left_value - right_value, False
     if ast["tag"] == "*":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return left_value * right_value, False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("*", left_value, right_value), False
         return left_value * right_value, False
     if ast["tag"] == "/":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            if right_value == 0:
+                raise Exception("Division by zero")
+            return left_value / right_value, False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("/", left_value, right_value), False
         # Add error handling for division by zero
         if right_value == 0:
             raise Exception("Division by zero")
@@ -89,30 +175,58 @@ def evaluate(ast, environment):
     if ast["tag"] == "*":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return left_value * right_value, False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("*", left_value, right_value), False
         return left_value * right_value, False
     if ast["tag"] == "<":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value < right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("<", left_value, right_value), False
         return int(left_value < right_value), False
     if ast["tag"] == ">":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value > right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise(">", left_value, right_value), False
         return int(left_value > right_value), False
     if ast["tag"] == "<=":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value <= right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("<=", left_value, right_value), False
         return int(left_value <= right_value), False
     if ast["tag"] == ">=":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value >= right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise(">=", left_value, right_value), False
         return int(left_value >= right_value), False
     if ast["tag"] == "==":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value == right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("==", left_value, right_value), False
         return int(left_value == right_value), False
     if ast["tag"] == "!=":
         left_value, _ = evaluate(ast["left"], environment)
         right_value, _ = evaluate(ast["right"], environment)
+        if type(left_value) in number_types and type(right_value) in number_types:
+            return int(left_value != right_value), False
+        if type(left_value) in array_types or type(right_value) in array_types:
+            return elementwise("!=", left_value, right_value), False
         return int(left_value != right_value), False
     if ast["tag"] == "&&":
         left_value, _ = evaluate(ast["left"], environment)
@@ -124,7 +238,7 @@ def evaluate(ast, environment):
         return int(left_value or right_value), False
 
     if ast["tag"] == "block":
-        value, returning = evaluate(ast["statement"], environment)
+        value, returning = evaluate(ast.get("statement"), environment)
         if ast.get("next") and not returning:
             value, returning = evaluate(ast["next"], environment)
         if returning:
@@ -152,51 +266,348 @@ def evaluate(ast, environment):
     if ast["tag"] == "while":
         condition, _ = evaluate(ast["condition"], environment)
         while condition:
+            # loop iterations count down the step limit
+            limits.countdown -= 1
+            if limits.countdown <= 0:
+                limits.check()
             value, returning = evaluate(ast["do"], environment)
-            if returning:
+            if returning == "break":
+                break
+            if returning == True:
                 return value, returning
             condition, _ = evaluate(ast["condition"], environment)
         return None, False
 
     if ast["tag"] == "print":
+        values = []
         argument = ast.get("arguments", None)
         while argument:
             value, _ = evaluate(argument, environment)
-            print(value, end=" ")
+            values.append(value)
             argument = argument.get("next", None)
-        print()
+        output.print_values(values)
         return None, False
 
     if ast["tag"] == "=":
-        assert (
-            ast["target"]["tag"] == "<identifier>"
-        ), f"ERROR: Expecting identifier in assignment statement."
-        identifier = ast["target"]["value"]
+        target = ast["target"]
+        assert target["tag"] in [
+            "<identifier>",
+            "<index>",
+            "<property>",
+        ], f"ERROR: Expecting identifier, index or property in assignment statement."
         assert ast["value"], f"ERROR: Expecting expression in assignment statement."
+        if target["tag"] == "<index>":
+            array, _ = evaluate(target["expression"], environment)
+            index, _ = evaluate(target["index"], environment)
+            check_index(array, index)
+            value, _ = evaluate(ast["value"], environment)
+            arrays.store(array, index, value)
+            return None, False
+        if target["tag"] == "<property>":
+            object_value, _ = evaluate(target["expression"], environment)
+            value, _ = evaluate(ast["value"], environment)
+            set_property(object_value, target, value)
+            return None, False
         value, _ = evaluate(ast["value"], environment)
-        environment[identifier] = value
+        environment[target["value"]] = value
+        return None, False
+
+    # tags added since come last, so the hot ones above aren't slowed by them
+    if ast["tag"] == "<string>":
+        return ast["value"], False
+
+    if ast["tag"] == "null":
+        return None, False
+
+    # the next line of input, or null at the end
+    if ast["tag"] == "input":
+        return reader.read_line(), False
+
+    # arrays are Python lists, shared rather than copied
+    if ast["tag"] == "<array>":
+        array = []
+        element = ast["elements"]
+        while element:
+            value, _ = evaluate(element, environment)
+            array.append(value)
+            element = element.get("next", None)
+        return array, False
+
+    # objects keep their values in slots laid out by a shared shape
+    if ast["tag"] == "<object>":
+        values = []
+        element = ast["values"]
+        while element:
+            value, _ = evaluate(element, environment)
+            values.append(value)
+            element = element.get("next", None)
+        return make_object(ast, values), False
+
+    if ast["tag"] == "<property>":
+        value, _ = evaluate(ast["expression"], environment)
+        return get_property(value, ast), False
+
+    if ast["tag"] == "<index>":
+        array, _ = evaluate(ast["expression"], environment)
+        index, _ = evaluate(ast["index"], environment)
+        check_index(array, index)
+        return array[index], False
+
+    # break and continue travel out to their loop like a return, tagged by name
+    if ast["tag"] in ["break", "continue"]:
+        return None, ast["tag"]
+
+    if ast["tag"] == "for":
+        evaluate(ast.get("init"), environment)
+        counted = counted_loop(ast)
+        if counted:
+            name, limit = counted
+            start = environment[name]
+            limit, _ = evaluate(limit, environment)
+            if type(start) is int and type(limit) is int:
+                # run the counter on a range until the body changes it
+                for i in range(start, limit):
+                    limits.countdown -= 1
+                    if limits.countdown <= 0:
+                        limits.check()
+                    environment[name] = i
+                    value, returning = evaluate(ast["do"], environment)
+                    if returning == "break":
+                        return None, False
+                    if returning == True:
+                        return value, returning
+                    counter = environment[name]
+                    if type(counter) is not int or counter != i:
+                        evaluate(ast["step"], environment)
+                        break
+                else:
+                    environment[name] = max(start, limit)
+                    return None, False
+        while True:
+            if ast.get("condition"):
+                condition, _ = evaluate(ast["condition"], environment)
+                if not condition:
+                    break
+            limits.countdown -= 1
+            if limits.countdown <= 0:
+                limits.check()
+            value, returning = evaluate(ast["do"], environment)
+            if returning == "break":
+                break
+            if returning == True:
+                return value, returning
+            evaluate(ast.get("step"), environment)
         return None, False
+
+    # exit unwinds the whole interpreter at once, leaving the code to the runner
+    if ast["tag"] == "exit":
+        code, _ = evaluate(ast.get("value"), environment)
+        if code == None:
+            code = 0
+        if type(code) is not int:
+            raise Exception(f"Exit code must be an integer: {code}")
+        output.flush()
+        raise SystemExit(code)
+
+    if ast["tag"] == "import":
+        module_environment = load_module(import_path(ast))
+        for name, value in module_environment.items():
+            if not name.startswith("$"):
+                environment[name] = value
+        return None, False
+
+    if ast["tag"] == "extern":
+        environment[ast["name"]] = {
+            "tag": "extern",
+            "target": ast["target"],
+            "function": resolve_extern(ast["target"]),
+        }
+        return None, False
+
     raise Exception(f"Unknown operation: {ast['tag']}")
 
 
+def counted_loop(ast):
+    """
+    Recognizes for (i = a; i < b; i = i + 1), where the body can't reassign b,
+    returning (i, b) or None. The answer is cached on the node.
+    """
+    if "$counted" not in ast:
+        ast["$counted"] = None
+        init = ast.get("init")
+        condition = ast.get("condition")
+        step = ast.get("step")
+        if not (init and condition and step):
+            return None
+        if init["target"]["tag"] != "<identifier>":
+            return None
+        name = init["target"]["value"]
+        if not (
+            condition["tag"] == "<"
+            and condition["left"]["tag"] == "<identifier>"
+            and condition["left"]["value"] == name
+            and step["target"]["tag"] == "<identifier>"
+            and step["target"]["value"] == name
+            and step["value"]["tag"] == "+"
+            and step["value"]["left"]["tag"] == "<identifier>"
+            and step["value"]["left"]["value"] == name
+            and step["value"]["right"]["tag"] == "<number>"
+            and step["value"]["right"]["value"] == 1
+            and type(step["value"]["right"]["value"]) is int
+        ):
+            return None
+        limit = condition["right"]
+        if limit["tag"] == "<identifier>":
+            names = assigned(ast["do"])
+            if names == None or limit["value"] in names or limit["value"] == name:
+                return None
+        elif limit["tag"] != "<number>":
+            return None
+        ast["$counted"] = (name, limit)
+    return ast["$counted"]
+
+
+def assigned(ast):
+    """
+    Returns the names a statement might bind in its environment,
+    or None if it imports a module, which could bind any name.
+    """
+    names = set()
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        if node["tag"] == "=" and node["target"]["tag"] == "<identifier>":
+            names.add(node["target"]["value"])
+        if node["tag"] == "extern":
+            names.add(node["name"])
+        if node["tag"] == "import":
+            return None
+        nodes.extend(children(node))
+    return names
+
+
+def bind_values(values, environment):
+    """
+    Binds values already computed, by key, to names that can't clash with
+    a program's, in an environment under environment. Returns identifier
+    nodes for the values, by key, to evaluate in place of their nodes, and
+    the environment to evaluate them in.
+    """
+    bindings = {"$parent": environment}
+    nodes = {}
+    for key, value in values.items():
+        name = f"${key}"
+        bindings[name] = value
+        nodes[key] = {"tag": "<identifier>", "value": name}
+    return nodes, bindings
+
+
+def resolve_extern(target):
+    """
+    Finds the Python callable named by an extern target such as "math.sqrt".
+    """
+    module_name, _, attribute = target.rpartition(".")
+    try:
+        function = getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError, ValueError):
+        raise Exception(f"Unknown extern target: {target}")
+    if not callable(function):
+        raise Exception(f"Extern target is not callable: {target}")
+    return function
+
+
+def to_python(value, environment):
+    """
+    Converts a language value into an argument for an extern function.
+    Language functions become Python callables that run in environment.
+    """
+    if type(value) is dict and value.get("tag") == "extern":
+        return value["function"]
+    if type(value) is Rope:
+        return str(value)
+    if type(value) is dict and value.get("tag") == "function":
+
+        def function(*arguments):
+            function_environment = {}
+            parameters = value["parameters"]
+            for argument in arguments:
+                assert parameters, "too many arguments to function"
+                function_environment[parameters["value"]] = from_python(argument)
+                parameters = parameters.get("next", None)
+            assert parameters == None, "too few arguments to function"
+            function_environment["$parent"] = environment
+            result, _ = evaluate(value["body"], function_environment)
+            return to_python(result, environment)
+
+        return function
+    return value
+
+
+def from_python(value):
+    """
+    Converts the result of an extern function into a language value.
+    """
+    if type(value) is bool:
+        return int(value)
+    if callable(value):
+        return {"tag": "extern", "target": repr(value), "function": value}
+    return value
+
+
+def check_returning(returning):
+    """
+    Raises an error if a function body or program ended with a break or
+    continue, which had no loop to go to.
+    """
+    if returning in ["break", "continue"]:
+        raise Exception(f"'{returning}' outside a loop")
+
+
+def run_program(ast, environment):
+    """
+    Evaluates a whole program or module, where break and continue are errors.
+    """
+    value, returning = evaluate(ast, environment)
+    check_returning(returning)
+    return value, returning
+
+
+def load_module(path):
+    """
+    Runs a module file once into its own environment, and returns that environment.
+    The module runs again only if its file has changed since it was last run.
+    """
+    filename = os.path.abspath(path)
+    mtime = os.stat(filename).st_mtime_ns
+    if filename in modules and modules[filename][0] == mtime:
+        return modules[filename][1]
+    ast = parse_file(filename)
+    # parse everything this module imports up front, in parallel
+    preload(ast)
+    environment = {}
+    # register before running, so that circular imports terminate
+    modules[filename] = (mtime, environment)
+    run_program(ast, environment)
+    return environment
+
+
 from tokenizer import tokenize
-from parser import parse
+from parser import parse, remove_positions
+import io
+import tempfile
 
 
 def equals(code, environment, expected_result, expected_environment=None):
     result, returning = evaluate(parse(tokenize(code)), environment)
-    assert (
-        result == expected_result
-    ), f"""ERROR: When executing-- 
+    result = remove_positions(result)
+    assert result == expected_result, f"""ERROR: When executing-- 
     {[code]},
     --expected--
     {[expected_result]},
     --got--
     {[result]}."""
     if expected_environment:
-        assert (
-            environment == expected_environment
-        ), f"""
+        assert remove_positions(environment) == expected_environment, f"""
         ERROR: When executing 
         {[code]}, 
         expected
@@ -357,12 +768,22 @@ def test_evaluate_function_statement():
         },
     )
 
+
 def test_evaluate_print_statement():
     print("test evaluate print_statement.")
-    equals("print()", {}, None, None)
-    equals("print(1)", {}, None, None)
-    equals("print(1,2)", {}, None, None)
-    equals("print(1,2,3+4)", {}, None, None)
+    stream = io.StringIO()
+    old_sink = output.redirect(stream)
+    try:
+        equals("print()", {}, None, None)
+        equals("print(1)", {}, None, None)
+        equals("print(1,2)", {}, None, None)
+        equals("print(1,2,3+4)", {}, None, None)
+        equals('print("a" + "b", [1], {x: 2})', {}, None, None)
+        assert stream.getvalue() == ""
+        equals("flush()", {}, None, None)
+    finally:
+        output.restore(old_sink)
+    assert stream.getvalue() == "\n1 \n1 2 \n1 2 7 \nab [1] {x: 2} \n"
 
 
 def test_evaluate_return_statement():
@@ -392,10 +813,13 @@ def test_evaluate_return_statement():
     assert returning
     assert result == 3
 
+
 def test_evaluate_function_call():
     print("test evaluate function call.")
+
     def ev(code, environment):
         return evaluate(parse(tokenize(code)), environment)
+
     environment = {}
     result, _ = ev("f = function() {return}", environment)
     result, _ = ev("f()", environment)
@@ -421,10 +845,13 @@ def test_evaluate_function_call():
     result, _ = ev("f(2,3) + g(2,3)", environment)
     assert result == 13
 
+
 def test_evaluate_square_root_function():
     print("test evaluate square root function.")
+
     def ev(code, environment):
         return evaluate(parse(tokenize(code)), environment)
+
     environment = {}
     code = """
         function abs(x) {
@@ -454,10 +881,13 @@ def test_evaluate_square_root_function():
     result, _ = ev("print(squareRoot(4));", environment)
     result, _ = ev("print(tolerance);", environment)
 
+
 def test_evaluate_expression_function_call():
     print("test evaluate expression_function_call.")
+
     def ev(code, environment):
         return evaluate(parse(tokenize(code)), environment)
+
     environment = {}
     code = """
         function abs(x) {
@@ -480,7 +910,330 @@ def test_evaluate_expression_function_call():
     result, _ = ev("function(x) {return x*x} (4)", environment)
     print(result)
 
- 
+
+def test_evaluate_import_statement():
+    print("test evaluate import statement.")
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, "library.t")
+        counter = os.path.join(directory, "counter.t")
+        with open(library, "w") as f:
+            f.write(f'import "{counter}";\nfunction sq(x) {{return x * x}};\nk = 3')
+        with open(counter, "w") as f:
+            f.write("runs = 1")
+        environment = {}
+        evaluate(parse(tokenize(f'import "{library}"')), environment)
+        assert environment["k"] == 3
+        assert environment["runs"] == 1
+        result, _ = evaluate(parse(tokenize("sq(k)")), environment)
+        assert result == 9
+        # a module runs only once
+        modules[os.path.abspath(counter)][1]["runs"] = 2
+        evaluate(parse(tokenize(f'import "{counter}"')), environment)
+        assert environment["runs"] == 2
+        # ... unless it changes
+        mtime = modules[os.path.abspath(counter)][0]
+        os.utime(counter, ns=(0, mtime + 1))
+        evaluate(parse(tokenize(f'import "{counter}"')), environment)
+        assert environment["runs"] == 1
+
+
+def test_evaluate_extern_statement():
+    print("test evaluate extern statement.")
+
+    def ev(code, environment):
+        return evaluate(parse(tokenize(code)), environment)
+
+    environment = {}
+    ev('extern sqrt = "math.sqrt"', environment)
+    assert environment["sqrt"]["tag"] == "extern"
+    result, _ = ev("sqrt(16)", environment)
+    assert result == 4.0
+    result, _ = ev("sqrt(2) * sqrt(2) - 2 < 0.000001", environment)
+    assert result == 1
+    # booleans come back as the language's 1 and 0
+    ev('extern isclose = "math.isclose"', environment)
+    result, _ = ev("isclose(sqrt(2) * sqrt(2), 2)", environment)
+    assert result == 1 and type(result) is int
+    # functions pass between the language and Python in both directions
+    ev('extern partial = "functools.partial"', environment)
+    ev('extern pow = "math.pow"', environment)
+    ev("power_of_two = partial(pow, 2)", environment)
+    result, _ = ev("power_of_two(3)", environment)
+    assert result == 8.0
+    ev('extern call = "operator.call"', environment)
+    result, _ = ev("call(function(x) {return sqrt(x) + 1}, 9)", environment)
+    assert result == 4.0
+    for code in [
+        'extern f = "math.nothing"',
+        'extern f = "nothing.f"',
+        'extern f = "math.pi"',
+    ]:
+        try:
+            ev(code, environment)
+            assert False, f"Expected an extern error from {code}"
+        except Exception as e:
+            assert "extern target" in str(e).lower()
+
+
+def test_evaluate_arrays():
+    print("test evaluate arrays.")
+
+    def ev(code, environment):
+        return evaluate(parse(tokenize(code)), environment)
+
+    equals("[]", {}, [])
+    equals("[1, 2+3, [4]]", {}, [1, 5, [4]])
+    equals("x[1]", {"x": [10, 20, 30]}, 20)
+    equals("x[1][0]", {"x": [10, [20], 30]}, 20)
+    equals("length(x)", {"x": [10, 20, 30]}, 3)
+    environment = {"x": [10, 20, 30]}
+    equals("x[2] = x[0] + 1", environment, None, {"x": [10, 20, 11]})
+    equals("{append(x, 4); y = length(x)}", environment, None)
+    assert environment == {"x": [10, 20, 11, 4], "y": 4}
+    # arrays are passed to functions by reference, not copied
+    environment = {}
+    ev(
+        "function fill(a, v) { i = 0; while (i < length(a)) { a[i] = v; i = i + 1 } }",
+        environment,
+    )
+    ev("{a = [1, 2, 3]; fill(a, 0)}", environment)
+    assert environment["a"] == [0, 0, 0]
+    for code, message in [
+        ("x[3]", "Array index out of range: 3"),
+        ("x[-1]", "Array index out of range: -1"),
+        ("x[0.5]", "Array index out of range: 0.5"),
+        ("x[0][0]", "Cannot index a non-array value: 10"),
+    ]:
+        try:
+            ev(code, {"x": [10, 20, 30]})
+            assert False, f"Expected an error from {code}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+
+
+def test_evaluate_typed_arrays():
+    print("test evaluate typed arrays.")
+
+    def ev(code, environment):
+        return evaluate(parse(tokenize(code)), environment)
+
+    environment = {}
+    ev(
+        "{a = float_array(4); i = 0; while (i < length(a)) {a[i] = i / 2; i = i + 1}}",
+        environment,
+    )
+    assert list(environment["a"]) == [0.0, 0.5, 1.0, 1.5]
+    result, _ = ev("a[3] + a[1]", environment)
+    assert result == 2.0
+    ev("{b = slice(a, 2, 4); b[0] = 9}", environment)
+    assert environment["a"][2] == 9.0
+    ev("{n = int_array(2); copy(n, [3, 4]); fill(b, 0.25)}", environment)
+    assert list(environment["n"]) == [3, 4]
+    assert list(environment["a"]) == [0.0, 0.5, 0.25, 0.25]
+    try:
+        ev("n[0] = 0.5", environment)
+        assert False, "Expected a typed array store error"
+    except Exception as e:
+        assert str(e) == "Cannot store 0.5 in a typed array"
+
+
+def test_evaluate_array_operators():
+    print("test evaluate array operators.")
+    equals("[1, 2, 3] + [10, 20, 30]", {}, [11, 22, 33])
+    equals("a * 2.0 - 1", {"a": [1, 2]}, [1.0, 3.0])
+    equals("a / b", {"a": [1, 3], "b": [2, 4]}, [0.5, 0.75])
+    equals("a < b", {"a": [1, 5], "b": [2, 2]}, [1, 0])
+    equals("a == 2", {"a": [1, 2]}, [0, 1])
+    equals("sum(a * a)", {"a": [1, 2, 3]}, 14)
+    equals("dot(a, a) == sum(a * a)", {"a": [1, 2, 3]}, 1)
+    equals("min(a) + max(a)", {"a": [4, -1, 7]}, 6)
+    environment = {}
+    evaluate(
+        parse(tokenize("{a = float_array(3); fill(a, 2.0); b = a * a}")), environment
+    )
+    assert list(environment["b"]) == [4.0, 4.0, 4.0]
+    try:
+        equals("[1] / [0]", {}, None)
+        assert False, "Expected a division by zero error"
+    except Exception as e:
+        assert str(e) == "Division by zero"
+
+
+def test_evaluate_objects():
+    print("test evaluate objects.")
+
+    def ev(code, environment):
+        return evaluate(parse(tokenize(code)), environment)
+
+    environment = {}
+    ev("p = {x: 1, y: 2}", environment)
+    result, _ = ev("p.x + p.y", environment)
+    assert result == 3
+    ev("{p.x = 10; p.z = [1, {w: 5}]}", environment)
+    result, _ = ev("p.x + p.z[1].w", environment)
+    assert result == 15
+    assert repr(environment["p"]) == "{x: 10, y: 2, z: [1, {w: 5}]}"
+    # objects built with the same properties in the same order share a shape
+    ev("function point(x, y) { return {x: x, y: y} }", environment)
+    ev("{a = point(1, 2); b = point(3, 4); c = {y: 1, x: 2}}", environment)
+    assert environment["a"].shape is environment["b"].shape
+    assert environment["a"].shape is not environment["c"].shape
+    # objects are shared, not copied, when passed to functions
+    ev("function move(p) { p.x = p.x + 1 }", environment)
+    ev("move(a)", environment)
+    assert environment["a"].values == [2, 2]
+    for code, message in [
+        ("a.q", "Undefined property: q"),
+        ("n.x", "Cannot get property x of a non-object: 1"),
+    ]:
+        try:
+            ev(code, {"a": environment["a"], "n": 1})
+            assert False, f"Expected an error from {code}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+
+
+def test_evaluate_strings():
+    print("test evaluate strings.")
+    equals('"hello"', {}, "hello")
+    equals('"a ""quoted"" word"', {}, 'a "quoted" word')
+    equals('"ab" + "cd"', {}, "abcd")
+    equals('s + "!"', {"s": "hi"}, "hi!")
+    equals('"abc" < "abd"', {}, 1)
+    equals('"abc" == "ab" + "c"', {}, 1)
+    equals('"abc" != "abc"', {}, 0)
+    equals('length("hello")', {}, 5)
+    equals('"hello"[1]', {}, "e")
+    environment = {}
+    code = '{s = ""; i = 0; while (i < 100) {s = s + "0123456789"; i = i + 1}}'
+    evaluate(parse(tokenize(code)), environment)
+    assert type(environment["s"]) is Rope
+    assert environment["s"] == "0123456789" * 100
+    equals("length(s)", environment, 1000)
+    equals("s[15]", environment, "5")
+    equals('s + "" == s', environment, 1)
+    for code, message in [
+        ('"a" + 1', "Cannot add 'a' and 1"),
+        ('s[0] = "b"', "Cannot assign into a string: 'abc'"),
+        ("s[3]", "Array index out of range: 3"),
+    ]:
+        try:
+            equals(code, {"s": "abc"}, None)
+            assert False, f"Expected an error from {code}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+
+
+def test_evaluate_for_statement():
+    print("test evaluate for statement.")
+    equals("for (i = 0; i < 4; i = i + 1) x = x + i", {"x": 0}, None, {"x": 6, "i": 4})
+    equals("for (i = 5; i < 4; i = i + 1) x = i", {"x": 0}, None, {"x": 0, "i": 5})
+    equals("for (i = 0; i < 9; i = i + 3) x = x + i", {"x": 0}, None, {"x": 9, "i": 9})
+    equals("for (; x < 3;) x = x + 1", {"x": 0}, None, {"x": 3})
+    equals("for (i = 0.5; i < 2; i = i + 1) x = i", {}, None, {"i": 2.5, "x": 1.5})
+    # the limit is read once only when the body can't change it
+    equals(
+        "for (i = 0; i < n; i = i + 1) n = n - 1",
+        {"n": 6},
+        None,
+        {"n": 3, "i": 3},
+    )
+    # a body that changes the counter leaves the fast path
+    equals(
+        "for (i = 0; i < 10; i = i + 1) {x = x + 1; if (i == 2) i = 6}",
+        {"x": 0},
+        None,
+        {"x": 6, "i": 10},
+    )
+    ast = parse(tokenize("for (i = 0; i < n; i = i + 1) x = i"))
+    evaluate(ast, {"n": 2})
+    assert ast["$counted"][0] == "i"
+    for code in [
+        "for (i = 0; i <= n; i = i + 1) x = i",
+        "for (i = 0; i < n; i = i + 2) x = i",
+        "for (i = 0; i < n; i = i + 1) {n = 1}",
+        "for (i = 0; i < f(n); i = i + 1) x = i",
+        'for (i = 0; i < n; i = i + 1) import "m.t"',
+    ]:
+        assert counted_loop(parse(tokenize(code))) == None, code
+
+
+def test_evaluate_break_continue():
+    print("test evaluate break and continue.")
+    code = "for (i = 0; i < 10; i = i + 1) {if (i == 3) break else x = x + i}"
+    equals(code, {"x": 0}, None, {"x": 3, "i": 3})
+    code = "for (i = 0; i < 5; i = i + 1) {if (i == 3) continue else x = x + i}"
+    equals(code, {"x": 0}, None, {"x": 7, "i": 5})
+    code = "for (i = 0; i < 5; i = i + 2) {if (i == 2) continue else x = x + i}"
+    equals(code, {"x": 0}, None, {"x": 4, "i": 6})
+    code = "while (1) {x = x + 1; if (x > 4) break else continue; x = 100}"
+    equals(code, {"x": 0}, None, {"x": 5})
+    code = "{function f(n) {for (i = 0; i < n; i = i + 1) {if (i == 2) return i}}; y = f(5); z = 1}"
+    environment = {}
+    evaluate(parse(tokenize(code)), environment)
+    assert environment["y"] == 2 and environment["z"] == 1
+    try:
+        equals("{function f() {break}; f()}", {}, None)
+        assert False, "Expected a break outside a loop error"
+    except Exception as e:
+        assert str(e) == "'break' outside a loop"
+    # nor does the rest of a program stop at one
+    for code in ["{x = 1; break; x = 2}", "{x = 1; if (x) continue}"]:
+        environment = {}
+        try:
+            run_program(parse(tokenize(code)), environment)
+            assert False, "Expected a break or continue outside a loop error"
+        except Exception as e:
+            assert str(e).endswith("outside a loop") and environment["x"] == 1
+    assert run_program(parse(tokenize("{while (1) break; return 3}")), {}) == (3, True)
+
+
+def test_evaluate_input():
+    print("test evaluate input.")
+    old_source = reader.redirect(io.BytesIO(b"first line\n2\n3.5\n"))
+    try:
+        equals("x = input()", {}, None, {"x": "first line"})
+        equals("x = input_number() + input_number()", {}, None, {"x": 5.5})
+        equals("input() == null", {}, 1)
+        equals("input_number()", {}, None)
+    finally:
+        reader.restore(old_source)
+    old_source = reader.redirect(io.BytesIO(b"1\n2\n3\n"))
+    try:
+        code = "{total = 0; n = input_number(); while (n != null) {total = total + n; n = input_number()}}"
+        equals(code, {}, None, {"total": 6, "n": None})
+    finally:
+        reader.restore(old_source)
+
+
+def test_evaluate_exit_statement():
+    print("test evaluate exit statement.")
+    stream = io.StringIO()
+    old_sink = output.redirect(stream)
+    try:
+        for code, status in [
+            ("exit()", 0),
+            ("{print(1); exit(3); print(2)}", 3),
+            ("{function f(x) {while (1) {exit(x)}}; f(4)}", 4),
+            ("for (i = 0; i < 9; i = i + 1) if (i == 2) exit(i) else print(i)", 2),
+        ]:
+            environment = {}
+            try:
+                evaluate(parse(tokenize(code)), environment)
+                assert False, f"Expected {code} to exit"
+            except SystemExit as e:
+                assert e.code == status
+        # output is flushed before exiting
+        assert stream.getvalue() == "1 \n0 \n1 \n"
+        try:
+            equals('exit("x")', {}, None)
+            assert False, "Expected an exit code error"
+        except Exception as e:
+            assert str(e) == "Exit code must be an integer: x"
+    finally:
+        output.restore(old_sink)
+
+
 if __name__ == "__main__":
     print("test evaluator...")
     test_evaluate_single_value()
@@ -496,13 +1249,24 @@ if __name__ == "__main__":
     test_evaluate_logical_operators()
     test_evaluate_if_statement()
     test_evaluate_while_statement()
+    test_evaluate_for_statement()
+    test_evaluate_break_continue()
     test_evaluate_block_statement()
     test_evaluate_function_expression()
     test_evaluate_function_statement()
     test_evaluate_print_statement()
+    test_evaluate_exit_statement()
+    test_evaluate_input()
     test_evaluate_return_statement()
     test_evaluate_function_call()
     test_evaluate_square_root_function()
     test_evaluate_expression_function_call()
+    test_evaluate_import_statement()
+    test_evaluate_extern_statement()
+    test_evaluate_arrays()
+    test_evaluate_typed_arrays()
+    test_evaluate_array_operators()
+    test_evaluate_objects()
+    test_evaluate_strings()
 
     print("done.")
@@ -0,0 +1,172 @@
+import json
+import time
+
+import evaluator
+
+# Instrumentation swaps evaluator.evaluate, which evaluate() calls for every
+# child node, for a version that counts and times each node. When it is off
+# the original function is back in place, and nothing is measured.
+
+plain_evaluate = evaluator.evaluate
+
+# the measurements, per AST tag, per user function, and per call stack
+counts = {}
+seconds = {}
+function_counts = {}
+function_seconds = {}
+stacks = {}
+
+# the active call stack, as collapsed-stack paths, with the functions active on it
+paths = ["<program>"]
+active = {}
+# time spent in the children of each node being evaluated
+child_seconds = [0.0]
+
+
+def instrumented_evaluate(ast, environment):
+    if ast == None:
+        return None, False
+    tag = ast["tag"]
+    name = None
+    if tag == "<function_call>":
+        expression = ast["expression"]
+        name = (
+            expression["value"]
+            if expression["tag"] == "<identifier>"
+            else "<anonymous>"
+        )
+        paths.append(paths[-1] + ";" + name)
+        active[name] = active.get(name, 0) + 1
+    child_seconds.append(0.0)
+    start = time.perf_counter()
+    try:
+        return plain_evaluate(ast, environment)
+    finally:
+        elapsed = time.perf_counter() - start
+        self_seconds = elapsed - child_seconds.pop()
+        child_seconds[-1] += elapsed
+        counts[tag] = counts.get(tag, 0) + 1
+        seconds[tag] = seconds.get(tag, 0.0) + self_seconds
+        stacks[paths[-1]] = stacks.get(paths[-1], 0.0) + self_seconds
+        if name != None:
+            paths.pop()
+            active[name] -= 1
+            function_counts[name] = function_counts.get(name, 0) + 1
+            # count recursive calls' time once, in the outermost call
+            if active[name] == 0:
+                function_seconds[name] = function_seconds.get(name, 0.0) + elapsed
+
+
+def enable():
+    evaluator.evaluate = instrumented_evaluate
+
+
+def disable():
+    evaluator.evaluate = plain_evaluate
+
+
+def reset():
+    for measurements in [counts, seconds, function_counts, function_seconds, stacks]:
+        measurements.clear()
+    child_seconds[0] = 0.0
+
+
+def evaluate(ast, environment):
+    """
+    Evaluates ast with instrumentation on, adding to the measurements so far.
+    """
+    enable()
+    try:
+        return instrumented_evaluate(ast, environment)
+    finally:
+        disable()
+
+
+def results():
+    """
+    Returns the measurements: executions and self time per AST tag, and calls
+    and total time per user function, hottest first.
+    """
+    return {
+        "tags": {
+            tag: {"count": counts[tag], "seconds": seconds[tag]}
+            for tag in sorted(seconds, key=lambda tag: -seconds[tag])
+        },
+        "functions": {
+            name: {"count": function_counts[name], "seconds": function_seconds[name]}
+            for name in sorted(
+                function_seconds, key=lambda name: -function_seconds[name]
+            )
+        },
+    }
+
+
+def to_json():
+    return json.dumps(results(), indent=2)
+
+
+def to_collapsed():
+    """
+    Returns the self time of each call stack, in microseconds, in the collapsed
+    stack format that flame graph tools read.
+    """
+    return "".join(
+        f"{path} {round(stacks[path] * 1000000)}\n"
+        for path in sorted(stacks)
+        if round(stacks[path] * 1000000) > 0
+    )
+
+
+from tokenizer import tokenize
+from parser import parse
+
+fibonacci = """{
+    function fib(n) {if (n < 2) return n else return fib(n - 1) + fib(n - 2)};
+    function run() {return fib(8)};
+    x = run()
+}"""
+
+
+def test_instrumented_evaluate():
+    print("test instrumented evaluate")
+    reset()
+    environment = {}
+    evaluate(parse(tokenize(fibonacci)), environment)
+    assert environment["x"] == 21
+    # instrumentation is only in place while it runs
+    assert evaluator.evaluate is plain_evaluate
+    measurements = results()
+    assert measurements["functions"]["fib"]["count"] == 67
+    assert measurements["functions"]["run"]["count"] == 1
+    assert (
+        measurements["functions"]["fib"]["seconds"]
+        <= measurements["functions"]["run"]["seconds"]
+    )
+    assert measurements["tags"]["if"]["count"] == 67
+    assert measurements["tags"]["<function_call>"]["count"] == 68
+    assert paths == ["<program>"] and len(child_seconds) == 1
+    # counts add up until reset
+    evaluate(parse(tokenize("x = run()")), environment)
+    assert results()["functions"]["fib"]["count"] == 134
+    reset()
+    assert results() == {"tags": {}, "functions": {}}
+
+
+def test_exports():
+    print("test exports")
+    reset()
+    evaluate(parse(tokenize(fibonacci)), {})
+    assert json.loads(to_json()) == results()
+    lines = to_collapsed().splitlines()
+    assert "<program>;run;fib;fib" in [line.rsplit(" ", 1)[0] for line in lines]
+    for line in lines:
+        path, microseconds = line.rsplit(" ", 1)
+        assert path.startswith("<program>") and int(microseconds) > 0
+    reset()
+
+
+if __name__ == "__main__":
+    print("test instrument...")
+    test_instrumented_evaluate()
+    test_exports()
+    print("done.")
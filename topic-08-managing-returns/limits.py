@@ -0,0 +1,236 @@
+import time
+
+import evaluator
+
+# Limits on what a program may use: steps, which are loop iterations and
+# function calls, the depth of nested function calls, and seconds of wall
+# clock. The evaluator counts steps down in countdown and only calls check()
+# when it reaches zero, so the limits and the clock are looked at once every
+# check_interval steps rather than on every one.
+
+# steps between checks
+check_interval = 1000
+
+# the limits, or None for no limit
+max_steps = None
+max_depth = None
+max_seconds = None
+
+# steps counted at earlier checks, and the size of the current countdown
+steps = 0
+chunk = check_interval
+countdown = check_interval
+# the number of function calls in progress
+depth = 0
+started = time.monotonic()
+deadline = None
+
+
+class LimitExceeded(Exception):
+    """
+    Raised when a program goes past a limit, with the resource ("steps",
+    "depth" or "seconds"), the amount used, and the limit.
+    """
+
+    def __init__(self, resource, used, limit):
+        super().__init__(f"Exceeded the {resource} limit: used {used} of {limit}")
+        self.resource = resource
+        self.used = used
+        self.limit = limit
+
+
+def start(steps=None, depth=None, seconds=None):
+    """
+    Sets the limits, counting steps and seconds from now.
+    """
+    global max_steps, max_depth, max_seconds, started, deadline
+    max_steps = steps
+    max_depth = depth
+    max_seconds = seconds
+    started = time.monotonic()
+    deadline = None if seconds == None else started + seconds
+    reset()
+
+
+def stop():
+    start()
+
+
+def reset():
+    global steps, depth
+    steps = 0
+    depth = 0
+    refill()
+
+
+def refill():
+    global chunk, countdown
+    chunk = check_interval
+    # count down to exactly the step that goes past the limit
+    if max_steps != None:
+        chunk = max(1, min(chunk, max_steps - steps + 1))
+    countdown = chunk
+
+
+def used_steps():
+    return steps + chunk - countdown
+
+
+def check():
+    """
+    Called by the evaluator when the countdown reaches zero.
+    """
+    global steps
+    steps += chunk
+    if max_steps != None and steps > max_steps:
+        refill()
+        raise LimitExceeded("steps", steps, max_steps)
+    if deadline != None:
+        now = time.monotonic()
+        if now > deadline:
+            refill()
+            raise LimitExceeded("seconds", round(now - started, 3), max_seconds)
+    refill()
+
+
+def enter():
+    """
+    Counts a function call as a step and one more level of depth; leave()
+    must follow.
+    """
+    global countdown, depth
+    countdown -= 1
+    if countdown <= 0:
+        check()
+    if max_depth != None and depth >= max_depth:
+        raise LimitExceeded("depth", depth + 1, max_depth)
+    depth += 1
+
+
+def leave():
+    global depth
+    depth -= 1
+
+
+# the limits and their usage, which save() and restore() keep
+state_names = [
+    "max_steps",
+    "max_depth",
+    "max_seconds",
+    "steps",
+    "chunk",
+    "countdown",
+    "depth",
+    "started",
+    "deadline",
+]
+
+
+def save():
+    """
+    Returns the limits and what has been used of them, for restore().
+    """
+    return {name: globals()[name] for name in state_names}
+
+
+def restore(state):
+    """
+    Puts back the limits and usage that save() returned.
+    """
+    globals().update(state)
+
+
+def evaluate(ast, environment, steps=None, depth=None, seconds=None):
+    """
+    Evaluates ast within the given limits, removing them afterwards.
+    """
+    start(steps, depth, seconds)
+    try:
+        return evaluator.run_program(ast, environment)
+    finally:
+        stop()
+
+
+from tokenizer import tokenize
+from parser import parse
+
+
+def run(code, **limits):
+    environment = {}
+    try:
+        evaluate(parse(tokenize(code)), environment, **limits)
+    except LimitExceeded as e:
+        return e, environment
+    return None, environment
+
+
+def test_step_limit():
+    print("test step limit")
+    error, environment = run("while (1) {x = 1}", steps=10)
+    assert (error.resource, error.used, error.limit) == ("steps", 11, 10)
+    assert str(error) == "Exceeded the steps limit: used 11 of 10"
+    # exactly the limit is allowed
+    error, environment = run("for (i = 0; i < 10; i = i + 1) {x = i}", steps=10)
+    assert error == None and environment["x"] == 9
+    error, environment = run("{i = 0; while (i < 10) {i = i + 1}}", steps=10)
+    assert error == None
+    error, environment = run("for (i = 0; i < 11; i = i + 1) {x = i}", steps=10)
+    assert error.resource == "steps" and environment["x"] == 9
+    # limits above the check interval are exact too
+    error, environment = run("for (i = 0; i < 5000; i = i + 1) {x = i}", steps=2500)
+    assert error.used == 2501 and environment["x"] == 2499
+    # function calls are steps
+    error, _ = run("{function f() {return 1}; x = f() + f() + f()}", steps=2)
+    assert error.resource == "steps"
+    # the limits are gone afterwards
+    assert max_steps == None and used_steps() == 0
+
+
+def test_depth_limit():
+    print("test depth limit")
+    code = "{function down(n) {if (n == 0) return 0 else return down(n - 1)}; x = down(%d)}"
+    error, environment = run(code % 9, depth=10)
+    assert error == None and environment["x"] == 0
+    error, environment = run(code % 10, depth=10)
+    assert (error.resource, error.used, error.limit) == ("depth", 11, 10)
+    # the depth unwinds with the error
+    assert depth == 0
+
+
+def test_time_limit():
+    print("test time limit")
+    before = time.monotonic()
+    error, _ = run("while (1) {x = 1}", seconds=0.05)
+    assert error.resource == "seconds" and error.limit == 0.05
+    assert 0.05 <= error.used < 1 and time.monotonic() - before < 1
+    # the error is an Exception, for callers that catch everything
+    assert isinstance(error, Exception)
+
+
+def test_save_restore():
+    print("test save restore")
+    start(steps=100, depth=5)
+    try:
+        enter()
+        state = save()
+        # another program runs with limits of its own
+        start(steps=10)
+        enter()
+        enter()
+        restore(state)
+        assert max_steps == 100 and max_depth == 5
+        assert depth == 1 and used_steps() == 1
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    # test the module the evaluator imported, rather than this copy of it
+    import limits
+
+    print("test limits...")
+    limits.test_step_limit()
+    limits.test_depth_limit()
+    limits.test_time_limit()
+    limits.test_save_restore()
+    print("done.")
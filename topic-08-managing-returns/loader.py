@@ -0,0 +1,315 @@
+import marshal
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from tokenizer import tokenize
+from parser import parse, children, remove_positions
+
+# parsed source files, by absolute path, as (mtime, ast)
+asts = {}
+
+
+def tokenize_file(filename):
+    """
+    Tokenizes a source file as a block, lexing it in place through a memory map.
+    """
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        tokens = []
+        # an empty file can't be mapped, and has nothing to lex
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                tokens = tokenize(source)
+    # wrap the tokens, rather than the source, to allow multiple statements
+    tokens = [{"tag": "{", "position": 0, "end": 0}] + tokens
+    tokens.append({"tag": "}", "position": size, "end": size})
+    return tokens
+
+
+def is_current(filename):
+    """
+    Checks that the cached AST for an absolute filename matches the file's mtime.
+    """
+    return filename in asts and asts[filename][0] == os.stat(filename).st_mtime_ns
+
+
+def parse_file(filename):
+    """
+    Returns the AST of a source file, reparsing only if the file has changed.
+    """
+    filename = os.path.abspath(filename)
+    if not is_current(filename):
+        mtime = os.stat(filename).st_mtime_ns
+        asts[filename] = (mtime, mark_file(parse(tokenize_file(filename)), filename))
+    return asts[filename][1]
+
+
+def mark_file(ast, filename):
+    """
+    Records on each function in ast the file it came from, since positions
+    are offsets into that file, and on each import the absolute path of the
+    module, since relative paths are relative to the file. Returns ast.
+    """
+    directory = os.path.dirname(filename)
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        if node["tag"] == "function":
+            node["$file"] = filename
+        if node["tag"] == "import":
+            node["$path"] = os.path.normpath(os.path.join(directory, node["path"]))
+        nodes.extend(children(node))
+    return ast
+
+
+def import_path(node):
+    """
+    Returns the absolute path of the module an import node names: relative to
+    the file the import is in, or to the current directory for code that
+    didn't come from a file.
+    """
+    return node.get("$path") or os.path.abspath(node["path"])
+
+
+def parse_compact(filename):
+    """
+    Parses a source file in a worker process, returning the AST marshalled to bytes.
+    """
+    return marshal.dumps(parse(tokenize_file(filename)))
+
+
+def imports(ast):
+    """
+    Returns the absolute paths named by import statements anywhere in ast.
+    """
+    paths = []
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        if node["tag"] == "import":
+            paths.append(import_path(node))
+        nodes.extend(children(node))
+    return paths
+
+
+def preload(ast, workers=None):
+    """
+    Parses every module imported, directly or not, by ast into the AST cache.
+    Modules are parsed in parallel worker processes when there are several.
+    """
+    seen = set()
+    pending = imports(ast)
+    pool = None
+    try:
+        while pending:
+            wave = []
+            for filename in pending:
+                if filename not in seen:
+                    seen.add(filename)
+                    wave.append(filename)
+            stale = [filename for filename in wave if not is_current(filename)]
+            if len(stale) > 1:
+                if pool == None:
+                    pool = ProcessPoolExecutor(workers)
+                mtimes = [os.stat(filename).st_mtime_ns for filename in stale]
+                results = pool.map(parse_compact, stale)
+                for filename, mtime, result in zip(stale, mtimes, results):
+                    ast = mark_file(marshal.loads(result), filename)
+                    asts[filename] = (mtime, ast)
+            elif stale:
+                parse_file(stale[0])
+            # follow the imports of this wave of modules
+            pending = []
+            for filename in wave:
+                pending += imports(asts[filename][1])
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+# the text that decides where a top-level statement ends: comments, quotes,
+# brackets and semicolons
+statement_pattern = re.compile(r'//[^\n]*|["()\[\]{};]')
+
+
+def statements(lines):
+    """
+    Yields source text holding whole top-level statements as soon as the lines
+    read so far complete them, keeping only the unfinished remainder.
+    """
+    pending = []
+    # the bracket depth, and whether a string is open, at the end of pending
+    depth = 0
+    in_string = False
+    for line in lines:
+        # scan only the new line, carrying the state over from earlier ones
+        end = None
+        position = 0
+        while True:
+            if in_string:
+                quote = line.find('"', position)
+                if quote < 0:
+                    break
+                in_string = False
+                position = quote + 1
+                continue
+            match = statement_pattern.search(line, position)
+            if match == None:
+                break
+            text = match.group()
+            position = match.end()
+            if text == '"':
+                in_string = True
+            elif text in "([{":
+                depth += 1
+            elif text in ")]}":
+                depth -= 1
+            elif text == ";" and depth == 0:
+                end = position
+        if end == None:
+            pending.append(line)
+        else:
+            yield "".join(pending) + line[:end]
+            pending = [line[end:]]
+    rest = "".join(pending)
+    if rest.strip():
+        yield rest
+
+
+import tempfile
+
+
+def write_modules(directory, sources):
+    filenames = []
+    for name, source in sources.items():
+        filename = os.path.join(directory, name)
+        with open(filename, "w") as f:
+            f.write(source)
+        filenames.append(filename)
+    return filenames
+
+
+def test_tokenize_file():
+    print("test tokenize file")
+    with tempfile.TemporaryDirectory() as directory:
+        [filename, empty] = write_modules(directory, {"a.t": "x=1;\ny=2", "b.t": ""})
+        tokens = tokenize_file(filename)
+        assert tokens[1:-1] == tokenize("x=1;\ny=2")
+        assert [t["tag"] for t in tokenize_file(empty)] == ["{", "}"]
+
+
+def test_parse_file():
+    print("test parse file")
+    with tempfile.TemporaryDirectory() as directory:
+        [filename] = write_modules(directory, {"a.t": "x=1;y=2"})
+        ast = parse_file(filename)
+        assert remove_positions(ast) == remove_positions(parse(tokenize("{x=1;y=2}")))
+        assert parse_file(filename) is ast
+        # a changed file is parsed again
+        write_modules(directory, {"a.t": "x=3"})
+        os.utime(filename, ns=(0, asts[filename][0] + 1))
+        assert parse_file(filename) is not ast
+
+
+def test_preload():
+    print("test preload")
+    with tempfile.TemporaryDirectory() as directory:
+        a, b, c, d = [os.path.join(directory, name) for name in "abcd"]
+        write_modules(
+            directory,
+            {
+                "a": f'import "{b}"; import "{c}"; x = 1',
+                "b": f'import "{d}"; y = 2',
+                "c": f'import "{d}"; z = 3',
+                "d": "w = 4",
+            },
+        )
+        ast = parse_file(a)
+        assert sorted(imports(ast)) == [b, c]
+        # an evaluated AST has caches on it that are not nodes
+        from evaluator import evaluate
+
+        evaluated = parse(tokenize(f'{{p = {{x: 1}}; import "{d}"}}'))
+        evaluate(evaluated, {})
+        assert "$shape" in evaluated["statement"]["value"]
+        assert imports(evaluated) == [d]
+        preload(ast)
+        for filename in [b, c, d]:
+            assert filename in asts
+            expected = mark_file(parse(tokenize_file(filename)), filename)
+            assert asts[filename][1] == expected
+
+
+def test_relative_imports():
+    print("test relative imports")
+    from evaluator import evaluate
+
+    with tempfile.TemporaryDirectory() as directory:
+        sub = os.path.join(directory, "sub")
+        os.mkdir(sub)
+        write_modules(sub, {"a": 'import "b"; x = y + 1', "b": 'import "../c"; y = z'})
+        write_modules(directory, {"c": "z = 1"})
+        a = os.path.join(sub, "a")
+        # imports are found next to the importing file, not in the current one
+        assert imports(parse_file(a)) == [os.path.join(sub, "b")]
+        preload(parse_file(a))
+        assert os.path.join(sub, "b") in asts
+        assert os.path.join(directory, "c") in asts
+        environment = {}
+        evaluate(parse_file(a), environment)
+        assert environment["x"] == 2
+        # code that isn't from a file imports relative to the current directory
+        assert imports(parse(tokenize('import "b"'))) == [os.path.abspath("b")]
+
+
+def test_statements():
+    print("test statements")
+    lines = [
+        "x = 1; y = 2;\n",
+        "function f(a) {\n",
+        "  return a;\n",
+        "};\n",
+        "z = f(3)",
+    ]
+    assert list(statements(lines)) == [
+        "x = 1; y = 2;",
+        "\nfunction f(a) {\n  return a;\n};",
+        "\nz = f(3)",
+    ]
+    lines = ['s = "a;\n', 'b";\n', "for (i = 0; i < 3; i = i + 1) {\n", "x = i}\n"]
+    assert list(statements(lines)) == [
+        's = "a;\nb";',
+        "\nfor (i = 0; i < 3; i = i + 1) {\nx = i}\n",
+    ]
+    assert list(statements(["\n", "  \n"])) == []
+    # semicolons in comments and strings, with doubled quotes, don't count
+    lines = ['x = 1; // a ; "comment\n', 'y = "a;"";b"; z = [1;\n', "2]; w = 3"]
+    assert list(statements(lines)) == [
+        "x = 1;",
+        ' // a ; "comment\ny = "a;"";b";',
+        " z = [1;\n2];",
+        " w = 3",
+    ]
+    # statements are yielded before the rest of the input is read
+    read = []
+
+    def lines():
+        for line in ["x = 1;\n", "y = 2;\n"]:
+            read.append(line)
+            yield line
+
+    chunks = statements(lines())
+    assert next(chunks) == "x = 1;"
+    assert read == ["x = 1;\n"]
+
+
+if __name__ == "__main__":
+    print("test loader...")
+    test_tokenize_file()
+    test_parse_file()
+    test_statements()
+    test_preload()
+    test_relative_imports()
+    print("done.")
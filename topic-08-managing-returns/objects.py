@@ -0,0 +1,162 @@
+# Objects share a "shape" with every object that got the same property
+# names in the same order. A shape maps each name to a slot in the
+# object's values list, and records the shape reached by adding each
+# further name, so objects built alike end up with the identical shape.
+
+from output import element_text
+
+
+def new_shape():
+    return {"slots": {}, "transitions": {}}
+
+
+root_shape = new_shape()
+
+
+def add_property(shape, name):
+    """
+    Returns the shape reached by adding a property name to shape.
+    """
+    if name not in shape["transitions"]:
+        next_shape = new_shape()
+        next_shape["slots"] = dict(shape["slots"])
+        next_shape["slots"][name] = len(shape["slots"])
+        shape["transitions"][name] = next_shape
+    return shape["transitions"][name]
+
+
+class Object:
+    __slots__ = ["shape", "values"]
+
+    def __init__(self):
+        self.shape = root_shape
+        self.values = []
+
+    def __repr__(self):
+        pairs = [
+            f"{name}: {element_text(self.values[slot])}"
+            for name, slot in self.shape["slots"].items()
+        ]
+        return "{" + ", ".join(pairs) + "}"
+
+
+def make_object(node, values):
+    """
+    Builds the object for an object literal node from its evaluated values.
+    The literal's shape is worked out once and cached on the node.
+    """
+    shape = node.get("$shape")
+    if shape == None:
+        shape = root_shape
+        for name in node["names"]:
+            if name not in shape["slots"]:
+                shape = add_property(shape, name)
+        node["$shape"] = shape
+    value = Object()
+    value.shape = shape
+    if len(values) == len(shape["slots"]):
+        value.values = values
+    else:
+        # repeated names keep their last value
+        value.values = [None] * len(shape["slots"])
+        for name, property_value in zip(node["names"], values):
+            value.values[shape["slots"][name]] = property_value
+    return value
+
+
+def lookup(value, node):
+    """
+    Returns the slot of node's property in an object, caching it on node by shape.
+    """
+    if type(value) is not Object:
+        raise Exception(f"Cannot get property {node['name']} of a non-object: {value}")
+    shape = value.shape
+    cache = node.get("$cache")
+    if cache and cache[0] is shape:
+        return cache[1]
+    slot = shape["slots"].get(node["name"])
+    if slot != None:
+        node["$cache"] = (shape, slot)
+    return slot
+
+
+def get_property(value, node):
+    slot = lookup(value, node)
+    if slot == None:
+        raise Exception(f"Undefined property: {node['name']}")
+    return value.values[slot]
+
+
+def set_property(value, node, property_value):
+    slot = lookup(value, node)
+    if slot == None:
+        value.shape = add_property(value.shape, node["name"])
+        value.values.append(property_value)
+    else:
+        value.values[slot] = property_value
+
+
+def test_shapes():
+    print("test shapes")
+    a = Object()
+    b = Object()
+    for o in [a, b]:
+        set_property(o, {"name": "x"}, 1)
+        set_property(o, {"name": "y"}, 2)
+    assert a.shape is b.shape
+    assert a.shape["slots"] == {"x": 0, "y": 1}
+    assert a.values == [1, 2]
+    c = Object()
+    set_property(c, {"name": "y"}, 1)
+    set_property(c, {"name": "x"}, 2)
+    assert c.shape is not a.shape
+    assert repr(c) == "{y: 1, x: 2}"
+
+
+def test_property_cache():
+    print("test property cache")
+    a = Object()
+    set_property(a, {"name": "x"}, 1)
+    set_property(a, {"name": "y"}, 2)
+    node = {"name": "y"}
+    assert get_property(a, node) == 2
+    assert node["$cache"] == (a.shape, 1)
+    b = Object()
+    set_property(b, {"name": "y"}, 3)
+    assert get_property(b, node) == 3
+    assert node["$cache"] == (b.shape, 0)
+    set_property(b, node, 4)
+    assert b.values == [4]
+    for value, message in [
+        (b, "Undefined property: z"),
+        (5, "Cannot get property z of a non-object: 5"),
+    ]:
+        try:
+            get_property(value, {"name": "z"})
+            assert False, f"Expected an error getting z from {value}"
+        except Exception as e:
+            assert str(e) == message, f"got {e}"
+
+
+def test_make_object():
+    print("test make object")
+    node = {"names": ["x", "y"]}
+    a = make_object(node, [1, 2])
+    b = make_object(node, [3, 4])
+    assert a.shape is b.shape is node["$shape"]
+    assert repr(b) == "{x: 3, y: 4}"
+    c = Object()
+    set_property(c, {"name": "x"}, 5)
+    set_property(c, {"name": "y"}, 6)
+    assert c.shape is a.shape
+    d = make_object({"names": ["x", "y", "x"]}, [1, 2, 3])
+    assert d.shape is a.shape
+    assert repr(d) == "{x: 3, y: 2}"
+
+
+if __name__ == "__main__":
+    print("test objects...")
+    test_shapes()
+    test_make_object()
+    test_property_cache()
+    print("done.")
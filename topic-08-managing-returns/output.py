@@ -0,0 +1,160 @@
+import array
+import atexit
+import io
+import sys
+
+# Program output goes through a sink that collects text and writes it in
+# large pieces, rather than making a write to stdout for every value printed.
+
+# buffered characters that trigger a write
+threshold = 64 * 1024
+
+
+class Output:
+    __slots__ = ["stream", "parts", "size"]
+
+    def __init__(self, stream=None):
+        # None means whatever sys.stdout is when the sink is flushed
+        self.stream = stream
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= threshold:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self.parts))
+            stream.flush()
+            self.parts = []
+            self.size = 0
+
+
+sink = Output()
+
+
+# typed arrays, and slices of them, which print like lists of their elements
+typed_array_types = (array.array, memoryview)
+
+
+def text(value):
+    """
+    Returns the text print shows for a value.
+    """
+    if type(value) in typed_array_types:
+        value = value.tolist()
+    if type(value) is list:
+        return "[" + ", ".join([element_text(element) for element in value]) + "]"
+    return str(value)
+
+
+def element_text(value):
+    """
+    Returns the text for a value inside an array or object, where strings
+    are quoted.
+    """
+    if type(value) is list or type(value) in typed_array_types:
+        return text(value)
+    return repr(value)
+
+
+def print_values(values):
+    """
+    Writes values the way print(value, end=" ") for each, then print(), would,
+    but with typed arrays shown as lists.
+    """
+    sink.write("".join([f"{text(value)} " for value in values]) + "\n")
+
+
+def flush():
+    sink.flush()
+
+
+def redirect(stream):
+    """
+    Sends program output to stream, a file or io.StringIO, returning the old sink.
+    The old sink is flushed first so that output stays in order.
+    """
+    global sink
+    sink.flush()
+    old_sink = sink
+    sink = Output(stream)
+    return old_sink
+
+
+def restore(old_sink):
+    global sink
+    sink.flush()
+    sink = old_sink
+
+
+atexit.register(lambda: sink.flush())
+
+
+def test_print_values():
+    print("test print values")
+    stream = io.StringIO()
+    old_sink = redirect(stream)
+    try:
+        print_values([])
+        print_values([1])
+        print_values([1, 2.5, "x", None])
+        assert stream.getvalue() == ""
+        flush()
+    finally:
+        restore(old_sink)
+    expected = io.StringIO()
+    print(file=expected)
+    print(1, end=" ", file=expected)
+    print(file=expected)
+    for value in [1, 2.5, "x", None]:
+        print(value, end=" ", file=expected)
+    print(file=expected)
+    assert stream.getvalue() == expected.getvalue()
+
+
+def test_threshold():
+    print("test threshold")
+    stream = io.StringIO()
+    old_sink = redirect(stream)
+    try:
+        # each line is 101 characters
+        line = "x" * 99
+        for _ in range(threshold // 101):
+            print_values([line])
+        assert stream.getvalue() == ""
+        print_values([line])
+        assert len(stream.getvalue()) == (threshold // 101 + 1) * 101
+        print_values([1])
+    finally:
+        restore(old_sink)
+    # restoring flushes what's left
+    assert stream.getvalue().endswith("x \n1 \n")
+
+
+def test_typed_arrays():
+    print("test typed arrays")
+    stream = io.StringIO()
+    old_sink = redirect(stream)
+    try:
+        a = array.array("d", [1.5, 1.5, 1.5])
+        b = array.array("q", [0, 0])
+        print_values([a, memoryview(a)[0:2], b, [a, "x", [b]]])
+    finally:
+        restore(old_sink)
+    assert (
+        stream.getvalue()
+        == "[1.5, 1.5, 1.5] [1.5, 1.5] [0, 0] [[1.5, 1.5, 1.5], 'x', [[0, 0]]] \n"
+    )
+
+
+if __name__ == "__main__":
+    print("test output...")
+    test_print_values()
+    test_typed_arrays()
+    test_threshold()
+    print("done.")
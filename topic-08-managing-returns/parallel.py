@@ -0,0 +1,299 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import evaluator
+from evaluator import assigned, bind_values, builtin_functions
+from parser import children
+
+# Parallel argument evaluation swaps evaluator.evaluate, as instrumentation
+# does, for a version that evaluates the arguments of a call in a thread pool
+# when at least two of them call functions and all of them are pure: they
+# don't print, read input, exit, or store into arrays or objects, and they
+# only call pure functions. Pure arguments can't see each other's effects,
+# so their order doesn't matter. Anything the analysis can't prove pure is
+# evaluated one argument after another, as usual.
+#
+# Threads share the interpreter lock, so the gain is in externs that release
+# it, such as waiting or work done in C, rather than in interpreted code.
+
+plain_evaluate = evaluator.evaluate
+
+# extern targets known to have no side effects, and whole modules of them
+pure_targets = {
+    "builtins.len",
+    "builtins.abs",
+    "builtins.min",
+    "builtins.max",
+    "builtins.round",
+    "arrays.total",
+    "arrays.minimum",
+    "arrays.maximum",
+    "arrays.dot",
+    # waiting changes nothing the program can see
+    "time.sleep",
+}
+pure_modules = {"math", "cmath"}
+
+# statements that have effects outside a function's own environment
+impure_tags = {"input", "print", "exit", "import", "extern"}
+
+state = {"pool": None}
+# set in the pool's threads, so that their calls don't wait on the pool
+local = threading.local()
+
+
+def called_names(ast):
+    """
+    Returns the names of the functions a node calls, or None if it might have
+    an effect of its own, or calls something other than a named function.
+    The answer is cached on the node.
+    """
+    if "$calls" not in ast:
+        tag = ast["tag"]
+        names = set()
+        if tag in impure_tags:
+            names = None
+        elif tag == "=" and ast["target"]["tag"] != "<identifier>":
+            names = None
+        elif tag == "<function_call>" and ast["expression"]["tag"] != "<identifier>":
+            names = None
+        elif tag == "function":
+            # defining a function doesn't run its body
+            pass
+        else:
+            if tag == "<function_call>":
+                names.add(ast["expression"]["value"])
+            for child in children(ast, evaluated=True):
+                child_names = called_names(child)
+                if child_names == None:
+                    names = None
+                    break
+                names |= child_names
+        ast["$calls"] = None if names == None else frozenset(names)
+    return ast["$calls"]
+
+
+def function_calls(function):
+    """
+    Returns the names a function's body calls, or None if its body might have
+    effects, or calls names it binds itself, which can't be known in advance.
+    """
+    if "$calls" not in function:
+        names = called_names(function["body"])
+        if names != None:
+            local_names = assigned(function["body"])
+            parameter = function["parameters"]
+            while parameter and local_names != None:
+                local_names.add(parameter["value"])
+                parameter = parameter.get("next", None)
+            if local_names == None or names & local_names:
+                names = None
+        function["$calls"] = names
+    return function["$calls"]
+
+
+def lookup(name, environment):
+    while environment:
+        if name in environment:
+            return environment[name]
+        environment = environment.get("$parent", None)
+    return builtin_functions.get(name)
+
+
+def is_pure_target(target):
+    return target in pure_targets or target.rpartition(".")[0] in pure_modules
+
+
+def are_pure(names, environment, seen):
+    """
+    Checks that every name, looked up in environment, is a pure extern or a
+    function that only calls pure functions.
+    """
+    for name in names:
+        value = lookup(name, environment)
+        if type(value) is not dict:
+            return False
+        if value.get("tag") == "extern":
+            if not is_pure_target(value["target"]):
+                return False
+        elif value.get("tag") == "function":
+            # a function being checked already is assumed pure while it recurses
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            calls = function_calls(value)
+            if calls == None or not are_pure(calls, environment, seen):
+                return False
+        else:
+            return False
+    return True
+
+
+def parallel_arguments(ast, environment):
+    """
+    Returns the arguments of a call as a list if they can be evaluated in
+    parallel, or None.
+    """
+    arguments = []
+    names = set()
+    calling = 0
+    argument = ast["arguments"]
+    while argument:
+        argument_names = called_names(argument)
+        if argument_names == None:
+            return None
+        if argument_names:
+            calling += 1
+        names |= argument_names
+        arguments.append(argument)
+        argument = argument.get("next", None)
+    # arguments without calls are too cheap to be worth a thread
+    if calling < 2 or not are_pure(names, environment, set()):
+        return None
+    return arguments
+
+
+def evaluate_in_thread(ast, environment):
+    local.inside = True
+    return plain_evaluate(ast, environment)
+
+
+def parallel_evaluate(ast, environment):
+    if (
+        ast != None
+        and ast["tag"] == "<function_call>"
+        and not getattr(local, "inside", False)
+    ):
+        arguments = parallel_arguments(ast, environment)
+        if arguments:
+            # the first argument is evaluated here while the others run
+            futures = [
+                state["pool"].submit(evaluate_in_thread, argument, environment)
+                for argument in arguments[1:]
+            ]
+            values = [plain_evaluate(arguments[0], environment)[0]]
+            values += [future.result()[0] for future in futures]
+            # make the call with the values in place of the arguments
+            nodes, bindings = bind_values(dict(enumerate(values)), environment)
+            for i in range(len(values) - 1):
+                nodes[i]["next"] = nodes[i + 1]
+            return plain_evaluate(dict(ast, arguments=nodes[0]), bindings)
+    return plain_evaluate(ast, environment)
+
+
+def enable(workers=None):
+    """
+    Turns on parallel argument evaluation, with a pool of worker threads.
+    """
+    if state["pool"] == None:
+        state["pool"] = ThreadPoolExecutor(workers)
+    evaluator.evaluate = parallel_evaluate
+
+
+def disable():
+    evaluator.evaluate = plain_evaluate
+    if state["pool"]:
+        state["pool"].shutdown()
+        state["pool"] = None
+
+
+def evaluate(ast, environment, workers=None):
+    """
+    Evaluates ast with parallel argument evaluation on.
+    """
+    enable(workers)
+    try:
+        return parallel_evaluate(ast, environment)
+    finally:
+        disable()
+
+
+import io
+import time
+
+from tokenizer import tokenize
+from parser import parse
+import output
+
+functions = """{
+    extern sleep = "time.sleep";
+    extern sqrt = "math.sqrt";
+    function slow(x) {sleep(0.05); return x * 2};
+    function hypot(a, b) {return sqrt(a * a + b * b)};
+    function fib(n) {if (n < 2) return n else return fib(n - 1) + fib(n - 2)};
+    function add(a, b, c, d) {return a + b + c + d};
+    function shout(x) {print(x); return x};
+    function store(a, x) {a[0] = x; return x};
+    function caller(f) {return f(1)};
+    function local(x) {slow = x; return slow(x)}
+}"""
+
+
+def test_purity():
+    print("test purity")
+    environment = {}
+    plain_evaluate(parse(tokenize(functions)), environment)
+
+    def arguments(code):
+        return parallel_arguments(parse(tokenize(code)), environment)
+
+    assert len(arguments("add(slow(1), slow(2), 3, 4)")) == 4
+    assert arguments("add(hypot(1, 2), fib(3), slow(1), sqrt(4))")
+    # one calling argument isn't worth a thread
+    assert arguments("add(slow(1), 2, 3, 4)") == None
+    # output, input, stores, unknown and unnamed functions are not pure
+    assert arguments("add(slow(1), shout(2), 3, 4)") == None
+    assert arguments("add(slow(1), input(), slow(3), 4)") == None
+    assert arguments("add(slow(1), store([0], 2), 3, 4)") == None
+    assert arguments("add(slow(1), missing(2), 3, 4)") == None
+    assert arguments("add(slow(1), caller(slow), 3, 4)") == None
+    assert arguments("add(slow(1), local(slow), 3, 4)") == None
+    assert arguments("add(slow(1), [slow][0](2), 3, 4)") == None
+    # the answer depends on what the names are bound to
+    environment["sleep"] = {"tag": "extern", "target": "os.system", "function": None}
+    assert arguments("add(slow(1), slow(2), 3, 4)") == None
+
+
+def test_parallel_evaluate():
+    print("test parallel evaluate")
+    environment = {}
+    plain_evaluate(parse(tokenize(functions)), environment)
+    for code, expected in [
+        ("x = add(slow(1), slow(2), slow(3), slow(4))", 20),
+        ("x = add(fib(10), hypot(3, 4), 1, slow(1))", 63.0),
+        ("x = add(slow(1), add(slow(1), slow(1), 1, 1), 1, 1)", 10),
+    ]:
+        evaluate(parse(tokenize(code)), environment)
+        assert environment["x"] == expected, f"{code}: {environment['x']}"
+    assert evaluator.evaluate is plain_evaluate and state["pool"] == None
+    # four waits of 0.05 seconds overlap
+    ast = parse(tokenize("x = add(slow(1), slow(2), slow(3), slow(4))"))
+    start = time.perf_counter()
+    evaluate(ast, environment)
+    assert time.perf_counter() - start < 0.15
+    # impure arguments run in order
+    stream = io.StringIO()
+    old_sink = output.redirect(stream)
+    try:
+        evaluate(
+            parse(tokenize("x = add(shout(1), shout(2), shout(3), slow(4))")),
+            environment,
+        )
+    finally:
+        output.restore(old_sink)
+    assert stream.getvalue() == "1 \n2 \n3 \n" and environment["x"] == 14
+    # errors come from the first argument that fails
+    try:
+        evaluate(
+            parse(tokenize("x = add(slow(1), fib(1 / 0), slow(3), 1)")), environment
+        )
+        assert False, "Expected division by zero"
+    except Exception as e:
+        assert str(e) == "Division by zero"
+
+
+if __name__ == "__main__":
+    print("test parallel...")
+    test_purity()
+    test_parallel_evaluate()
+    print("done.")
@@ -1,16 +1,19 @@
-from tokenizer import tokenize
+import sys
 
-# // Define basic tokenizer elements 
+from tokenizer import tokenize, line_index, line_column
+
+# // Define basic tokenizer elements
 
 # number = /([0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?)/; // Supports integers, floating-point numbers, and scientific notation
 # boolean = "true" | "false"; // Boolean literals
 # identifier = /[a-zA-Z_][a-zA-Z0-9_]*/; // Variable names, function names
 # string = /"([^"\\]|\\.)*"/; // String literals with escaped quotes
+# property = <identifier> | <string>; // Object literal property names
 
 grammar = """
 
-simple_expression = <number> | <boolean> | <identifier> | "(" expression ")" | "-" simple_expression | function_expression;
-callable_expression = simple_expression [ expression_list ];
+simple_expression = <number> | <boolean> | <string> | "null" | <identifier> | "(" expression ")" | "-" simple_expression | function_expression | input_expression | array_literal | object_literal;
+callable_expression = simple_expression { expression_list | "[" expression "]" | "." <identifier> };
 arithmetic_factor = callable_expression;
 arithmetic_term = arithmetic_factor { ("*" | "/") arithmetic_factor };
 arithmetic_expression = arithmetic_term { ("+" | "-") arithmetic_term };
@@ -19,17 +22,26 @@ logical_factor = relational_expression | "!" logical_factor;
 logical_term = logical_factor { "&&" logical_factor };
 logical_expression = logical_term { "||" logical_term };
 function_expression = "function" identifier_list block_statement;
+input_expression = "input" "(" ")";
 expression = logical_expression;
 identifier_list = "(" [ <identifier> { "," <identifier> ] } ")";
 expression_list = "(" [ expression { "," expression } ] ")";
-assignment = <identifier> "=" expression;
+array_literal = "[" [ expression { "," expression } ] "]";
+object_literal = "{" [ property ":" expression { "," property ":" expression } ] "}";
+assignment = callable_expression "=" expression;
 block_statement = "{" {";"} [ statement { ";" {";"} statement } {";"} ] "}";
 if_statement = "if" "(" expression ")" statement "else" statement;
 while_statement = "while" "(" expression ")" statement;
+for_statement = "for" "(" [ assignment ] ";" [ expression ] ";" [ assignment ] ")" statement;
+break_statement = "break";
+continue_statement = "continue";
 return_statement = "return" [ expression ];
+exit_statement = "exit" "(" [ expression ] ")";
 print_statement = "print" expression_list;
 function_statement = "function" <identifier> identifier_list block_statement;
-statement = block_statement | if_statement | while_statement |  function_statement | return_statement | print_statement | assignment | expression;
+import_statement = "import" <string>;
+extern_statement = "extern" <identifier> "=" <string>;
+statement = block_statement | if_statement | while_statement | for_statement | break_statement | continue_statement | function_statement | return_statement | exit_statement | print_statement | import_statement | extern_statement | assignment | expression;
 program = statement
 """
 
@@ -38,12 +50,28 @@ AST FORMAT
 
 { "tag":"<op>","left":<expression_node>, "right":<expression_node>}
 { "tag":"negate/not","value":<expression_node>}
+{ "tag":"null"}
+{ "tag":"input"}
 { "tag":"=", "target":<node>, "value":<expression_node>}
 { "tag":"if", "condition":<expression_node>, 
     "then":<statement_node>,
     "else":<statement_node>}
 { "tag":"while", "condition":<expression_node>, 
     "do":<statement_node>}
+{ "tag":"for", "init":<statement_node>, "condition":<expression_node>,
+    "step":<statement_node>, "do":<statement_node>}
+{ "tag":"break"}
+{ "tag":"exit", "value":<expression_node>}
+{ "tag":"continue"}
+{ "tag":"import", "path":<string>}
+{ "tag":"<array>", "elements":<expression_node>}
+{ "tag":"<index>", "expression":<expression_node>, "index":<expression_node>}
+{ "tag":"<object>", "names":[<string>...], "values":<expression_node>}
+{ "tag":"<property>", "expression":<expression_node>, "name":<string>}
+{ "tag":"extern", "name":<string>, "target":<string>}
+
+Every node also carries "position" and "end", the source offsets of
+its first character and one past its last character.
 
 """
 
@@ -52,18 +80,74 @@ def t(code):
     return tokenize(code) + [{"tag": None}]
 
 
+def end_of(tokens, remaining):
+    """
+    Returns the end offset of the last token consumed between tokens and remaining.
+    """
+    return tokens[len(tokens) - len(remaining) - 1]["end"]
+
+
+def remove_positions(ast):
+    """
+    Returns a copy of ast without source positions, or anything the evaluator
+    has cached on it, for comparing structure.
+    """
+    if type(ast) is dict:
+        return {
+            key: remove_positions(value)
+            for key, value in ast.items()
+            if key not in ["position", "end"] and not key.startswith("$")
+        }
+    return ast
+
+
+def children(node, evaluated=False):
+    """
+    Yields the nodes directly under an AST node, including the next item of
+    a list, but not anything the evaluator has cached on it under a "$" key.
+    With evaluated, yields the nodes evaluating it evaluates instead: every
+    item of the lists under it, but not the item after it, unless it is a
+    block, whose next statement is part of it.
+    """
+    for key, value in node.items():
+        if type(value) is not dict or key.startswith("$"):
+            continue
+        if not evaluated:
+            yield value
+        elif key != "next" or node["tag"] == "block":
+            # a child may be the first item of a list
+            while value:
+                yield value
+                value = value.get("next", None)
+
+
 def parse_simple_expression(tokens):
     """
-    simple_expression = <number> | <boolean> | <identifier> | "(" expression ")" | "-" simple_expression | function_expression;
+    simple_expression = <number> | <boolean> | <string> | "null" | <identifier> | "(" expression ")" | "-" simple_expression | function_expression | input_expression | array_literal | object_literal;
     """
     token = tokens[0]
     tag = token["tag"]
-    if tag == "<number>":
-        return {"tag": "<number>", "value": token["value"]}, tokens[1:]
-    if tag == "<boolean>":
-        return {"tag": "<boolean>", "value": token["value"]}, tokens[1:]
-    if tag == "<identifier>":
-        return {"tag": "<identifier>", "value": token["value"]}, tokens[1:]
+    if tag in ["<number>", "<boolean>", "<identifier>"]:
+        return {
+            "tag": tag,
+            "value": token["value"],
+            "position": token["position"],
+            "end": token["end"],
+        }, tokens[1:]
+    if tag == "<string>":
+        # identical string literals share one interned value
+        return {
+            "tag": tag,
+            "value": sys.intern(token["value"]),
+            "position": token["position"],
+            "end": token["end"],
+        }, tokens[1:]
+    if tag == "null":
+        return {
+            "tag": "null",
+            "position": token["position"],
+            "end": token["end"],
+        }, tokens[1:]
     if tag == "(":
         node, tokens = parse_expression(tokens[1:])
         if tokens[0]["tag"] != ")":
@@ -71,62 +155,133 @@ def parse_simple_expression(tokens):
         return node, tokens[1:]
     if tag == "-":
         node, tokens = parse_simple_expression(tokens[1:])
-        return {"tag": "negate", "value": node}, tokens
+        return {
+            "tag": "negate",
+            "value": node,
+            "position": token["position"],
+            "end": node["end"],
+        }, tokens
     if tag == "function":
         return parse_function_expression(tokens)
+    if tag == "input":
+        return parse_input_expression(tokens)
+    if tag == "[":
+        return parse_array_literal(tokens)
+    if tag == "{":
+        return parse_object_literal(tokens)
 
     raise Exception(f"Unexpected token: {tokens[0]}")
 
 
 def test_parse_simple_expression():
     """
-    simple_expression = <number> | <boolean> | <identifier> | "(" expression ")" | "-" simple_expression | function_expression;
+    simple_expression = <number> | <boolean> | <string> | "null" | <identifier> | "(" expression ")" | "-" simple_expression | function_expression | input_expression | array_literal | object_literal;
     """
-    assert parse_simple_expression(t("1"))[0] == {"tag": "<number>", "value": 1}
-    assert parse_simple_expression(t("1.2"))[0] == {"tag": "<number>", "value": 1.2}
-    assert parse_simple_expression(t("true"))[0] == {"tag": "<boolean>", "value": 1}
-    assert parse_simple_expression(t("false"))[0] == {"tag": "<boolean>", "value": 0}
-    assert parse_simple_expression(t("x"))[0] == {"tag": "<identifier>", "value": "x"}
+    assert remove_positions(parse_simple_expression(t("1"))[0]) == {
+        "tag": "<number>",
+        "value": 1,
+    }
+    assert remove_positions(parse_simple_expression(t("1.2"))[0]) == {
+        "tag": "<number>",
+        "value": 1.2,
+    }
+    assert remove_positions(parse_simple_expression(t("true"))[0]) == {
+        "tag": "<boolean>",
+        "value": 1,
+    }
+    assert remove_positions(parse_simple_expression(t("false"))[0]) == {
+        "tag": "<boolean>",
+        "value": 0,
+    }
+    assert remove_positions(parse_simple_expression(t("x"))[0]) == {
+        "tag": "<identifier>",
+        "value": "x",
+    }
 
-    assert parse_simple_expression(t("-1"))[0] == {
+    assert remove_positions(parse_simple_expression(t("-1"))[0]) == {
         "tag": "negate",
         "value": {"tag": "<number>", "value": 1},
     }
+    assert remove_positions(parse_simple_expression(t('"a ""b"""'))[0]) == {
+        "tag": "<string>",
+        "value": 'a "b"',
+    }
+    assert remove_positions(parse_simple_expression(t("null"))[0]) == {"tag": "null"}
+    assert remove_positions(parse_simple_expression(t("input()"))[0]) == {
+        "tag": "input"
+    }
+    a = parse_simple_expression(t('"interned"'))[0]
+    b = parse_simple_expression(t('"interned"'))[0]
+    assert a["value"] is b["value"]
+    assert parse_simple_expression(t("[1,x]"))[0] == parse_array_literal(t("[1,x]"))[0]
+    assert parse_simple_expression(t("{a:1}"))[0] == parse_object_literal(t("{a:1}"))[0]
+
 
 def parse_callable_expression(tokens):
     """
-    callable_expression = simple_expression [ expression_list ];
+    callable_expression = simple_expression { expression_list | "[" expression "]" | "." <identifier> };
     """
     expression, tokens = parse_simple_expression(tokens)
-    while tokens[0]["tag"] == "(":
-        arguments, tokens = parse_expression_list(tokens)
-        expression = {
-            "tag": "<function_call>",
-            "expression": expression,
-            "arguments": arguments,
-        }
+    while tokens[0]["tag"] in ["(", "[", "."]:
+        if tokens[0]["tag"] == "(":
+            arguments, remaining = parse_expression_list(tokens)
+            expression = {
+                "tag": "<function_call>",
+                "expression": expression,
+                "arguments": arguments,
+                "position": expression["position"],
+                "end": end_of(tokens, remaining),
+            }
+        elif tokens[0]["tag"] == ".":
+            if tokens[1]["tag"] != "<identifier>":
+                raise Exception(f"Expected property name: {tokens[1]}")
+            expression = {
+                "tag": "<property>",
+                "expression": expression,
+                "name": tokens[1]["value"],
+                "position": expression["position"],
+                "end": tokens[1]["end"],
+            }
+            remaining = tokens[2:]
+        else:
+            index, remaining = parse_expression(tokens[1:])
+            if remaining[0]["tag"] != "]":
+                raise Exception(f"Expected ']': {remaining[0]}")
+            expression = {
+                "tag": "<index>",
+                "expression": expression,
+                "index": index,
+                "position": expression["position"],
+                "end": remaining[0]["end"],
+            }
+            remaining = remaining[1:]
+        tokens = remaining
     return expression, tokens
 
+
 def test_parse_callable_expression():
     """
-    callable_expression = simple_expression [ expression_list ];
+    callable_expression = simple_expression { expression_list | "[" expression "]" | "." <identifier> };
     """
-    for expression in ["1","1.2","true","x","-1"]:
-        assert parse_callable_expression(t(expression))[0] == parse_simple_expression(t(expression))[0]
+    for expression in ["1", "1.2", "true", "x", "-1"]:
+        assert (
+            parse_callable_expression(t(expression))[0]
+            == parse_simple_expression(t(expression))[0]
+        )
 
-    ast = parse_callable_expression(t("x()"))[0]
+    ast = remove_positions(parse_callable_expression(t("x()"))[0])
     assert ast == {
         "tag": "<function_call>",
         "expression": {"tag": "<identifier>", "value": "x"},
         "arguments": None,
     }
-    ast = parse_callable_expression(t("x(1)"))[0]
+    ast = remove_positions(parse_callable_expression(t("x(1)"))[0])
     assert ast == {
         "tag": "<function_call>",
         "expression": {"tag": "<identifier>", "value": "x"},
         "arguments": {"tag": "<number>", "value": 1},
     }
-    ast = parse_callable_expression(t("x(1,2+3)"))[0]
+    ast = remove_positions(parse_callable_expression(t("x(1,2+3)"))[0])
     assert ast == {
         "tag": "<function_call>",
         "expression": {"tag": "<identifier>", "value": "x"},
@@ -140,7 +295,41 @@ def test_parse_callable_expression():
             },
         },
     }
-    ast = parse_callable_expression(t("x()(1,2)"))[0]
+    ast = remove_positions(parse_callable_expression(t("x[1]"))[0])
+    assert ast == {
+        "tag": "<index>",
+        "expression": {"tag": "<identifier>", "value": "x"},
+        "index": {"tag": "<number>", "value": 1},
+    }
+    ast = remove_positions(parse_callable_expression(t("x(1)[2][y]"))[0])
+    assert ast == {
+        "tag": "<index>",
+        "expression": {
+            "tag": "<index>",
+            "expression": {
+                "tag": "<function_call>",
+                "expression": {"tag": "<identifier>", "value": "x"},
+                "arguments": {"tag": "<number>", "value": 1},
+            },
+            "index": {"tag": "<number>", "value": 2},
+        },
+        "index": {"tag": "<identifier>", "value": "y"},
+    }
+    ast = remove_positions(parse_callable_expression(t("x.y[1].z"))[0])
+    assert ast == {
+        "tag": "<property>",
+        "expression": {
+            "tag": "<index>",
+            "expression": {
+                "tag": "<property>",
+                "expression": {"tag": "<identifier>", "value": "x"},
+                "name": "y",
+            },
+            "index": {"tag": "<number>", "value": 1},
+        },
+        "name": "z",
+    }
+    ast = remove_positions(parse_callable_expression(t("x()(1,2)"))[0])
     assert ast == {
         "tag": "<function_call>",
         "expression": {
@@ -155,18 +344,23 @@ def test_parse_callable_expression():
         },
     }
 
+
 def parse_arithmetic_factor(tokens):
     """
     arithmetic_factor = callable_expression;
     """
     return parse_callable_expression(tokens)
 
+
 def test_parse_arithmetic_factor():
     """
     arithmetic_factor = callable_expression;
     """
-    for expression in ["1","1.2","true","x","-1"]:
-        assert parse_arithmetic_factor(t(expression))[0] == parse_callable_expression(t(expression))[0]
+    for expression in ["1", "1.2", "true", "x", "-1"]:
+        assert (
+            parse_arithmetic_factor(t(expression))[0]
+            == parse_callable_expression(t(expression))[0]
+        )
 
 
 def parse_arithmetic_term(tokens):
@@ -177,7 +371,13 @@ def parse_arithmetic_term(tokens):
     while tokens[0]["tag"] in ["*", "/"]:
         tag = tokens[0]["tag"]
         next_node, tokens = parse_arithmetic_factor(tokens[1:])
-        node = {"tag": tag, "left": node, "right": next_node}
+        node = {
+            "tag": tag,
+            "left": node,
+            "right": next_node,
+            "position": node["position"],
+            "end": next_node["end"],
+        }
     return node, tokens
 
 
@@ -185,18 +385,21 @@ def test_parse_arithmetic_term():
     """
     arithmetic_term = arithmetic_factor { ("*" | "/") arithmetic_factor };
     """
-    assert parse_arithmetic_term(t("x"))[0] == {"tag": "<identifier>", "value": "x"}
-    assert parse_arithmetic_term(t("x*y"))[0] == {
+    assert remove_positions(parse_arithmetic_term(t("x"))[0]) == {
+        "tag": "<identifier>",
+        "value": "x",
+    }
+    assert remove_positions(parse_arithmetic_term(t("x*y"))[0]) == {
         "tag": "*",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_arithmetic_term(t("x/y"))[0] == {
+    assert remove_positions(parse_arithmetic_term(t("x/y"))[0]) == {
         "tag": "/",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_arithmetic_term(t("x*y/z"))[0] == {
+    assert remove_positions(parse_arithmetic_term(t("x*y/z"))[0]) == {
         "tag": "/",
         "left": {
             "tag": "*",
@@ -215,7 +418,13 @@ def parse_arithmetic_expression(tokens):
     while tokens[0]["tag"] in ["+", "-"]:
         tag = tokens[0]["tag"]
         next_node, tokens = parse_arithmetic_term(tokens[1:])
-        node = {"tag": tag, "left": node, "right": next_node}
+        node = {
+            "tag": tag,
+            "left": node,
+            "right": next_node,
+            "position": node["position"],
+            "end": next_node["end"],
+        }
     return node, tokens
 
 
@@ -223,26 +432,26 @@ def test_parse_arithmetic_expression():
     """
     arithmetic_expression = arithmetic_term { ("+" | "-") arithmetic_term };
     """
-    assert parse_arithmetic_expression(t("x"))[0] == {
+    assert remove_positions(parse_arithmetic_expression(t("x"))[0]) == {
         "tag": "<identifier>",
         "value": "x",
     }
-    assert parse_arithmetic_expression(t("x*y"))[0] == {
+    assert remove_positions(parse_arithmetic_expression(t("x*y"))[0]) == {
         "tag": "*",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_arithmetic_expression(t("x+y"))[0] == {
+    assert remove_positions(parse_arithmetic_expression(t("x+y"))[0]) == {
         "tag": "+",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_arithmetic_expression(t("x-y"))[0] == {
+    assert remove_positions(parse_arithmetic_expression(t("x-y"))[0]) == {
         "tag": "-",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_arithmetic_expression(t("x+y-z"))[0] == {
+    assert remove_positions(parse_arithmetic_expression(t("x+y-z"))[0]) == {
         "tag": "-",
         "left": {
             "tag": "+",
@@ -251,7 +460,7 @@ def test_parse_arithmetic_expression():
         },
         "right": {"tag": "<identifier>", "value": "z"},
     }
-    ast = parse_arithmetic_expression(t("x+y*z"))[0]
+    ast = remove_positions(parse_arithmetic_expression(t("x+y*z"))[0])
     assert ast == {
         "tag": "+",
         "left": {"tag": "<identifier>", "value": "x"},
@@ -261,7 +470,7 @@ def test_parse_arithmetic_expression():
             "right": {"tag": "<identifier>", "value": "z"},
         },
     }
-    ast = parse_arithmetic_expression(t("(x+y)*z"))[0]
+    ast = remove_positions(parse_arithmetic_expression(t("(x+y)*z"))[0])
     assert ast == {
         "tag": "*",
         "left": {
@@ -281,7 +490,13 @@ def parse_relational_expression(tokens):
     while tokens[0]["tag"] in ["<", ">", "<=", ">=", "==", "!="]:
         tag = tokens[0]["tag"]
         next_node, tokens = parse_arithmetic_expression(tokens[1:])
-        node = {"tag": tag, "left": node, "right": next_node}
+        node = {
+            "tag": tag,
+            "left": node,
+            "right": next_node,
+            "position": node["position"],
+            "end": next_node["end"],
+        }
     return node, tokens
 
 
@@ -289,17 +504,17 @@ def test_parse_relational_expression():
     """
     relational_expression = arithmetic_expression { ("<" | ">" | "<=" | ">=" | "==" | "!=") arithmetic_expression };
     """
-    assert parse_relational_expression(t("x"))[0] == {
+    assert remove_positions(parse_relational_expression(t("x"))[0]) == {
         "tag": "<identifier>",
         "value": "x",
     }
     for tag in ["<", ">", "<=", ">=", "==", "!="]:
-        assert parse_relational_expression(t(f"x{tag}y"))[0] == {
+        assert remove_positions(parse_relational_expression(t(f"x{tag}y"))[0]) == {
             "tag": tag,
             "left": {"tag": "<identifier>", "value": "x"},
             "right": {"tag": "<identifier>", "value": "y"},
         }
-    assert parse_relational_expression(t("x<y>z"))[0] == {
+    assert remove_positions(parse_relational_expression(t("x<y>z"))[0]) == {
         "tag": ">",
         "left": {
             "tag": "<",
@@ -317,7 +532,12 @@ def parse_logical_factor(tokens):
     token = tokens[0]
     if token["tag"] == "!":
         node, tokens = parse_logical_factor(tokens[1:])
-        return {"tag": "not", "value": node}, tokens
+        return {
+            "tag": "not",
+            "value": node,
+            "position": token["position"],
+            "end": node["end"],
+        }, tokens
     return parse_relational_expression(tokens)
 
 
@@ -325,9 +545,12 @@ def test_parse_logical_factor():
     """
     logical_factor = relational_expression | "!" logical_factor;
     """
-    assert parse_logical_factor(t("x"))[0] == {"tag": "<identifier>", "value": "x"}
+    assert remove_positions(parse_logical_factor(t("x"))[0]) == {
+        "tag": "<identifier>",
+        "value": "x",
+    }
 
-    assert parse_logical_factor(t("!x"))[0] == {
+    assert remove_positions(parse_logical_factor(t("!x"))[0]) == {
         "tag": "not",
         "value": {"tag": "<identifier>", "value": "x"},
     }
@@ -341,7 +564,13 @@ def parse_logical_term(tokens):
     while tokens[0]["tag"] == "&&":
         tag = tokens[0]["tag"]
         next_node, tokens = parse_logical_factor(tokens[1:])
-        node = {"tag": tag, "left": node, "right": next_node}
+        node = {
+            "tag": tag,
+            "left": node,
+            "right": next_node,
+            "position": node["position"],
+            "end": next_node["end"],
+        }
     return node, tokens
 
 
@@ -349,13 +578,16 @@ def test_parse_logical_term():
     """
     logical_term = logical_factor { "&&" logical_factor };
     """
-    assert parse_logical_term(t("x"))[0] == {"tag": "<identifier>", "value": "x"}
-    assert parse_logical_term(t("x&&y"))[0] == {
+    assert remove_positions(parse_logical_term(t("x"))[0]) == {
+        "tag": "<identifier>",
+        "value": "x",
+    }
+    assert remove_positions(parse_logical_term(t("x&&y"))[0]) == {
         "tag": "&&",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_logical_term(t("x&&y&&z"))[0] == {
+    assert remove_positions(parse_logical_term(t("x&&y&&z"))[0]) == {
         "tag": "&&",
         "left": {
             "tag": "&&",
@@ -374,7 +606,13 @@ def parse_logical_expression(tokens):
     while tokens[0]["tag"] == "||":
         tag = tokens[0]["tag"]
         next_node, tokens = parse_logical_term(tokens[1:])
-        node = {"tag": tag, "left": node, "right": next_node}
+        node = {
+            "tag": tag,
+            "left": node,
+            "right": next_node,
+            "position": node["position"],
+            "end": next_node["end"],
+        }
     return node, tokens
 
 
@@ -383,13 +621,16 @@ def test_parse_logical_expression():
     logical_expression = logical_term { "||" logical_term };
     """
 
-    assert parse_logical_expression(t("x"))[0] == {"tag": "<identifier>", "value": "x"}
-    assert parse_logical_expression(t("x||y"))[0] == {
+    assert remove_positions(parse_logical_expression(t("x"))[0]) == {
+        "tag": "<identifier>",
+        "value": "x",
+    }
+    assert remove_positions(parse_logical_expression(t("x||y"))[0]) == {
         "tag": "||",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {"tag": "<identifier>", "value": "y"},
     }
-    assert parse_logical_expression(t("x||y&&z"))[0] == {
+    assert remove_positions(parse_logical_expression(t("x||y&&z"))[0]) == {
         "tag": "||",
         "left": {"tag": "<identifier>", "value": "x"},
         "right": {
@@ -405,16 +646,23 @@ def parse_function_expression(tokens):
     function_expression = "function" identifier_list block_statement;
     """
     assert tokens[0]["tag"] == "function"
+    position = tokens[0]["position"]
     parameters, tokens = parse_identifier_list(tokens[1:])
     body, tokens = parse_block_statement(tokens)
-    return {"tag": "function", "parameters": parameters, "body": body}, tokens
+    return {
+        "tag": "function",
+        "parameters": parameters,
+        "body": body,
+        "position": position,
+        "end": body["end"],
+    }, tokens
 
 
 def test_parse_function_expression():
     """
     function_expression = "function" identifier_list block_statement;
     """
-    ast = parse_function_expression(t("function() {return 1}"))[0]
+    ast = remove_positions(parse_function_expression(t("function() {return 1}"))[0])
     assert ast == {
         "tag": "function",
         "parameters": None,
@@ -423,7 +671,9 @@ def test_parse_function_expression():
             "statement": {"tag": "return", "value": {"tag": "<number>", "value": 1}},
         },
     }
-    ast = parse_function_expression(t("function(x,y) {return x*y}"))[0]
+    ast = remove_positions(
+        parse_function_expression(t("function(x,y) {return x*y}"))[0]
+    )
     assert ast == {
         "tag": "function",
         "parameters": {
@@ -445,12 +695,43 @@ def test_parse_function_expression():
     }
 
 
+def parse_input_expression(tokens):
+    """
+    input_expression = "input" "(" ")";
+    """
+    assert tokens[0]["tag"] == "input"
+    if tokens[1]["tag"] != "(":
+        raise Exception(f"Expected '(': {tokens[1]}")
+    if tokens[2]["tag"] != ")":
+        raise Exception(f"Expected ')': {tokens[2]}")
+    return {
+        "tag": "input",
+        "position": tokens[0]["position"],
+        "end": tokens[2]["end"],
+    }, tokens[3:]
+
+
+def test_parse_input_expression():
+    """
+    input_expression = "input" "(" ")";
+    """
+    ast = parse_input_expression(t("input ( )"))[0]
+    assert ast == {"tag": "input", "position": 0, "end": 9}
+    for code in ["input", "input(1)"]:
+        try:
+            parse_input_expression(t(code))
+            assert False, f"Expected an error parsing {code}"
+        except Exception as e:
+            assert str(e).startswith("Expected")
+
+
 def parse_expression(tokens):
     """
     expression = logical_expression;
     """
     return parse_logical_expression(tokens)
 
+
 def test_parse_expression():
     """
     expression = logical_expression;
@@ -468,13 +749,23 @@ def parse_identifier_list(tokens):
     first_node = None
     if tokens[0]["tag"] != ")":
         assert tokens[0]["tag"] == "<identifier>"
-        node = {"tag": "<identifier>", "value": tokens[0]["value"]}
+        node = {
+            "tag": "<identifier>",
+            "value": tokens[0]["value"],
+            "position": tokens[0]["position"],
+            "end": tokens[0]["end"],
+        }
         tokens = tokens[1:]
         first_node = node
         while tokens[0]["tag"] == ",":
             tokens = tokens[1:]
             assert tokens[0]["tag"] == "<identifier>"
-            node["next"] = {"tag": "<identifier>", "value": tokens[0]["value"]}
+            node["next"] = {
+                "tag": "<identifier>",
+                "value": tokens[0]["value"],
+                "position": tokens[0]["position"],
+                "end": tokens[0]["end"],
+            }
             tokens = tokens[1:]
             node = node["next"]
     assert tokens[0]["tag"] == ")"
@@ -491,10 +782,10 @@ def test_parse_identifier_list():
     assert ast == None
     tokens = tokenize("(x)")
     ast, tokens = parse_identifier_list(tokens)
-    assert ast == {"tag": "<identifier>", "value": "x"}
+    assert remove_positions(ast) == {"tag": "<identifier>", "value": "x"}
     tokens = tokenize("(x,y,z)")
     ast, tokens = parse_identifier_list(tokens)
-    assert ast == {
+    assert remove_positions(ast) == {
         "tag": "<identifier>",
         "value": "x",
         "next": {
@@ -533,10 +824,10 @@ def test_parse_expression_list():
     assert ast == None
     tokens = tokenize("(1)")
     ast, tokens = parse_expression_list(tokens)
-    assert ast == {"tag": "<number>", "value": 1}
+    assert remove_positions(ast) == {"tag": "<number>", "value": 1}
     tokens = tokenize("(1,2,3)")
     ast, tokens = parse_expression_list(tokens)
-    assert ast == {
+    assert remove_positions(ast) == {
         "tag": "<number>",
         "value": 1,
         "next": {
@@ -547,25 +838,146 @@ def test_parse_expression_list():
     }
 
 
+def parse_array_literal(tokens):
+    """
+    array_literal = "[" [ expression { "," expression } ] "]";
+    """
+    assert tokens[0]["tag"] == "["
+    position = tokens[0]["position"]
+    tokens = tokens[1:]
+    first_node = None
+    if tokens[0]["tag"] != "]":
+        node, tokens = parse_expression(tokens)
+        first_node = node
+        while tokens[0]["tag"] == ",":
+            tokens = tokens[1:]
+            node["next"], tokens = parse_expression(tokens)
+            node = node["next"]
+    if tokens[0]["tag"] != "]":
+        raise Exception(f"Expected ']': {tokens[0]}")
+    return {
+        "tag": "<array>",
+        "elements": first_node,
+        "position": position,
+        "end": tokens[0]["end"],
+    }, tokens[1:]
+
+
+def test_parse_array_literal():
+    """
+    array_literal = "[" [ expression { "," expression } ] "]";
+    """
+    ast = remove_positions(parse_array_literal(t("[]"))[0])
+    assert ast == {"tag": "<array>", "elements": None}
+    ast = remove_positions(parse_array_literal(t("[1,x+2,[3]]"))[0])
+    assert ast == {
+        "tag": "<array>",
+        "elements": {
+            "tag": "<number>",
+            "value": 1,
+            "next": {
+                "tag": "+",
+                "left": {"tag": "<identifier>", "value": "x"},
+                "right": {"tag": "<number>", "value": 2},
+                "next": {
+                    "tag": "<array>",
+                    "elements": {"tag": "<number>", "value": 3},
+                },
+            },
+        },
+    }
+
+
+def parse_object_literal(tokens):
+    """
+    object_literal = "{" [ property ":" expression { "," property ":" expression } ] "}";
+    """
+    assert tokens[0]["tag"] == "{"
+    position = tokens[0]["position"]
+    tokens = tokens[1:]
+    names = []
+    first_node = None
+    while tokens[0]["tag"] != "}":
+        if names:
+            if tokens[0]["tag"] != ",":
+                raise Exception(f"Expected ',' or '}}': {tokens[0]}")
+            tokens = tokens[1:]
+        if tokens[0]["tag"] not in ["<identifier>", "<string>"]:
+            raise Exception(f"Expected property name: {tokens[0]}")
+        names.append(tokens[0]["value"])
+        if tokens[1]["tag"] != ":":
+            raise Exception(f"Expected ':': {tokens[1]}")
+        value, tokens = parse_expression(tokens[2:])
+        if first_node == None:
+            first_node = value
+        else:
+            node["next"] = value
+        node = value
+    return {
+        "tag": "<object>",
+        "names": names,
+        "values": first_node,
+        "position": position,
+        "end": tokens[0]["end"],
+    }, tokens[1:]
+
+
+def test_parse_object_literal():
+    """
+    object_literal = "{" [ property ":" expression { "," property ":" expression } ] "}";
+    """
+    ast = remove_positions(parse_object_literal(t("{}"))[0])
+    assert ast == {"tag": "<object>", "names": [], "values": None}
+    ast = remove_positions(parse_object_literal(t('{x:1, "a b":y+2}'))[0])
+    assert ast == {
+        "tag": "<object>",
+        "names": ["x", "a b"],
+        "values": {
+            "tag": "<number>",
+            "value": 1,
+            "next": {
+                "tag": "+",
+                "left": {"tag": "<identifier>", "value": "y"},
+                "right": {"tag": "<number>", "value": 2},
+            },
+        },
+    }
+    for code in ["{x 1}", "{x:1 y:2}", "{1:2}"]:
+        try:
+            parse_object_literal(t(code))
+            assert False, f"Expected an error parsing {code}"
+        except Exception as e:
+            assert str(e).startswith("Expected")
+
+
 def parse_assignment(tokens):
     """
-    assignment = <identifier> "=" expression;
+    assignment = callable_expression "=" expression;
     """
     if tokens[0]["tag"] != "<identifier>":
         raise Exception(f"Expected identifier: {tokens[0]}")
-    identifier = {"tag": "<identifier>", "value": tokens[0]["value"]}
-    tokens = tokens[1:]
+    target, tokens = parse_callable_expression(tokens)
+    if target["tag"] not in ["<identifier>", "<index>", "<property>"]:
+        raise Exception(
+            f"Expected identifier, index or property as assignment target: {target}"
+        )
     if tokens[0]["tag"] != "=":
         raise Exception(f"Expected '=': {tokens[0]}")
     expression, tokens = parse_expression(tokens[1:])
-    return {"tag": "=", "target": identifier, "value": expression}, tokens
+    return {
+        "tag": "=",
+        "target": target,
+        "value": expression,
+        "position": target["position"],
+        "end": expression["end"],
+    }, tokens
 
 
 def test_parse_assignment():
     """
-    assignment = <identifier> "=" expression;
+    assignment = callable_expression "=" expression;
     """
-    ast = parse_assignment(t("x=5+3"))[0]
+    ast = remove_positions(parse_assignment(t("x=5+3"))[0])
     assert ast == {
         "tag": "=",
         "target": {"tag": "<identifier>", "value": "x"},
@@ -575,6 +987,25 @@ def test_parse_assignment():
             "right": {"tag": "<number>", "value": 3},
         },
     }
+    ast = remove_positions(parse_assignment(t("x[i][0]=1"))[0])
+    assert ast == {
+        "tag": "=",
+        "target": {
+            "tag": "<index>",
+            "expression": {
+                "tag": "<index>",
+                "expression": {"tag": "<identifier>", "value": "x"},
+                "index": {"tag": "<identifier>", "value": "i"},
+            },
+            "index": {"tag": "<number>", "value": 0},
+        },
+        "value": {"tag": "<number>", "value": 1},
+    }
+    try:
+        parse_assignment(t("f(x)=1"))
+        assert False, "Expected an assignment target error"
+    except Exception as e:
+        assert str(e).startswith("Expected identifier, index or property")
 
 
 def parse_block_statement(tokens):
@@ -582,9 +1013,9 @@ def parse_block_statement(tokens):
     block_statement = "{" {";"} [ statement { ";" {";"} statement } {";"} ] "}";
     """
     assert tokens[0]["tag"] == "{"
-    tokens = tokens[1:]
-    node = {"tag": "block"}
+    node = {"tag": "block", "position": tokens[0]["position"]}
     first_node = node
+    tokens = tokens[1:]
     while tokens[0]["tag"] == ";":
         tokens = tokens[1:]
     if tokens[0]["tag"] != "}":
@@ -595,10 +1026,16 @@ def parse_block_statement(tokens):
                 tokens = tokens[1:]
             if tokens[0]["tag"] != "}":
                 statement, tokens = parse_statement(tokens)
-                node["next"] = {"tag": "block", "statement": statement}
+                node["next"] = {
+                    "tag": "block",
+                    "statement": statement,
+                    "position": statement["position"],
+                    "end": statement["end"],
+                }
                 node = node["next"]
             assert tokens[0]["tag"] in [";", "}"]
     assert tokens[0]["tag"] == "}"
+    first_node["end"] = tokens[0]["end"]
     tokens = tokens[1:]
     return first_node, tokens
 
@@ -608,7 +1045,7 @@ def test_parse_block_statement():
     block_statement = "{" {";"} [ statement { ";" {";"} statement } {";"} ] "}";
     """
     for code in ["{x=1}", "{x=1;}", "{x=1;;}", "{;;x=1;;}"]:
-        ast = parse_block_statement(t(code))[0]
+        ast = remove_positions(parse_block_statement(t(code))[0])
         assert ast == {
             "tag": "block",
             "statement": {
@@ -618,7 +1055,7 @@ def test_parse_block_statement():
             },
         }
     for code in ["{x=1;y=2}", "{x=1;y=2;}", "{x=1;;y=2;}", "{;x=1;;y=2;}"]:
-        ast = parse_block_statement(t(code))[0]
+        ast = remove_positions(parse_block_statement(t(code))[0])
         assert ast == {
             "tag": "block",
             "statement": {
@@ -635,7 +1072,7 @@ def test_parse_block_statement():
                 },
             },
         }
-    ast = parse_block_statement(t("{x=1;y=2;z=3}"))[0]
+    ast = remove_positions(parse_block_statement(t("{x=1;y=2;z=3}"))[0])
     assert ast == {
         "tag": "block",
         "statement": {
@@ -660,15 +1097,14 @@ def test_parse_block_statement():
             },
         },
     }
-    ast = parse_block_statement(t("{return 1}"))[0]
+    ast = remove_positions(parse_block_statement(t("{return 1}"))[0])
     assert ast == {
         "tag": "block",
         "statement": {"tag": "return", "value": {"tag": "<number>", "value": 1}},
     }
-    assert (
+    assert remove_positions(
         parse_block_statement(t("{x=1;y=2}"))[0]
-        == parse_block_statement(t("{x=1;y=2;}"))[0]
-    )
+    ) == remove_positions(parse_block_statement(t("{x=1;y=2;}"))[0])
 
 
 def parse_if_statement(tokens):
@@ -676,6 +1112,7 @@ def parse_if_statement(tokens):
     if_statement = "if" "(" expression ")" statement "else" statement;
     """
     assert tokens[0]["tag"] == "if"
+    position = tokens[0]["position"]
     tokens = tokens[1:]
     if tokens[0]["tag"] != "(":
         raise Exception(f"Expected '(': {tokens[0]}")
@@ -687,9 +1124,12 @@ def parse_if_statement(tokens):
         "tag": "if",
         "condition": condition,
         "then": then_statement,
+        "position": position,
+        "end": then_statement["end"],
     }
     if tokens[0]["tag"] == "else":
         node["else"], tokens = parse_statement(tokens[1:])
+        node["end"] = node["else"]["end"]
     return node, tokens
 
 
@@ -697,7 +1137,7 @@ def test_parse_if_statement():
     """
     if_statement = "if" "(" expression ")" statement "else" statement;
     """
-    ast = parse_if_statement(t("if(1)x=1"))[0]
+    ast = remove_positions(parse_if_statement(t("if(1)x=1"))[0])
     assert ast == {
         "tag": "if",
         "condition": {"tag": "<number>", "value": 1},
@@ -707,7 +1147,7 @@ def test_parse_if_statement():
             "value": {"tag": "<number>", "value": 1},
         },
     }
-    ast = parse_if_statement(t("if(1){x=1}"))[0]
+    ast = remove_positions(parse_if_statement(t("if(1){x=1}"))[0])
     assert ast == {
         "tag": "if",
         "condition": {"tag": "<number>", "value": 1},
@@ -720,7 +1160,7 @@ def test_parse_if_statement():
             },
         },
     }
-    ast = parse_if_statement(t("if(1){x=1}else{x=3}"))[0]
+    ast = remove_positions(parse_if_statement(t("if(1){x=1}else{x=3}"))[0])
     assert ast == {
         "tag": "if",
         "condition": {"tag": "<number>", "value": 1},
@@ -748,6 +1188,7 @@ def parse_while_statement(tokens):
     while_statement = "while" "(" expression ")" statement;
     """
     assert tokens[0]["tag"] == "while"
+    position = tokens[0]["position"]
     tokens = tokens[1:]
     if tokens[0]["tag"] != "(":
         raise Exception(f"Expected '(': {tokens[0]}")
@@ -755,14 +1196,20 @@ def parse_while_statement(tokens):
     if tokens[0]["tag"] != ")":
         raise Exception(f"Expected '(': {tokens[0]}")
     statement, tokens = parse_statement(tokens[1:])
-    return {"tag": "while", "condition": condition, "do": statement}, tokens
+    return {
+        "tag": "while",
+        "condition": condition,
+        "do": statement,
+        "position": position,
+        "end": statement["end"],
+    }, tokens
 
 
 def test_parse_while_statement():
     """
     while_statement = "while" "(" expression ")" statement;
     """
-    ast = parse_while_statement(t("while(1)x=1"))[0]
+    ast = remove_positions(parse_while_statement(t("while(1)x=1"))[0])
     assert ast == {
         "tag": "while",
         "condition": {"tag": "<number>", "value": 1},
@@ -774,55 +1221,225 @@ def test_parse_while_statement():
     }
 
 
+def parse_for_statement(tokens):
+    """
+    for_statement = "for" "(" [ assignment ] ";" [ expression ] ";" [ assignment ] ")" statement;
+    """
+    assert tokens[0]["tag"] == "for"
+    ast = {"tag": "for", "position": tokens[0]["position"]}
+    tokens = tokens[1:]
+    if tokens[0]["tag"] != "(":
+        raise Exception(f"Expected '(': {tokens[0]}")
+    tokens = tokens[1:]
+    if tokens[0]["tag"] != ";":
+        ast["init"], tokens = parse_assignment(tokens)
+    if tokens[0]["tag"] != ";":
+        raise Exception(f"Expected ';': {tokens[0]}")
+    tokens = tokens[1:]
+    if tokens[0]["tag"] != ";":
+        ast["condition"], tokens = parse_expression(tokens)
+    if tokens[0]["tag"] != ";":
+        raise Exception(f"Expected ';': {tokens[0]}")
+    tokens = tokens[1:]
+    if tokens[0]["tag"] != ")":
+        ast["step"], tokens = parse_assignment(tokens)
+    if tokens[0]["tag"] != ")":
+        raise Exception(f"Expected ')': {tokens[0]}")
+    ast["do"], tokens = parse_statement(tokens[1:])
+    ast["end"] = ast["do"]["end"]
+    return ast, tokens
+
+
+def test_parse_for_statement():
+    """
+    for_statement = "for" "(" [ assignment ] ";" [ expression ] ";" [ assignment ] ")" statement;
+    """
+    ast = remove_positions(parse_for_statement(t("for(i=0;i<3;i=i+1)x=i"))[0])
+    assert ast == {
+        "tag": "for",
+        "init": {
+            "tag": "=",
+            "target": {"tag": "<identifier>", "value": "i"},
+            "value": {"tag": "<number>", "value": 0},
+        },
+        "condition": {
+            "tag": "<",
+            "left": {"tag": "<identifier>", "value": "i"},
+            "right": {"tag": "<number>", "value": 3},
+        },
+        "step": {
+            "tag": "=",
+            "target": {"tag": "<identifier>", "value": "i"},
+            "value": {
+                "tag": "+",
+                "left": {"tag": "<identifier>", "value": "i"},
+                "right": {"tag": "<number>", "value": 1},
+            },
+        },
+        "do": {
+            "tag": "=",
+            "target": {"tag": "<identifier>", "value": "x"},
+            "value": {"tag": "<identifier>", "value": "i"},
+        },
+    }
+    ast = remove_positions(parse_for_statement(t("for(;;){break}"))[0])
+    assert ast == {
+        "tag": "for",
+        "do": {"tag": "block", "statement": {"tag": "break"}},
+    }
+    ast = parse_for_statement(t("for (;;) x=1"))[0]
+    assert (ast["position"], ast["end"]) == (0, 12)
+    for code in ["for i=0;i<3;i=i+1) x", "for(i=0,i<3;i=i+1) x", "for(;;i=i+1 x"]:
+        try:
+            parse_for_statement(t(code))
+            assert False, f"Expected an error parsing {code}"
+        except Exception as e:
+            assert str(e).startswith("Expected")
+
+
+def parse_break_statement(tokens):
+    """
+    break_statement = "break";
+    """
+    assert tokens[0]["tag"] == "break"
+    return {
+        "tag": "break",
+        "position": tokens[0]["position"],
+        "end": tokens[0]["end"],
+    }, tokens[1:]
+
+
+def test_parse_break_statement():
+    """
+    break_statement = "break";
+    """
+    ast = parse_break_statement(t("break;x"))[0]
+    assert ast == {"tag": "break", "position": 0, "end": 5}
+
+
+def parse_continue_statement(tokens):
+    """
+    continue_statement = "continue";
+    """
+    assert tokens[0]["tag"] == "continue"
+    return {
+        "tag": "continue",
+        "position": tokens[0]["position"],
+        "end": tokens[0]["end"],
+    }, tokens[1:]
+
+
+def test_parse_continue_statement():
+    """
+    continue_statement = "continue";
+    """
+    ast = parse_continue_statement(t("continue;x"))[0]
+    assert ast == {"tag": "continue", "position": 0, "end": 8}
+
+
 def parse_return_statement(tokens):
     """
     return_statement = "return" [ expression ];
     """
     assert tokens[0]["tag"] == "return"
+    token = tokens[0]
     tokens = tokens[1:]
     if tokens[0]["tag"] in ["}", ";", None]:
         value = None
-        return {"tag": "return"}, tokens
+        return {
+            "tag": "return",
+            "position": token["position"],
+            "end": token["end"],
+        }, tokens
     else:
         value, tokens = parse_expression(tokens)
-        return {"tag": "return", "value": value}, tokens
+        return {
+            "tag": "return",
+            "value": value,
+            "position": token["position"],
+            "end": value["end"],
+        }, tokens
 
 
 def test_parse_return_statement():
     """
     return_statement = "return" [ expression ];
     """
-    ast = parse_return_statement(t("return"))[0]
+    ast = remove_positions(parse_return_statement(t("return"))[0])
     assert ast == {"tag": "return"}
-    ast = parse_return_statement(t("return}12"))[0]
+    ast = remove_positions(parse_return_statement(t("return}12"))[0])
     assert ast == {"tag": "return"}
-    ast = parse_return_statement(t("return;34"))[0]
+    ast = remove_positions(parse_return_statement(t("return;34"))[0])
     assert ast == {"tag": "return"}
-    ast = parse_return_statement(t("return 5"))[0]
+    ast = remove_positions(parse_return_statement(t("return 5"))[0])
     assert ast == {"tag": "return", "value": {"tag": "<number>", "value": 5}}
-    ast = parse_return_statement(t("return (5)"))[0]
+    ast = remove_positions(parse_return_statement(t("return (5)"))[0])
     assert ast == {"tag": "return", "value": {"tag": "<number>", "value": 5}}
 
 
+def parse_exit_statement(tokens):
+    """
+    exit_statement = "exit" "(" [ expression ] ")";
+    """
+    assert tokens[0]["tag"] == "exit"
+    ast = {"tag": "exit", "position": tokens[0]["position"]}
+    if tokens[1]["tag"] != "(":
+        raise Exception(f"Expected '(': {tokens[1]}")
+    tokens = tokens[2:]
+    if tokens[0]["tag"] != ")":
+        ast["value"], tokens = parse_expression(tokens)
+    if tokens[0]["tag"] != ")":
+        raise Exception(f"Expected ')': {tokens[0]}")
+    ast["end"] = tokens[0]["end"]
+    return ast, tokens[1:]
+
+
+def test_parse_exit_statement():
+    """
+    exit_statement = "exit" "(" [ expression ] ")";
+    """
+    ast = parse_exit_statement(t("exit()"))[0]
+    assert ast == {"tag": "exit", "position": 0, "end": 6}
+    ast = remove_positions(parse_exit_statement(t("exit(x+1)"))[0])
+    assert ast == {
+        "tag": "exit",
+        "value": {
+            "tag": "+",
+            "left": {"tag": "<identifier>", "value": "x"},
+            "right": {"tag": "<number>", "value": 1},
+        },
+    }
+    for code in ["exit", "exit(1", "exit 1"]:
+        try:
+            parse_exit_statement(t(code))
+            assert False, f"Expected an error parsing {code}"
+        except Exception as e:
+            assert str(e).startswith("Expected")
+
+
 def parse_print_statement(tokens):
     """
     print_statement = "print" expression_list;
     """
     assert tokens[0]["tag"] == "print"
-    tokens = tokens[1:]
-    arguments, tokens = parse_expression_list(tokens)
-    return {"tag": "print", "arguments": arguments}, tokens
+    arguments, remaining = parse_expression_list(tokens[1:])
+    return {
+        "tag": "print",
+        "arguments": arguments,
+        "position": tokens[0]["position"],
+        "end": end_of(tokens, remaining),
+    }, remaining
 
 
 def test_parse_print_statement():
     """
     print_statement = "print" expression_list;
     """
-    ast = parse_print_statement(t("print()"))[0]
+    ast = remove_positions(parse_print_statement(t("print()"))[0])
     assert ast == {"tag": "print", "arguments": None}
-    ast = parse_print_statement(t("print(1)"))[0]
+    ast = remove_positions(parse_print_statement(t("print(1)"))[0])
     assert ast == {"tag": "print", "arguments": {"tag": "<number>", "value": 1}}
-    ast = parse_print_statement(t("print(1,2+3)"))[0]
+    ast = remove_positions(parse_print_statement(t("print(1,2+3)"))[0])
     assert ast == {
         "tag": "print",
         "arguments": {
@@ -846,14 +1463,20 @@ def parse_function_statement(tokens):
     function_token = tokens[0]
     assert tokens[1]["tag"] == "<identifier>"
     identifier_token = tokens[1]
-    assignment_token = {"tag": "=", "position": function_token["position"]}
+    assignment_token = {
+        "tag": "=",
+        "position": function_token["position"],
+        "end": function_token["end"],
+    }
     tokens = [
         identifier_token,
         assignment_token,
         function_token,
     ] + tokens[2:]
     # parse the rewritten token stream as an assignment
-    return parse_assignment(tokens)
+    node, tokens = parse_assignment(tokens)
+    node["position"] = function_token["position"]
+    return node, tokens
 
 
 def test_parse_function_statement():
@@ -867,9 +1490,77 @@ def test_parse_function_statement():
     # assert parse_function_statement(statement)[0] == parse_assignment(assignment)[0]
 
 
+def parse_import_statement(tokens):
+    """
+    import_statement = "import" <string>;
+    """
+    assert tokens[0]["tag"] == "import"
+    if tokens[1]["tag"] != "<string>":
+        raise Exception(f"Expected module path string: {tokens[1]}")
+    return {
+        "tag": "import",
+        "path": tokens[1]["value"],
+        "position": tokens[0]["position"],
+        "end": tokens[1]["end"],
+    }, tokens[2:]
+
+
+def test_parse_import_statement():
+    """
+    import_statement = "import" <string>;
+    """
+    ast = parse_import_statement(t('import "lib/math.t"'))[0]
+    assert ast == {"tag": "import", "path": "lib/math.t", "position": 0, "end": 19}
+    try:
+        parse_import_statement(t("import math"))
+        assert False, "Expected a module path error"
+    except Exception as e:
+        assert str(e).startswith("Expected module path string")
+
+
+def parse_extern_statement(tokens):
+    """
+    extern_statement = "extern" <identifier> "=" <string>;
+    """
+    assert tokens[0]["tag"] == "extern"
+    if tokens[1]["tag"] != "<identifier>":
+        raise Exception(f"Expected identifier: {tokens[1]}")
+    if tokens[2]["tag"] != "=":
+        raise Exception(f"Expected '=': {tokens[2]}")
+    if tokens[3]["tag"] != "<string>":
+        raise Exception(f"Expected extern target string: {tokens[3]}")
+    return {
+        "tag": "extern",
+        "name": tokens[1]["value"],
+        "target": tokens[3]["value"],
+        "position": tokens[0]["position"],
+        "end": tokens[3]["end"],
+    }, tokens[4:]
+
+
+def test_parse_extern_statement():
+    """
+    extern_statement = "extern" <identifier> "=" <string>;
+    """
+    ast = parse_extern_statement(t('extern sqrt = "math.sqrt"'))[0]
+    assert ast == {
+        "tag": "extern",
+        "name": "sqrt",
+        "target": "math.sqrt",
+        "position": 0,
+        "end": 25,
+    }
+    for code in ['extern "math.sqrt"', "extern sqrt = math", 'extern sqrt "math"']:
+        try:
+            parse_extern_statement(t(code))
+            assert False, f"Expected an error parsing {code}"
+        except Exception as e:
+            assert str(e).startswith("Expected")
+
+
 def parse_statement(tokens):
     """
-    statement = block_statement | if_statement | while_statement |  function_statement | return_statement |  assignment | expression;
+    statement = block_statement | if_statement | while_statement | for_statement | break_statement | continue_statement | function_statement | return_statement | exit_statement | print_statement | import_statement | extern_statement | assignment | expression;
     """
     tag = tokens[0]["tag"]
     # note: none of these consumes a token
@@ -877,25 +1568,42 @@ def parse_statement(tokens):
         return parse_if_statement(tokens)
     if tag == "while":
         return parse_while_statement(tokens)
+    if tag == "for":
+        return parse_for_statement(tokens)
+    if tag == "break":
+        return parse_break_statement(tokens)
+    if tag == "continue":
+        return parse_continue_statement(tokens)
     if tag == "function":
         if tokens[1]["tag"] == "<identifier>":
             return parse_function_statement(tokens)
     if tag == "return":
         return parse_return_statement(tokens)
+    if tag == "exit":
+        return parse_exit_statement(tokens)
     if tag == "print":
         return parse_print_statement(tokens)
+    if tag == "import":
+        return parse_import_statement(tokens)
+    if tag == "extern":
+        return parse_extern_statement(tokens)
     if tag == "{":
         return parse_block_statement(tokens)
     if tag == "<identifier>":
         # lookahead to next tag to check for assignment
         if tokens[1]["tag"] == "=":
             return parse_assignment(tokens)
+        # lookahead past indexes and properties to check for assignment
+        if tokens[1]["tag"] in ["[", "."]:
+            _, remaining = parse_callable_expression(tokens)
+            if remaining[0]["tag"] == "=":
+                return parse_assignment(tokens)
     return parse_expression(tokens)
 
 
 def test_parse_statement():
     """
-    statement = block_statement | if_statement | while_statement |  function_statement | return_statement | print_statement | assignment | expression;
+    statement = block_statement | if_statement | while_statement | for_statement | break_statement | continue_statement | function_statement | return_statement | exit_statement | print_statement | import_statement | extern_statement | assignment | expression;
     """
     # block statement
     assert (
@@ -908,6 +1616,16 @@ def test_parse_statement():
         parse_statement(t("while(1){x=3}"))[0]
         == parse_while_statement(t("while(1){x=3}"))[0]
     )
+    # for statement
+    assert (
+        parse_statement(t("for(;x;){x=3}"))[0]
+        == parse_for_statement(t("for(;x;){x=3}"))[0]
+    )
+    # break and continue statements
+    assert parse_statement(t("break"))[0] == parse_break_statement(t("break"))[0]
+    assert (
+        parse_statement(t("continue"))[0] == parse_continue_statement(t("continue"))[0]
+    )
     # function_statement (syntactic sugar)
     assert (
         parse_statement(t("function sq(x) {return x}"))[0]
@@ -923,15 +1641,30 @@ def test_parse_statement():
         parse_statement(t("return 22;"))[0]
         == parse_return_statement(t("return 22;"))[0]
     )
+    # exit statement
+    assert parse_statement(t("exit(2)"))[0] == parse_exit_statement(t("exit(2)"))[0]
     # print statement
     assert (
         parse_statement(t("print(1,2,3);"))[0]
         == parse_print_statement(t("print(1,2,3)"))[0]
     )
+    # import statement
+    assert (
+        parse_statement(t('import "x.t";'))[0]
+        == parse_import_statement(t('import "x.t"'))[0]
+    )
+    # extern statement
+    assert (
+        parse_statement(t('extern f = "m.f";'))[0]
+        == parse_extern_statement(t('extern f = "m.f"'))[0]
+    )
     # assignment statements
     assert parse_statement(t("x=5+3"))[0] == parse_assignment(t("x=5+3"))[0]
+    assert parse_statement(t("x[1]=5"))[0] == parse_assignment(t("x[1]=5"))[0]
+    assert parse_statement(t("x.y=5"))[0] == parse_assignment(t("x.y=5"))[0]
     # expression statements
     assert parse_statement(t("5+3"))[0] == parse_expression(t("5+3"))[0]
+    assert parse_statement(t("x[1]+3"))[0] == parse_expression(t("x[1]+3"))[0]
 
 
 def parse(tokens):
@@ -952,7 +1685,7 @@ def test_parse():
 
 def format(ast, indent=0):
     indentation = " " * indent
-    if ast["tag"] in ["<number>", "<boolean>", "<identifier>"]:
+    if ast["tag"] in ["<number>", "<boolean>", "<string>", "<identifier>"]:
         return indentation + str(ast["value"])
     result = indentation + ast["tag"]
     for attribute in [
@@ -988,6 +1721,50 @@ def test_format():
     )
 
 
+def test_positions():
+    code = "{x = 1;\nwhile (x < 10) {\n    x = f(x) * 2\n}}"
+    ast = parse(tokenize(code))
+    assert (ast["position"], ast["end"]) == (0, len(code))
+    loop = ast["next"]["statement"]
+    assert code[loop["position"] : loop["end"]] == code[8:-1]
+    assignment = loop["do"]["statement"]
+    assert code[assignment["position"] : assignment["end"]] == "x = f(x) * 2"
+    call = assignment["value"]["left"]
+    assert code[call["position"] : call["end"]] == "f(x)"
+    assert line_column(line_index(code), assignment["position"]) == (3, 5)
+    # every node carries a span
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        assert node["position"] <= node["end"], f"bad span in {node}"
+        for value in node.values():
+            if type(value) is dict:
+                nodes.append(value)
+    ast = parse(tokenize("function sq(x) {return x*x}"))
+    assert (ast["position"], ast["end"]) == (0, 27)
+    ast = parse(tokenize("print(1, 2)"))
+    assert (ast["position"], ast["end"]) == (0, 11)
+
+
+def test_children():
+    ast = parse(tokenize("x = [1, 2]"))
+    target, array = children(ast)
+    assert target["value"] == "x" and array["tag"] == "<array>"
+    [first] = children(array)
+    assert [node["value"] for node in children(first)] == [2]
+    # caches on nodes are not part of the tree
+    array["$shape"] = {"x": 0}
+    assert list(children(array)) == [first]
+    # evaluating a node evaluates all of its lists, but not what follows it
+    ast = parse(tokenize("f(1, 2)"))
+    arguments = [node["value"] for node in children(ast, evaluated=True)][1:]
+    assert arguments == [1, 2]
+    assert list(children(ast["arguments"], evaluated=True)) == []
+    # a block's next statement is part of it
+    ast = parse(tokenize("{x = 1; y = 2}"))
+    assert [node["tag"] for node in children(ast, evaluated=True)] == ["=", "block"]
+
+
 if __name__ == "__main__":
     for f in [
         test_parse_simple_expression,
@@ -1000,16 +1777,25 @@ if __name__ == "__main__":
         test_parse_logical_term,
         test_parse_logical_expression,
         test_parse_function_expression,
+        test_parse_input_expression,
         test_parse_expression,
         test_parse_identifier_list,
         test_parse_expression_list,
+        test_parse_array_literal,
+        test_parse_object_literal,
         test_parse_assignment,
         test_parse_block_statement,
         test_parse_if_statement,
         test_parse_while_statement,
+        test_parse_for_statement,
+        test_parse_break_statement,
+        test_parse_continue_statement,
         test_parse_return_statement,
+        test_parse_exit_statement,
         test_parse_print_statement,
         test_parse_function_statement,
+        test_parse_import_statement,
+        test_parse_extern_statement,
         test_parse_statement,
         test_parse,
     ]:
@@ -1022,4 +1808,8 @@ if __name__ == "__main__":
         print(f"Untested grammar = [[[ {grammar} ]]]")
     print("testing format(ast)...")
     test_format()
+    print("testing positions...")
+    test_positions()
+    print("testing children...")
+    test_children()
     print("done.")
@@ -0,0 +1,198 @@
+import codecs
+import io
+import os
+import sys
+import threading
+
+import output
+
+# Program input is read from stdin in large blocks and split into lines
+# here, rather than making a read from stdin for every line.
+
+# bytes read from the stream at a time
+block_size = 1024 * 1024
+
+
+class Input:
+    __slots__ = ["stream", "decoder", "lines", "index", "partial", "done"]
+
+    def __init__(self, stream=None):
+        # None means whatever sys.stdin is when a line is read
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.lines = []
+        self.index = 0
+        # the unfinished last line of the blocks read so far
+        self.partial = ""
+        self.done = False
+
+    def read_line(self):
+        """
+        Returns the next line without its newline, or None at the end of input.
+        """
+        while self.index == len(self.lines):
+            if self.done:
+                return None
+            self.fill()
+        line = self.lines[self.index]
+        self.index += 1
+        return line
+
+    def fill(self):
+        # show any prompt the program printed before waiting for the answer
+        output.flush()
+        stream = self.stream or sys.stdin.buffer
+        # read1() returns what is available, rather than waiting for a whole
+        # block, so a line typed or piped in is read as soon as it arrives
+        if hasattr(stream, "read1"):
+            block = stream.read1(block_size)
+        else:
+            block = stream.read(block_size)
+        if not block:
+            self.done = True
+            text = self.decoder.decode(b"", final=True)
+            lines = [self.partial + text] if self.partial or text else []
+        else:
+            lines = (self.partial + self.decoder.decode(block)).split("\n")
+            self.partial = lines.pop()
+        self.lines = lines
+        self.index = 0
+
+
+source = Input()
+
+
+def read_line():
+    return source.read_line()
+
+
+def read_number():
+    """
+    Returns the next line as an int or float, or None at the end of input.
+    """
+    line = source.read_line()
+    if line == None:
+        return None
+    try:
+        return int(line)
+    except ValueError:
+        pass
+    try:
+        return float(line)
+    except ValueError:
+        raise Exception(f"Expected a number as input: {line!r}")
+
+
+def redirect(stream):
+    """
+    Reads program input from stream, a binary file or io.BytesIO,
+    returning the old source.
+    """
+    global source
+    old_source = source
+    source = Input(stream)
+    return old_source
+
+
+def restore(old_source):
+    global source
+    source = old_source
+
+
+def test_read_line():
+    print("test read line")
+    global block_size
+    old_block_size = block_size
+    # small blocks split lines, and characters, across reads
+    block_size = 3
+    try:
+        for data, lines in [
+            (b"", []),
+            (b"\n", [""]),
+            (b"one\ntwo\n", ["one", "two"]),
+            (b"one\n\nthree", ["one", "", "three"]),
+            ("café\nüber\n".encode(), ["café", "über"]),
+        ]:
+            old_source = redirect(io.BytesIO(data))
+            try:
+                result = []
+                line = read_line()
+                while line != None:
+                    result.append(line)
+                    line = read_line()
+                assert result == lines, f"got {result} from {data}"
+                assert read_line() == None
+            finally:
+                restore(old_source)
+    finally:
+        block_size = old_block_size
+
+
+def test_read_number():
+    print("test read number")
+    old_source = redirect(io.BytesIO(b"12\n-3.5\n1e3\nx\n"))
+    try:
+        assert read_number() == 12
+        assert read_number() == -3.5
+        assert read_number() == 1000.0
+        try:
+            read_number()
+            assert False, "Expected a number error"
+        except Exception as e:
+            assert str(e) == "Expected a number as input: 'x'"
+        assert read_number() == None
+    finally:
+        restore(old_source)
+
+
+def test_partial_input():
+    print("test partial input")
+    read_end, write_end = os.pipe()
+    old_source = redirect(os.fdopen(read_end, "rb"))
+    try:
+        os.write(write_end, b"hello\n")
+        # the line is read while the pipe is still open, and the block unfilled
+        lines = []
+        thread = threading.Thread(target=lambda: lines.append(read_line()), daemon=True)
+        thread.start()
+        thread.join(5)
+        assert lines == ["hello"], "read_line() waited for a whole block"
+        os.write(write_end, b"wor")
+        os.write(write_end, b"ld\n")
+        os.close(write_end)
+        assert read_line() == "world"
+        assert read_line() == None
+    finally:
+        source.stream.close()
+        restore(old_source)
+
+
+def test_prompt():
+    print("test prompt")
+    shown = []
+
+    class Answer(io.BytesIO):
+        def read1(self, size):
+            # what the program had printed when it started waiting for input
+            shown.append(prompt.getvalue())
+            return super().read1(size)
+
+    prompt = io.StringIO()
+    old_sink = output.redirect(prompt)
+    old_source = redirect(Answer(b"bob\n"))
+    try:
+        output.print_values(["Name?"])
+        assert read_line() == "bob"
+    finally:
+        restore(old_source)
+        output.restore(old_sink)
+    assert shown[0] == "Name? \n"
+
+
+if __name__ == "__main__":
+    print("test reader...")
+    test_read_line()
+    test_read_number()
+    test_partial_input()
+    test_prompt()
+    print("done.")
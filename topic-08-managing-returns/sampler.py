@@ -0,0 +1,322 @@
+import os
+import signal
+import sys
+import threading
+import time
+
+import evaluator
+from tokenizer import line_index, line_column
+
+# The sampler interrupts the program every so often and walks the Python
+# stack, where each evaluate() frame holds the AST node it is evaluating.
+# Nothing is added to evaluation itself, so the cost is per sample only.
+
+# seconds of CPU time between samples
+interval = 0.005
+
+# the most of the program's time that sampling may take; deep stacks take
+# longer to walk, so they are sampled less often
+budget = 0.03
+
+evaluate_code = evaluator.evaluate.__code__
+load_module_code = evaluator.load_module.__code__
+
+# samples by the source file and position of the innermost node, where the
+# file is None for code that didn't come from a file, and by call stack
+positions = {}
+stacks = {}
+
+state = {"thread": None, "running": False, "handler": None, "interval": interval}
+
+# time spent taking samples
+sampling_seconds = [0.0]
+
+
+def sample(frame):
+    """
+    Records the logical stack of the interpreter running in a Python frame.
+    """
+    position = None
+    # the file position is in: that of the innermost function running, or
+    # of the module being imported, or None for the program itself
+    file = None
+    file_found = False
+    names = []
+    while frame:
+        if frame.f_code is evaluate_code:
+            variables = frame.f_locals
+            ast = variables.get("ast")
+            if type(ast) is dict:
+                if position == None:
+                    position = ast.get("position")
+                if ast["tag"] == "<function_call>":
+                    expression = ast["expression"]
+                    if expression["tag"] == "<identifier>":
+                        names.append(expression["value"])
+                    else:
+                        names.append("<anonymous>")
+                    # the call is running the function's body once it has
+                    # bound the arguments and linked the environments
+                    function = variables.get("function")
+                    if (
+                        not file_found
+                        and "$parent" in variables.get("function_environment", {})
+                        and type(function) is dict
+                    ):
+                        file = function.get("$file")
+                        file_found = True
+        elif frame.f_code is load_module_code and not file_found:
+            file = frame.f_locals.get("filename")
+            file_found = True
+        frame = frame.f_back
+    if position == None:
+        return
+    key = (file, position)
+    positions[key] = positions.get(key, 0) + 1
+    stack = ";".join(["<program>"] + names[::-1])
+    stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def timed_sample(frame):
+    """
+    Takes a sample, returning the interval to wait before the next one.
+    """
+    start = time.perf_counter()
+    sample(frame)
+    elapsed = time.perf_counter() - start
+    sampling_seconds[0] += elapsed
+    return max(interval, elapsed / budget)
+
+
+def signal_handler(signum, frame):
+    next_interval = timed_sample(frame)
+    # only rearm the timer when the spacing changes by a lot
+    if not 0.8 < next_interval / state["interval"] < 1.25:
+        state["interval"] = next_interval
+        signal.setitimer(signal.ITIMER_PROF, next_interval, next_interval)
+
+
+def start():
+    """
+    Starts sampling the main thread, with a CPU timer signal where there is one,
+    and otherwise with a background thread.
+    """
+    if (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    ):
+        state["handler"] = signal.signal(signal.SIGPROF, signal_handler)
+        state["interval"] = interval
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    else:
+        state["running"] = True
+        state["thread"] = threading.Thread(
+            target=sample_thread, args=(threading.main_thread().ident,), daemon=True
+        )
+        state["thread"].start()
+
+
+def sample_thread(thread_id):
+    next_interval = interval
+    while state["running"]:
+        time.sleep(next_interval)
+        frame = sys._current_frames().get(thread_id)
+        if frame:
+            next_interval = timed_sample(frame)
+
+
+def stop():
+    if state["thread"]:
+        state["running"] = False
+        state["thread"].join()
+        state["thread"] = None
+    else:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, state["handler"] or signal.SIG_DFL)
+
+
+def reset():
+    positions.clear()
+    stacks.clear()
+    sampling_seconds[0] = 0.0
+
+
+def line_counts(source, files):
+    """
+    Returns {line: samples} for the samples taken in any of files, whose
+    positions are offsets into source: characters for a str, and bytes for
+    the bytes of a file.
+    """
+    index = line_index(source)
+    counts = {}
+    for (file, position), count in positions.items():
+        if file in files:
+            line, _ = line_column(index, position)
+            counts[line] = counts.get(line, 0) + count
+    return counts
+
+
+def lines(source, filename=None):
+    """
+    Returns (line, samples) pairs for the lines of source, the program read
+    from filename if it was, hottest first.
+    """
+    files = [None, filename and os.path.abspath(filename)]
+    counts = line_counts(source, files)
+    return sorted(counts.items(), key=lambda item: -item[1])
+
+
+def source_line(source, line):
+    text = source.splitlines()
+    if line > len(text):
+        return ""
+    code = text[line - 1]
+    if type(code) is bytes:
+        code = code.decode(errors="replace")
+    return code.strip()
+
+
+def report(source, filename=None, limit=10):
+    """
+    Returns a hot-spot report of the source lines and call stacks sampled most,
+    with the lines of any modules the program imported.
+    """
+    total = sum(positions.values())
+    if total == 0:
+        return "no samples\n"
+    spots = [
+        (count, f"line {line:<5}", source_line(source, line))
+        for line, count in lines(source, filename)
+    ]
+    main_files = [None, filename and os.path.abspath(filename)]
+    for file in set(file for file, _ in positions) - set(main_files):
+        with open(file, "rb") as f:
+            module_source = f.read()
+        for line, count in line_counts(module_source, [file]).items():
+            label = f"{os.path.basename(file)} line {line:<5}"
+            spots.append((count, label, source_line(module_source, line)))
+    spots.sort(key=lambda spot: -spot[0])
+    result = f"{total} samples\n"
+    for count, label, code in spots[:limit]:
+        result += f"{count:8} {count / total:6.1%}  {label} {code}\n"
+    for stack, count in sorted(stacks.items(), key=lambda item: -item[1])[:limit]:
+        result += f"{count:8} {count / total:6.1%}  {stack}\n"
+    return result
+
+
+import tempfile
+
+from tokenizer import tokenize
+from parser import parse
+from loader import parse_file
+
+program = """{
+    function slow(n) {
+        total = 0;
+        for (i = 0; i < n; i = i + 1) {
+            total = total + i * i
+        };
+        return total
+    };
+    function fast(n) {return n};
+    x = 0;
+    for (j = 0; j < 200; j = j + 1) {
+        x = x + slow(300) + fast(j)
+    }
+}"""
+
+
+def test_sample():
+    print("test sample")
+    reset()
+
+    # sample from inside the extern call made by a nested function
+    def capture():
+        sample(sys._getframe())
+        return 0
+
+    environment = {
+        "capture": {"tag": "extern", "target": "capture", "function": capture}
+    }
+    code = "{function g() {return capture()}; function h() {return g()}; y = h()}"
+    evaluator.evaluate(parse(tokenize(code)), environment)
+    assert stacks == {"<program>;h;g;capture": 1}
+    [(file, position)] = positions
+    assert file == None and code[position:].startswith("capture()")
+    reset()
+
+
+def test_sample_files():
+    print("test sample files")
+    reset()
+
+    def capture():
+        sample(sys._getframe())
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        module = os.path.join(directory, "m.t")
+        with open(module, "w") as f:
+            f.write("{\n  function m() {\n    return capture()\n  }\n}")
+        main = os.path.join(directory, "main.t")
+        # multibyte characters make byte offsets larger than character offsets
+        with open(main, "w", encoding="utf-8") as f:
+            f.write('{\n  s = "' + "\u00e9" * 3000 + '";\n')
+            f.write(f'  import "{module}";\n  x = m();\n  y = capture()\n}}')
+        environment = {
+            "capture": {"tag": "extern", "target": "capture", "function": capture}
+        }
+        evaluator.evaluate(parse_file(main), environment)
+        assert set(file for file, _ in positions) == {None, module}
+        with open(main, "rb") as f:
+            source = f.read()
+        assert lines(source, main) == [(5, 1)]
+        result = report(source, main).splitlines()
+        assert result[0] == "2 samples"
+        assert sorted(line.split("%")[1].split()[:3] for line in result[1:3]) == [
+            ["line", "5", "y"],
+            ["m.t", "line", "3"],
+        ]
+    reset()
+
+
+def test_sampling():
+    print("test sampling")
+    reset()
+    start()
+    try:
+        ast = parse(tokenize(program))
+        deadline = time.process_time() + 0.5
+        while sum(positions.values()) < 20 and time.process_time() < deadline:
+            evaluator.evaluate(ast, {})
+    finally:
+        stop()
+    assert sum(positions.values()) >= 20
+    # the hot lines are the loop in slow()
+    assert lines(program)[0][0] in [4, 5]
+    assert max(stacks, key=stacks.get) == "<program>;slow"
+    assert f"line {lines(program)[0][0]} " in report(program).splitlines()[1]
+    reset()
+
+
+def test_sample_spacing():
+    print("test sample spacing")
+    global budget
+    frame = sys._getframe()
+    assert timed_sample(frame) == interval
+    # with almost no time to spare, samples are spaced out
+    old_budget = budget
+    budget = 0.000001
+    try:
+        assert timed_sample(frame) > interval
+    finally:
+        budget = old_budget
+
+
+if __name__ == "__main__":
+    print("test sampler...")
+    test_sample()
+    test_sample_files()
+    test_sampling()
+    test_sample_spacing()
+    print("done.")
@@ -0,0 +1,174 @@
+import array
+import copyreg
+import os
+import pickle
+
+from evaluator import resolve_extern
+
+# A snapshot is an environment pickled to a file. Externs are saved by
+# target and looked up again on loading, and typed array slices are saved
+# as copies, since memoryviews can't be pickled. Ahead of the environment,
+# the file holds the sources it was built from and the modules they
+# imported, each with its mtime and size, to tell whether it is current.
+
+
+def reduce_view(view):
+    return array.array, (view.format, view.tolist())
+
+
+class Pickler(pickle.Pickler):
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[memoryview] = reduce_view
+
+    def persistent_id(self, value):
+        if type(value) is dict and value.get("tag") == "extern":
+            try:
+                if resolve_extern(value["target"]) is value["function"]:
+                    return value["target"]
+            except Exception:
+                pass
+        return None
+
+
+class Unpickler(pickle.Unpickler):
+    def persistent_load(self, target):
+        return {"tag": "extern", "target": target, "function": resolve_extern(target)}
+
+
+def stamp(filename):
+    status = os.stat(filename)
+    return (status.st_mtime_ns, status.st_size)
+
+
+def save(environment, filename, sources=(), modules=()):
+    """
+    Writes environment, and everything reachable from it, to a snapshot file,
+    recording the source files it was built from and the modules they imported.
+    """
+    sources = [os.path.abspath(source) for source in sources]
+    files = {path: stamp(path) for path in sources + list(modules)}
+    temporary = filename + ".tmp"
+    try:
+        with open(temporary, "wb") as f:
+            pickle.dump({"sources": sources, "files": files}, f)
+            Pickler(f, pickle.HIGHEST_PROTOCOL).dump(environment)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        os.remove(temporary)
+        raise Exception(f"Cannot save environment: {e}")
+    # replace any old snapshot only once the new one is complete
+    os.replace(temporary, filename)
+
+
+def load(filename):
+    """
+    Returns the environment saved in a snapshot file.
+    """
+    with open(filename, "rb") as f:
+        pickle.load(f)
+        return Unpickler(f).load()
+
+
+def is_current(filename, sources):
+    """
+    Checks that a snapshot file exists, was built from exactly these sources,
+    and that none of them, nor the modules they imported, has changed since.
+    """
+    try:
+        with open(filename, "rb") as f:
+            built_from = pickle.load(f)
+        if built_from["sources"] != [os.path.abspath(source) for source in sources]:
+            return False
+        return all(stamp(path) == saved for path, saved in built_from["files"].items())
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        return False
+
+
+import functools
+import tempfile
+
+from tokenizer import tokenize
+from parser import parse
+from evaluator import evaluate
+
+
+def test_save_and_load():
+    print("test save and load")
+    environment = {}
+    code = """{
+        extern sqrt = "math.sqrt";
+        function hypot(a, b) {return sqrt(a * a + b * b)};
+        n = 3; s = "a"; i = 0;
+        while (i < 100) {s = s + "b"; i = i + 1};
+        a = [1, [2, 3], "x"];
+        b = float_array(4); fill(b, 2.5); v = slice(b, 1, 3);
+        p = {x: 1, y: 2}; p.self = p; q = {x: 5, y: 6}
+    }"""
+    evaluate(parse(tokenize(code)), environment)
+    inner = {"z": 1, "$parent": environment}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "session.snapshot")
+        save(inner, filename)
+        assert is_current(filename, [])
+        loaded = load(filename)
+    assert loaded["z"] == 1
+    restored = loaded["$parent"]
+    assert restored["sqrt"]["function"] is environment["sqrt"]["function"]
+    assert restored["n"] == 3 and restored["s"] == environment["s"]
+    assert restored["a"] == [1, [2, 3], "x"]
+    assert restored["b"] == environment["b"] and list(restored["v"]) == [2.5, 2.5]
+    # shared and cyclic values stay shared
+    assert restored["p"].values[2] is restored["p"]
+    result, _ = evaluate(parse(tokenize("hypot(3, 4)")), restored)
+    assert result == 5.0
+    result, _ = evaluate(parse(tokenize("p.self.y + q.y")), restored)
+    assert result == 8
+
+
+def test_unsaveable_extern():
+    print("test unsaveable extern")
+    environment = {"f": {"tag": "extern", "target": "<lambda>", "function": lambda: 1}}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "session.snapshot")
+        try:
+            save(environment, filename)
+            assert False, "Expected an error saving a lambda"
+        except Exception as e:
+            assert str(e).startswith("Cannot save environment")
+        assert os.listdir(directory) == []
+        # callables that pickle by reference are fine
+        environment["f"]["function"] = functools.partial(max, 0)
+        save(environment, filename)
+        assert load(filename)["f"]["function"](-1) == 0
+
+
+def test_is_current():
+    print("test is current")
+    with tempfile.TemporaryDirectory() as directory:
+        a, b, m = [os.path.join(directory, name) for name in ["a.t", "b.t", "m.t"]]
+        for path in [a, b, m]:
+            with open(path, "w") as f:
+                f.write("x = 1")
+        filename = os.path.join(directory, "session.snapshot")
+        assert not is_current(filename, [a])
+        save({"a": 1}, filename, [a], [m])
+        assert is_current(filename, [a])
+        assert load(filename) == {"a": 1}
+        # other sources, or more of them, need a run of their own
+        assert not is_current(filename, [b])
+        assert not is_current(filename, [a, b])
+        assert not is_current(filename, [])
+        # as does a change to a source or a module it imported
+        with open(m, "w") as f:
+            f.write("x = 22")
+        assert not is_current(filename, [a])
+        save({"a": 1}, filename, [a], [m])
+        os.remove(a)
+        assert not is_current(filename, [a])
+
+
+if __name__ == "__main__":
+    print("test snapshot...")
+    test_save_and_load()
+    test_unsaveable_extern()
+    test_is_current()
+    print("done.")
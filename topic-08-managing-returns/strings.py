@@ -0,0 +1,149 @@
+# Concatenation builds ropes, so that s = s + x in a loop stays linear.
+# A rope is a prefix of a parts list; ropes that extend the same list
+# share it, and only the newest rope can append to it in place.
+
+# strings shorter than this are simply concatenated
+small_string = 64
+
+
+class Rope:
+    __slots__ = ["parts", "count", "length", "text"]
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+        self.text = None
+
+    def __add__(self, other):
+        if type(other) is Rope:
+            other = str(other)
+        if type(other) is not str:
+            return NotImplemented
+        parts = self.parts
+        if self.count != len(parts):
+            # a newer rope has already extended these parts, so copy ours
+            parts = parts[: self.count]
+        parts.append(other)
+        return Rope(parts, self.length + len(other))
+
+    def __radd__(self, other):
+        if type(other) is not str:
+            return NotImplemented
+        return Rope([other, str(self)], len(other) + self.length)
+
+    def __str__(self):
+        if self.text == None:
+            if self.count == len(self.parts):
+                self.text = "".join(self.parts)
+            else:
+                self.text = "".join(self.parts[: self.count])
+        return self.text
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return str(self)[index]
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        return str(self) == text_of(other)
+
+    def __ne__(self, other):
+        return str(self) != text_of(other)
+
+    def __lt__(self, other):
+        return str(self) < text_of(other)
+
+    def __le__(self, other):
+        return str(self) <= text_of(other)
+
+    def __gt__(self, other):
+        return str(self) > text_of(other)
+
+    def __ge__(self, other):
+        return str(self) >= text_of(other)
+
+
+string_types = (str, Rope)
+
+
+def text_of(value):
+    if type(value) is Rope:
+        return str(value)
+    return value
+
+
+def concatenate(left, right):
+    """
+    Adds two strings, building a rope unless both are small.
+    """
+    if type(left) not in string_types or type(right) not in string_types:
+        raise Exception(f"Cannot add {left!r} and {right!r}")
+    if type(left) is Rope:
+        return left + right
+    if type(right) is str and len(left) + len(right) < small_string:
+        return left + right
+    return Rope([left], len(left)) + right
+
+
+def test_concatenate():
+    print("test concatenate")
+    assert concatenate("ab", "cd") == "abcd"
+    assert type(concatenate("ab", "cd")) is str
+    long = "x" * small_string
+    s = concatenate(long, "y")
+    assert type(s) is Rope
+    assert len(s) == small_string + 1
+    assert str(s) == long + "y"
+    s = concatenate(s, concatenate("z", long))
+    assert str(s) == long + "y" + "z" + long
+    t = concatenate("<", s)
+    assert str(t) == "<" + str(s)
+    for left, right in [("a", 1), (1, "a")]:
+        try:
+            concatenate(left, right)
+            assert False, f"Expected an error adding {left!r} and {right!r}"
+        except Exception as e:
+            assert str(e) == f"Cannot add {left!r} and {right!r}"
+
+
+def test_shared_parts():
+    print("test shared parts")
+    base = concatenate("x" * small_string, "!")
+    a = base + "a"
+    b = base + "b"
+    # a extended base in place, so b had to copy
+    assert a.parts is base.parts
+    assert b.parts is not base.parts
+    assert str(base) == "x" * small_string + "!"
+    assert str(a) == str(base) + "a"
+    assert str(b) == str(base) + "b"
+    # the newest rope keeps appending in place
+    c = a + "c"
+    assert c.parts is a.parts
+    assert str(a) == str(base) + "a"
+
+
+def test_comparison():
+    print("test comparison")
+    s = concatenate("a" * small_string, "b")
+    t = "a" * small_string + "b"
+    assert s == t and t == s and not s != t
+    assert s < t + "c" and s <= t and s >= t and t + "c" > s
+    assert hash(s) == hash(t)
+    assert s[small_string] == "b"
+
+
+if __name__ == "__main__":
+    print("test strings...")
+    test_concatenate()
+    test_shared_parts()
+    test_comparison()
+    print("done.")
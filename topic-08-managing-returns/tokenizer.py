@@ -1,25 +1,11 @@
 import re
+from bisect import bisect_right
 
 patterns = [
     [r"//.*\n", "#comment"],  # Comment
     [r"\s+", "#whitespace"],  # Whitespace
     [r"\d*\.\d+|\d+\.\d*|\d+", "<number>"],  # numeric literals
     [r'"([^"]|"")*"', "<string>"],  # string literals
-    [r"true|false", "<boolean>"],  # boolean literals
-    [r"null", "null"],  # the null literal
-    [r"function", "function"],  # function keyword
-    [r"return", "return"],  # return keyword
-    [r"if", "if"],  # if keyword
-    [r"else", "else"],  # else keyword
-    [r"while", "while"],  # while keyword
-    [r"for", "for"],  # for keyword
-    [r"break", "break"],  # for keyword
-    [r"continue", "continue"],  # for keyword
-    [r"print", "print"],  # print keyword
-    [r"import", "import"],  # function keyword
-    [r"extern", "extern"],  # function keyword
-    [r"input", "input"],  # function keyword
-    [r"exit", "exit"],  # exit keyword
     [r"[a-zA-Z_][a-zA-Z0-9_]*", "<identifier>"],  # identifiers
     [r"\+", "+"],
     [r"--", "--"],
@@ -42,6 +28,7 @@ patterns = [
     [r"\!", "!"],
     [r"=", "="],
     [r"\.", "."],
+    [r":", ":"],
     [r"\[", "["],
     [r"\]", "]"],
     [r",", ","],
@@ -52,14 +39,42 @@ patterns = [
 for pattern in patterns:
     pattern[0] = re.compile(pattern[0])
 
+# the same patterns for lexing bytes-like sources such as an mmap
+byte_patterns = [
+    [re.compile(pattern.pattern.encode()), tag] for pattern, tag in patterns
+]
+
+# words lexed as identifiers that are really literals or keywords
+keywords = {
+    "true": "<boolean>",  # boolean literals
+    "false": "<boolean>",
+    "null": "null",  # the null literal
+    "function": "function",
+    "return": "return",
+    "if": "if",
+    "else": "else",
+    "while": "while",
+    "for": "for",
+    "break": "break",
+    "continue": "continue",
+    "print": "print",
+    "import": "import",
+    "extern": "extern",
+    "input": "input",
+    "exit": "exit",
+}
+
 
 # The lex/tokenize function
 def tokenize(characters):
+    # bytes-like sources are lexed in place; positions are then byte offsets
+    binary = type(characters) is not str
+    active_patterns = byte_patterns if binary else patterns
     tokens = []
     position = 0
     while position < len(characters):
         # find the first token pattern that matches
-        for pattern, tag in patterns:
+        for pattern, tag in active_patterns:
             match = pattern.match(characters, position)
             if match:
                 break
@@ -69,17 +84,29 @@ def tokenize(characters):
         if tag in ["#comment", "#whitespace"]:
             position = match.end()
             continue
+        if tag in ["<number>", "<string>", "<identifier>"]:
+            value = match.group(0)
+            if binary:
+                value = value.decode()
+            # classify keywords and literals spelled as identifiers
+            if tag == "<identifier>":
+                tag = keywords.get(value, tag)
         # complain about errors and throw exception
         if tag == "#error":
-            raise Exception(f"Syntax error: illegal character : {[value]}")
+            raise Exception(f"Syntax error: illegal character : {[match.group(0)]}")
         else:
             # package the token
             if tag in ["<number>", "<string>", "<boolean>", "<identifier>"]:
                 tokens.append(
-                    {"tag": tag, "value": match.group(0), "position": position}
+                    {
+                        "tag": tag,
+                        "value": value,
+                        "position": position,
+                        "end": match.end(),
+                    }
                 )
             else:
-                tokens.append({"tag": tag, "position": position})
+                tokens.append({"tag": tag, "position": position, "end": match.end()})
         # update position for next match
         position = match.end()
     # do some post-processing on strings and numbers and booleans
@@ -99,9 +126,31 @@ def tokenize(characters):
     return tokens
 
 
+# Line/column lookup for source offsets
+def line_index(characters):
+    """
+    Returns the offsets at which each line of characters starts, for line_column().
+    """
+    newline = "\n" if type(characters) is str else b"\n"
+    index = [0]
+    position = characters.find(newline)
+    while position != -1:
+        index.append(position + 1)
+        position = characters.find(newline, position + 1)
+    return index
+
+
+def line_column(index, position):
+    """
+    Converts a source offset to a 1-based (line, column) pair using a line_index().
+    """
+    line = bisect_right(index, position) - 1
+    return line + 1, position - index[line] + 1
+
+
 def test_simple_tokens():
     print("testing simple tokens...")
-    examples = ".,[,],+,-,*,/,(,),{,},;,!,&&,||,<,>,<=,>=,==,!=".split(",")
+    examples = ".,:,[,],+,-,*,/,(,),{,},;,!,&&,||,<,>,<=,>=,==,!=".split(",")
     for example in examples:
         t = tokenize(example)[0]
         assert t["tag"] == example
@@ -178,28 +227,28 @@ def verify_same_tokens(a, b):
 def test_multiple_tokens():
     print("testing multiple tokens...")
     assert tokenize("1+2") == [
-        {"tag": "<number>", "value": 1, "position": 0},
-        {"tag": "+", "position": 1},
-        {"tag": "<number>", "value": 2, "position": 2},
+        {"tag": "<number>", "value": 1, "position": 0, "end": 1},
+        {"tag": "+", "position": 1, "end": 2},
+        {"tag": "<number>", "value": 2, "position": 2, "end": 3},
     ]
     assert tokenize("1+2-3") == [
-        {"tag": "<number>", "value": 1, "position": 0},
-        {"tag": "+", "position": 1},
-        {"tag": "<number>", "value": 2, "position": 2},
-        {"tag": "-", "position": 3},
-        {"tag": "<number>", "value": 3, "position": 4},
+        {"tag": "<number>", "value": 1, "position": 0, "end": 1},
+        {"tag": "+", "position": 1, "end": 2},
+        {"tag": "<number>", "value": 2, "position": 2, "end": 3},
+        {"tag": "-", "position": 3, "end": 4},
+        {"tag": "<number>", "value": 3, "position": 4, "end": 5},
     ]
 
     assert tokenize("3+4*(5-2)") == [
-        {"tag": "<number>", "value": 3, "position": 0},
-        {"tag": "+", "position": 1},
-        {"tag": "<number>", "value": 4, "position": 2},
-        {"tag": "*", "position": 3},
-        {"tag": "(", "position": 4},
-        {"tag": "<number>", "value": 5, "position": 5},
-        {"tag": "-", "position": 6},
-        {"tag": "<number>", "value": 2, "position": 7},
-        {"tag": ")", "position": 8},
+        {"tag": "<number>", "value": 3, "position": 0, "end": 1},
+        {"tag": "+", "position": 1, "end": 2},
+        {"tag": "<number>", "value": 4, "position": 2, "end": 3},
+        {"tag": "*", "position": 3, "end": 4},
+        {"tag": "(", "position": 4, "end": 5},
+        {"tag": "<number>", "value": 5, "position": 5, "end": 6},
+        {"tag": "-", "position": 6, "end": 7},
+        {"tag": "<number>", "value": 2, "position": 7, "end": 8},
+        {"tag": ")", "position": 8, "end": 9},
     ]
 
     assert verify_same_tokens("3+4*(5-2)", "3 + 4 * (5 - 2)")
@@ -230,6 +279,58 @@ def test_keywords():
         assert "value" not in t
 
 
+def test_token_end_positions():
+    print("testing token end positions...")
+    t = tokenize("alpha <= 12.5")
+    assert [(token["position"], token["end"]) for token in t] == [
+        (0, 5),
+        (6, 8),
+        (9, 13),
+    ]
+    t = tokenize('"an embedded "" quote"')
+    assert t[0]["end"] == 22
+
+
+def test_line_column():
+    print("testing line/column lookup...")
+    source = "x=1\ny=22\n\nz=3"
+    index = line_index(source)
+    assert index == [0, 4, 9, 10]
+    assert line_column(index, 0) == (1, 1)
+    assert line_column(index, 2) == (1, 3)
+    assert line_column(index, 3) == (1, 4)
+    assert line_column(index, 4) == (2, 1)
+    assert line_column(index, 7) == (2, 4)
+    assert line_column(index, 9) == (3, 1)
+    assert line_column(index, 12) == (4, 3)
+    for token in tokenize(source):
+        line, column = line_column(index, token["position"])
+        assert source.split("\n")[line - 1][column - 1] == source[token["position"]]
+
+
+def test_keyword_prefixed_identifiers():
+    print("testing keyword-prefixed identifiers...")
+    for s in ["iffy", "printer", "whileLoop", "format", "returned", "elsewhere"]:
+        t = tokenize(s)
+        assert len(t) == 1, f"got tokens = {t}"
+        assert t[0]["tag"] == "<identifier>"
+        assert t[0]["value"] == s
+    for s in ["trueValue", "falsehood", "nullable", "exit_code", "input2"]:
+        t = tokenize(s)
+        assert len(t) == 1, f"got tokens = {t}"
+        assert t[0]["tag"] == "<identifier>"
+        assert t[0]["value"] == s
+    t = tokenize("if iffy")
+    assert [token["tag"] for token in t] == ["if", "<identifier>"]
+
+
+def test_bytes_source():
+    print("testing bytes source...")
+    code = 'x = "a ""quoted"" word"; // comment\nif (iffy >= 1.5) print(x, true)'
+    assert tokenize(code.encode()) == tokenize(code)
+    assert line_index(code.encode()) == line_index(code)
+
+
 def test_comments():
     print("testing comments...")
     assert verify_same_tokens("//comment\n", "\n")
@@ -248,5 +349,9 @@ if __name__ == "__main__":
     test_whitespace()
     test_multiple_tokens()
     test_keywords()
+    test_keyword_prefixed_identifiers()
+    test_token_end_positions()
+    test_line_column()
+    test_bytes_source()
     test_comments()
     print("done.")